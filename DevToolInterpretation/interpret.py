@@ -1,57 +1,71 @@
-import json
-import pandas as pd
+import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-# Check if a filename is provided
-if len(sys.argv) < 2:
-    print("Usage: python interpret.py <filename.har>")
-    sys.exit(1)
-
-# Get filename from command-line argument
-filename = sys.argv[1]
-
-# Load the HAR file
-try:
-    with open(filename, "r", encoding="utf-8") as f:
-        har_data = json.load(f)
-except FileNotFoundError:
-    print(f"Error: File '{filename}' not found.")
-    sys.exit(1)
-
-# Extract entries
-entries = har_data.get("log", {}).get("entries", [])
-
-# Extract required fields
-data = []
-for entry in entries:
-    request_url = entry.get("request", {}).get("url", "N/A")
-    started_date_time = entry.get("startedDateTime", "N/A")
-    transfer_size = entry.get("response", {}).get("_transferSize", "N/A")
-    status_code = entry.get("response", {}).get("status", "N/A")
-    protocol = entry.get("request", {}).get("httpVersion", "N/A")
-    content = entry.get("response", {}).get("content", {})
-
-    content_size = content.get("size", "N/A")
-    mime_type = content.get("mimeType", "N/A")
-
-    # Store extracted values
-    data.append({
-        "Request URL": request_url,
-        "Started DateTime": started_date_time,
-        "Protocol": protocol,
-        "Status Code": status_code,
-        "Content Size": content_size,
-        "MIME Type": mime_type,
-        "Transfer Size": transfer_size
-    })
-
-# Convert to DataFrame
-df = pd.DataFrame(data)
-
-# Save to CSV
-output_filename = "output.csv"
-df.to_csv(output_filename, index=False)
-print(f"✅ Data saved to {output_filename}")
-
-# Optionally, print first 5 rows
-print(df.head())
+# Make the shared energylogger package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from energylogger.har import har_to_csv
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Extract the request timeline of DevTools HAR files to CSV.")
+    parser.add_argument("files", nargs="+", help="HAR files to convert.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="CSV output filename for a single HAR file (default: output.csv).")
+    parser.add_argument("--output-dir", type=str, default=None,
+                        help="Directory for the CSV files of several HAR files, named after each HAR file "
+                             "(default: next to each HAR file).")
+    parser.add_argument("--jobs", type=int, default=None, help="HAR files converted in parallel (default: one per CPU).")
+    args = parser.parse_args()
+    if args.output and len(args.files) > 1:
+        parser.error("-o/--output takes a single HAR file; use --output-dir for several")
+    return args
+
+
+def output_name(filename, args):
+    """CSV filename for one HAR file."""
+    if len(args.files) == 1 and not args.output_dir:
+        return args.output or "output.csv"
+    directory = args.output_dir or os.path.dirname(filename)
+    return os.path.join(directory, os.path.splitext(os.path.basename(filename))[0] + ".csv")
+
+
+def convert(filename, output):
+    """Convert one HAR file; returns (filename, output, entries, error)."""
+    try:
+        return filename, output, har_to_csv(filename, output), None
+    except FileNotFoundError:
+        return filename, output, 0, f"File '{filename}' not found."
+    except (OSError, ValueError) as e:
+        return filename, output, 0, str(e)
+
+
+def main():
+    args = parse_arguments()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    outputs = [output_name(filename, args) for filename in args.files]
+
+    jobs = min(args.jobs or os.cpu_count() or 1, len(args.files))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(convert, args.files, outputs))
+    else:
+        results = [convert(filename, output) for filename, output in zip(args.files, outputs)]
+
+    failed = False
+    for filename, output, entries, error in results:
+        if error:
+            print(f"Error: {filename}: {error}")
+            failed = True
+        else:
+            print(f"✅ Data saved to {output} ({entries} requests)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
-import csv
 import os
+import sys
+
+# Make the shared energylogger package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from energylogger.csv_writer import BufferedCSVWriter, add_writer_arguments, writer_from_args  # noqa: F401 (re-exported)
 
 # Define CSV header
 CSV_HEADER = [
@@ -7,16 +11,19 @@ CSV_HEADER = [
     "Apparent Power (VA)", "Power Factor (PF)", "Total Energy (Wh)", "Resettable Energy (Wh)", "Elapsed Time (µs)"
 ]
 
-def init_csv(file_name):
-    """Initialize the CSV file if it doesn't exist."""
-    file_exists = os.path.isfile(file_name)
-    if not file_exists:
-        with open(file_name, mode="w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(CSV_HEADER)  # Write the header
+def init_csv(file_name, args=None, extra_columns=(), **options):
+    """Open a buffered writer for the CSV file, writing the header if the file is new.
+
+    With parsed command-line `args` (see add_writer_arguments) the --format,
+    --flush-* and --fsync-interval options are applied. `extra_columns` are
+    appended to CSV_HEADER. Extra keyword arguments (flush_rows,
+    flush_interval, fsync_interval, on_flush) go to the writer.
+    """
+    header = CSV_HEADER + list(extra_columns)
+    if args is not None:
+        return writer_from_args(args, file_name, header, **options)
+    return BufferedCSVWriter(file_name, header, **options)
 
-def log_to_csv(file_name, data):
-    """Append data to the CSV file."""
-    with open(file_name, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(data)
+def log_to_csv(writer, data):
+    """Queue a row for the CSV file; it is written to disk in the background."""
+    writer.writerow(data)
@@ -1,167 +1,208 @@
 import asyncio
+import os
 import time
 import argparse
 from pymodbus.client import AsyncModbusTcpClient
-import csv_logger  # Import the new module
+import csv_logger  # Import the new module (also puts the repo root on sys.path)
+from energylogger import modbus
+from energylogger.aggregate import add_aggregate_arguments, check_aggregate_arguments
+from energylogger.clock import PreciseTimestamps, add_clock_arguments
+from energylogger.console import add_console_arguments, console_from_args
+from energylogger.metrics import add_metrics_arguments, metrics_from_args, serve_async
+from energylogger.pipeline import add_pipeline_arguments, pipeline_from_args
+from energylogger.scheduler import (FixedRateScheduler, adaptive_from_args, add_adaptive_arguments,
+                                    add_scheduler_arguments)
+from energylogger.registers import GUDE_LINE_IN, RegisterDecoder, load_register_map, select
+from energylogger.segments import add_segment_arguments
+from energylogger.timing import (CYCLE, DECODE, ENQUEUE, LATENESS, REQUEST, add_timing_arguments,
+                                 timings_from_args)
 
 # Parse command-line arguments for CSV filename
 parser = argparse.ArgumentParser(description="Modbus Data Logger")
 parser.add_argument("--csv", type=str, required=True, help="CSV file to store data")
+parser.add_argument("--host", type=str, default="192.168.0.2", help="Modbus TCP server address (default: 192.168.0.2)")
+parser.add_argument("--port", type=int, default=502, help="Modbus TCP port (default: 502)")
+parser.add_argument("--rate", type=float, default=0.01, help="Sampling period in seconds (default: 0.01)")
+add_scheduler_arguments(parser)
+add_adaptive_arguments(parser)
+add_clock_arguments(parser)
+parser.add_argument("--max-gap", type=int, default=None,
+                    help="Split block reads at holes larger than this many registers (default: read through holes)")
+parser.add_argument("--register-map", type=str, default=None,
+                    help="JSON register map for another meter (default: built-in Gude line-in map)")
+csv_logger.add_writer_arguments(parser)
+add_segment_arguments(parser)
+add_aggregate_arguments(parser)
+add_pipeline_arguments(parser)
+add_console_arguments(parser)
+add_timing_arguments(parser)
+add_metrics_arguments(parser)
 args = parser.parse_args()
+check_aggregate_arguments(parser, args)
 csv_file = args.csv
 
-# Initialize the CSV file
-csv_logger.init_csv(csv_file)
+# Per-stage timing histograms (no-ops without --timing)
+timings = timings_from_args(args, csv_file)
+
+# --precise-time: stamp each sample at the midpoint of its register reads
+precise = PreciseTimestamps() if args.precise_time else None
+
+# Initialize the CSV file (kept open, rows are flushed in the background)
+csv_writer = csv_logger.init_csv(csv_file, args, extra_columns=precise.columns if precise else (),
+                                 on_flush=timings.on_flush)
 
 
 
 # Modbus TCP Server Address
-ADDR = "192.168.0.2"
-PORT = 502
-
-# Sensor Addresses
-class LineInEnergySensor:
-    ABSOLUTE_ACTIVE_ENERGY = 0x400
-    POWER_ACTIVE = 0x402
-    VOLTAGE = 0x404
-    CURRENT = 0x406
-    FREQUENCY = 0x408
-    POWER_FACTOR = 0x40A
-    POWER_APPARENT = 0x40E
-    POWER_REACTIVE = 0x410
-    ABSOLUTE_ACTIVE_ENERGY_RESETTABLE = 0x412
-    ABSOLUTE_REACTIVE_ENERGY = 0x414
-    ABSOLUTE_REACTIVE_ENERGY_RESETTABLE = 0x416
-    FORWARD_ACTIVE_ENERGY = 0x41A
-    FORWARD_REACTIVE_ENERGY = 0x41C
-    FORWARD_ACTIVE_ENERGY_RESETTABLE = 0x41E
-    FORWARD_REACTIVE_ENERGY_RESETTABLE = 0x420
-    REVERSE_ACTIVE_ENERGY = 0x422
-    REVERSE_REACTIVE_ENERGY = 0x424
-    REVERSE_ACTIVE_ENERGY_RESETTABLE = 0x426
-    REVERSE_REACTIVE_ENERGY_RESETTABLE = 0x428
-
-# Sensors to Read
-SENSOR_ARRAY = [
-    LineInEnergySensor.POWER_ACTIVE,
-    LineInEnergySensor.VOLTAGE,
-    LineInEnergySensor.CURRENT,
-    LineInEnergySensor.FREQUENCY,
-    LineInEnergySensor.POWER_FACTOR,
-    LineInEnergySensor.POWER_APPARENT,
-    LineInEnergySensor.POWER_REACTIVE,
-    LineInEnergySensor.ABSOLUTE_ACTIVE_ENERGY,
-    LineInEnergySensor.ABSOLUTE_ACTIVE_ENERGY_RESETTABLE,
-    LineInEnergySensor.FORWARD_ACTIVE_ENERGY,
-    LineInEnergySensor.FORWARD_REACTIVE_ENERGY,
-    LineInEnergySensor.REVERSE_ACTIVE_ENERGY,
-    LineInEnergySensor.REVERSE_REACTIVE_ENERGY
+ADDR = args.host
+PORT = args.port
+
+# Sensors to Read (names from the Gude line-in register map)
+SENSOR_NAMES = [
+    "power_active",
+    "voltage",
+    "current",
+    "frequency",
+    "power_factor",
+    "power_apparent",
+    "power_reactive",
+    "absolute_active_energy",
+    "absolute_active_energy_resettable",
+    "forward_active_energy",
+    "forward_reactive_energy",
+    "reverse_active_energy",
+    "reverse_reactive_energy"
 ]
 
-# Initialize Sensor Data Structure
-def init_sensor_data():
-    return {
-        "power_active": 0,
-        "voltage": 0,  # No scaling needed
-        "current": 0.0,
-        "frequency": 0.0,
-        "power_factor": 0.0,
-        "power_apparent": 0,
-        "power_reactive": 0,
-        "absolute_active_energy": 0,
-        "absolute_active_energy_resettable": 0,
-        "forward_active_energy": 0,
-        "forward_reactive_energy": 0,
-        "reverse_active_energy": 0,
-        "reverse_reactive_energy": 0
-    }
+# Compile the register map once: merged block reads (0x400-0x425 fits in one request)
+# and a struct-based decoder producing a fixed-layout record per sample
+REGISTER_MAP = load_register_map(args.register_map) if args.register_map else GUDE_LINE_IN
+DECODER = RegisterDecoder(select(REGISTER_MAP, SENSOR_NAMES), max_gap=args.max_gap)
+POWER_ACTIVE = DECODER.index["power_active"]
+VOLTAGE = DECODER.index["voltage"]
+CURRENT = DECODER.index["current"]
+FREQUENCY = DECODER.index["frequency"]
+POWER_FACTOR = DECODER.index["power_factor"]
+POWER_APPARENT = DECODER.index["power_apparent"]
+ENERGY = DECODER.index["absolute_active_energy"]
+ENERGY_RESETTABLE = DECODER.index["absolute_active_energy_resettable"]
+
+def print_sample(sample):
+    """Print one sample (runs on the console output thread)."""
+    timestamp, record, computed_power, elapsed_time, _ = sample
+    print(
+        f"{timestamp} ms | "
+        f"Voltage: {record[VOLTAGE]}V | "
+        f"Current: {record[CURRENT]:.3f}A | "
+         f"Active Power (Modbus): {record[POWER_ACTIVE]}W | "
+        f"Computed Power: {computed_power}W | "
+        f"Frequency: {record[FREQUENCY]:.2f}Hz | "
+        f"PF: {record[POWER_FACTOR]:.3f} | "  # Now correctly scaled
+        f"Apparent Power: {record[POWER_APPARENT]}VA | "
+        f"Energy: {record[ENERGY]}Wh | "
+        f"Resettable Energy: {record[ENERGY_RESETTABLE]}Wh | "
+        f"Time taken: {elapsed_time:.2f} µs"
+    )
+
+def status_line(sample):
+    """Short summary of the latest sample for the status line."""
+    timestamp, record, computed_power, _, _ = sample
+    return (f"{timestamp} | {record[POWER_ACTIVE]} W ({computed_power} W computed) | {record[VOLTAGE]} V | "
+            f"{record[CURRENT]:.3f} A | {record[ENERGY]} Wh")
+
+def save_sample(sample):
+    """Log one sample to CSV (runs on the file output thread)."""
+    timestamp, record, computed_power, elapsed_time, stamp = sample
+    csv_logger.log_to_csv(csv_writer, [
+        timestamp,
+        record[VOLTAGE], record[CURRENT], record[POWER_ACTIVE], computed_power, record[FREQUENCY],
+        record[POWER_APPARENT], record[POWER_FACTOR],
+        record[ENERGY], record[ENERGY_RESETTABLE],
+        elapsed_time, *stamp
+    ])
+
+def metric_values(sample):
+    """(name, value) pairs of a sample for the metrics endpoint (only called when scraped)."""
+    timestamp, record, computed_power, elapsed_time, stamp = sample
+    return [("UTC", timestamp), *zip(DECODER.names, record),
+            ("Computed Power (W)", computed_power), ("Elapsed Time (µs)", elapsed_time),
+            *zip(precise.columns if precise else (), stamp)]
+
+# Console and CSV output run on their own threads, fed through bounded queues
+console = console_from_args(args, print_sample, status_line, latency=lambda sample: sample[3] / 1e6)
+pipeline = pipeline_from_args(args, save_sample, csv_writer.close, console)
+
+# Live metrics endpoint, served from the event loop by read_modbus_data()
+metrics = metrics_from_args(args, metric_values, power=lambda sample: sample[1][POWER_ACTIVE],
+                            latency=lambda sample: sample[3] / 1e6,
+                            failed=lambda sample: sample[1][POWER_ACTIVE] != sample[1][POWER_ACTIVE],
+                            labels={"logger": "modbus", "csv": os.path.basename(csv_file)})
+if metrics is not None:
+    pipeline.add(metrics)
+    metrics.pipeline = pipeline
+
+# Sample on fixed deadlines so the read and CSV time do not stretch the period;
+# with --adaptive slowly while the watched value is steady and at --rate around transients
+scheduler = FixedRateScheduler(args.rate, args.missed)
+adaptive = adaptive_from_args(args, scheduler)
+WATCHED = CURRENT if args.adaptive_signal == "current" else POWER_ACTIVE
 
 async def read_modbus_data():
     client = AsyncModbusTcpClient(ADDR, port=PORT)
     await client.connect()
+    if metrics is not None:
+        try:
+            server = await serve_async(metrics, args.metrics_host, args.metrics_port)
+            host, port = server.sockets[0].getsockname()[:2]
+            print(f"Metrics on http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"Error starting the metrics endpoint: {e}")
 
     while True:
+        timings.record(LATENESS, await scheduler.wait_async())
         start_time = time.time()
-        sensor_data = init_sensor_data()
+        start = time.perf_counter()
 
         if not client.connected:
             print("Failed to connect to Modbus server")
             await asyncio.sleep(1)
             continue
 
-        for sensor_type in SENSOR_ARRAY:
-            try:
-                response = await client.read_input_registers(sensor_type, count=2)
-                
-                if response.isError():
-                    print(f"Skipping register {hex(sensor_type)}: {response}")
-                    continue
-
-                registers = response.registers
-                raw_value = (int(registers[0]) << 16) | int(registers[1])
-
-                if sensor_type == LineInEnergySensor.POWER_ACTIVE:
-                    sensor_data["power_active"] = raw_value
-                elif sensor_type == LineInEnergySensor.VOLTAGE:
-                    sensor_data["voltage"] = raw_value  # No scaling needed
-                elif sensor_type == LineInEnergySensor.CURRENT:
-                    sensor_data["current"] = raw_value / 1000.0  # Convert mA to A
-                elif sensor_type == LineInEnergySensor.FREQUENCY:
-                    sensor_data["frequency"] = raw_value / 100.0  # Convert to Hz
-                elif sensor_type == LineInEnergySensor.POWER_FACTOR:
-                    sensor_data["power_factor"] = raw_value / 1000.0  # Correct PF scaling
-                elif sensor_type == LineInEnergySensor.POWER_APPARENT:
-                    sensor_data["power_apparent"] = raw_value
-                elif sensor_type == LineInEnergySensor.POWER_REACTIVE:
-                    sensor_data["power_reactive"] = raw_value
-                elif sensor_type == LineInEnergySensor.ABSOLUTE_ACTIVE_ENERGY:
-                    sensor_data["absolute_active_energy"] = raw_value
-                elif sensor_type == LineInEnergySensor.ABSOLUTE_ACTIVE_ENERGY_RESETTABLE:
-                    sensor_data["absolute_active_energy_resettable"] = raw_value
-                elif sensor_type == LineInEnergySensor.FORWARD_ACTIVE_ENERGY:
-                    sensor_data["forward_active_energy"] = raw_value
-                elif sensor_type == LineInEnergySensor.FORWARD_REACTIVE_ENERGY:
-                    sensor_data["forward_reactive_energy"] = raw_value
-                elif sensor_type == LineInEnergySensor.REVERSE_ACTIVE_ENERGY:
-                    sensor_data["reverse_active_energy"] = raw_value
-                elif sensor_type == LineInEnergySensor.REVERSE_REACTIVE_ENERGY:
-                    sensor_data["reverse_reactive_energy"] = raw_value
-            except Exception as e:
-                print(f"Exception while reading register {hex(sensor_type)}: {e}")
+        sent_ns = time.monotonic_ns()
+        blocks = await modbus.read_ranges(client, DECODER.plan)
+        answered_ns = time.monotonic_ns()
+        read = time.perf_counter()
+        record = DECODER.decode(blocks)
+        decoded = time.perf_counter()
+        if adaptive is not None:
+            adaptive.update(record[WATCHED])
 
         elapsed_time = (time.time() - start_time) * 1e6
         timestamp = int(time.time() * 1000)
 
         # Compute Power: P = V * I * PF
-        computed_power = round(sensor_data["voltage"] * sensor_data["current"] * sensor_data["power_factor"], 3)
-
-        print(
-            f"{timestamp} ms | "
-            f"Voltage: {sensor_data['voltage']}V | "
-            f"Current: {sensor_data['current']:.3f}A | "
-             f"Active Power (Modbus): {sensor_data['power_active']}W | "
-            f"Computed Power: {computed_power}W | "
-            f"Frequency: {sensor_data['frequency']:.2f}Hz | "
-            f"PF: {sensor_data['power_factor']:.3f} | "  # Now correctly scaled
-            f"Apparent Power: {sensor_data['power_apparent']}VA | "
-            f"Energy: {sensor_data['absolute_active_energy']}Wh | "
-            f"Resettable Energy: {sensor_data['absolute_active_energy_resettable']}Wh | "
-            f"Time taken: {elapsed_time:.2f} µs"
-        )
-
-
-        # Log data to CSV
-        csv_logger.log_to_csv(csv_file, [
-            timestamp,
-            sensor_data["voltage"], sensor_data["current"], sensor_data["power_active"], computed_power, sensor_data["frequency"],
-            sensor_data["power_apparent"], sensor_data["power_factor"],
-            sensor_data["absolute_active_energy"], sensor_data["absolute_active_energy_resettable"],
-            elapsed_time
-        ])
-
-        await asyncio.sleep(0.01)
+        computed_power = round(record[VOLTAGE] * record[CURRENT] * record[POWER_FACTOR], 3)
+
+        enqueued = time.perf_counter()
+        # The registers were sampled somewhere between request and response
+        stamp = precise.stamp(sent_ns, answered_ns) if precise else []
+
+        pipeline.put((timestamp, record, computed_power, elapsed_time, stamp))
+        done = time.perf_counter()
+        timings.record(REQUEST, read - start)
+        timings.record(DECODE, decoded - read)
+        timings.record(ENQUEUE, done - enqueued)
+        timings.record(CYCLE, done - start)
 
     await client.close()
 
 if __name__ == "__main__":
-    asyncio.run(read_modbus_data())
+    try:
+        asyncio.run(read_modbus_data())
+    except KeyboardInterrupt:
+        print("\nLogging stopped.")
+    finally:
+        pipeline.close()
+        timings.close()
+        for line in pipeline.report() + timings.report() + (adaptive.report() if adaptive else []):
+            print(line)
@@ -1,15 +1,41 @@
 #!/usr/bin/env python3
-import serial
+import os
+import sys
+import asyncio
 import time
-import csv
 import re
 import argparse
-from datetime import datetime
+
+# Make the shared energylogger package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from energylogger.atmodem import ATError, ATModem
+from energylogger.console import add_console_arguments, console_from_args
+from energylogger.csv_writer import DynamicCSVWriter
+from energylogger.pipeline import add_pipeline_arguments, pipeline_from_args
+from energylogger.scheduler import FixedRateScheduler, add_scheduler_arguments
+from energylogger.timing import (CYCLE, ENQUEUE, LATENESS, PARSE, REQUEST, add_timing_arguments,
+                                 timings_from_args)
+
+# "+QTEMP:"sensor_name","value"" lines of the AT+QTEMP response
+QTEMP_LINE = re.compile(r'\+QTEMP:\s*"([^"]+)",\s*"(-?\d+)"')
 
 def parse_arguments():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description="Log AT+QTEMP temperature data to a CSV file dynamically.")
     parser.add_argument("--csv", type=str, default="temperature_log.csv", help="CSV output filename (default: temperature_log.csv)")
+    parser.add_argument("--port", type=str, default="/dev/ttyUSB2", help="Modem AT command port (default: /dev/ttyUSB2)")
+    parser.add_argument("--baud", type=int, default=115200, help="Baud rate (default: 115200)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Seconds between AT+QTEMP commands; 0 sends the next one as soon as the modem "
+                             "has answered (default: 0)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Seconds to wait for OK/ERROR (default: 1)")
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="Commands allowed in flight at once (default: 1)")
+    add_scheduler_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_console_arguments(parser)
+    add_timing_arguments(parser)
     return parser.parse_args()
 
 def extract_temperatures(response_lines):
@@ -17,106 +43,115 @@ def extract_temperatures(response_lines):
     temp_data = {}  # Dictionary to hold dynamic sensor values
 
     for line in response_lines:
-        match = re.match(r'\+QTEMP:"([^"]+)",\s*"(\d+)"', line)  # Extract "sensor_name","value"
+        match = QTEMP_LINE.match(line)  # Extract "sensor_name","value"
         if match:
             sensor_name, temperature = match.groups()
             temp_data[sensor_name] = int(temperature)  # Store as integer
 
     return temp_data  # Returns {sensor_name: temperature_value}
 
-def update_csv_headers(filename, new_sensors):
-    """Ensure CSV file contains all sensor columns by updating headers dynamically."""
-    try:
-        with open(filename, 'r', newline='') as file:
-            reader = csv.reader(file)
-            headers = next(reader, [])
-    except FileNotFoundError:
-        headers = ["Timestamp"]  # If file doesn't exist, start with just the timestamp column
-
-    # Add any new sensors dynamically
-    updated_headers = list(headers)  # Copy existing headers
-    for sensor in new_sensors:
-        if sensor not in updated_headers:
-            updated_headers.append(sensor)  # Add new sensor columns
-
-    # If headers were modified, rewrite the file with new headers
-    if updated_headers != headers:
-        with open(filename, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(updated_headers)
-
-    return updated_headers  # Return updated headers
-
-def log_to_csv(filename, timestamp, temperature_data):
-    """Append a new entry to the CSV file, dynamically adjusting columns."""
-    # Ensure headers are up to date with all sensor names
-    headers = update_csv_headers(filename, temperature_data.keys())
+def open_csv(filename, **options):
+    """Open the CSV log; its sensor columns are read once and grow as new sensors appear."""
+    return DynamicCSVWriter(filename, first_column="Timestamp", **options)
 
+def log_to_csv(writer, timestamp, temperature_data):
+    """Queue a new entry for the CSV file, adding columns for new sensors."""
     try:
-        with open(filename, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            
-            # Create row with timestamp + dynamic sensor values (preserving order)
-            row = [timestamp] + [temperature_data.get(sensor, "") for sensor in headers[1:]]  # Skip "Timestamp"
-            writer.writerow(row)
+        writer.writerecord(timestamp, temperature_data)
     except Exception as e:
         print(f"Error writing to CSV: {e}")
 
-def print_to_terminal(timestamp, temperature_data):
+def print_to_terminal(timestamp, temperature_data, rtt):
     """Print the data in a structured format similar to the old script."""
     print(f"\n{timestamp}")  # Print timestamp on a separate line
     for sensor, value in temperature_data.items():
         print(f"{sensor}: {value}")
+    print(f"Round Trip: {rtt * 1000:.1f} ms")
     print("")  # Add a blank line for readability
 
+def status_line(record):
+    """Short summary of the latest sample for the status line."""
+    timestamp, temperature_data, _ = record
+    sensor = max(temperature_data, key=temperature_data.get)
+    return f"{timestamp} | {len(temperature_data)} sensors, hottest {sensor}: {temperature_data[sensor]}"
+
+async def sample(modem, pipeline, timings, timeout):
+    """Send one AT+QTEMP and log the answer."""
+    start = time.perf_counter()
+    try:
+        response_lines = await modem.command("AT+QTEMP", timeout)
+    except ATError as e:
+        print(f"Error reading temperatures: {e}")
+        return
+
+    timestamp = time.time_ns() // 1_000_000  # Unix timestamp in milliseconds
+    parse_start = time.perf_counter()
+    temperature_data = extract_temperatures(response_lines)
+    enqueued = time.perf_counter()
+    if temperature_data:
+        # Printed and logged to CSV on the output threads
+        pipeline.put((timestamp, temperature_data, modem.last_rtt))
+    done = time.perf_counter()
+    timings.record(REQUEST, modem.last_rtt)
+    timings.record(PARSE, enqueued - parse_start)
+    timings.record(ENQUEUE, done - enqueued)
+    timings.record(CYCLE, done - start)
+
+async def poll(args, pipeline, timings):
+    """Issue AT+QTEMP commands, paced by --rate or by the modem's own response time."""
+    modem = ATModem(args.port, args.baud, depth=args.pipeline)
+    scheduler = FixedRateScheduler(args.rate, args.missed) if args.rate > 0 else None
+    print(f"Connected to {args.port} at {args.baud} baud.")
+    print(f"Logging AT+QTEMP responses to {args.csv}. Press Ctrl+C to stop.")
+
+    tasks = set()
+    try:
+        while not modem.closed:
+            if scheduler:
+                timings.record(LATENESS, await scheduler.wait_async())
+            # Wait for a free pipeline slot before queueing the next command
+            while not modem.slot_free() and tasks:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(sample(modem, pipeline, timings, args.timeout))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            await asyncio.sleep(0)  # let the task take its slot
+        print(f"Serial error: {args.port} was closed")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        modem.close()
+        if modem.commands:
+            print(f"Round trip: mean {modem.mean_rtt * 1000:.1f} ms, max {modem.max_rtt * 1000:.1f} ms "
+                  f"over {modem.commands} commands")
+
 def main():
     # Parse command-line arguments
     args = parse_arguments()
-    csv_filename = args.csv  # Get CSV filename from argument
-
-    # Serial port configuration
-    serial_port = '/dev/ttyUSB2'  # Adjust as needed
-    baud_rate = 115200
-    timeout = 1  # Read timeout in seconds
+    timings = timings_from_args(args, args.csv)
+    csv_writer = open_csv(args.csv, on_flush=timings.on_flush)
+    console = console_from_args(args, lambda record: print_to_terminal(*record), status_line,
+                                latency=lambda record: record[2])
+    pipeline = pipeline_from_args(args, lambda record: log_to_csv(csv_writer, *record[:2]), csv_writer.close, console)
 
     try:
-        # Open the serial port
-        with serial.Serial(serial_port, baud_rate, timeout=timeout) as ser:
-            print(f"Connected to {serial_port} at {baud_rate} baud.")
-            print(f"Logging AT+QTEMP responses to {csv_filename}. Press Ctrl+C to stop.")
-
-            while True:
-                # Send the AT+QTEMP command
-                command = "AT+QTEMP\r"
-                ser.write(command.encode('utf-8'))
-
-                # Allow the modem time to process and respond
-                time.sleep(0.1)  # Increased polling rate (10 times per second)
-
-                response_lines = []
-                while ser.in_waiting:
-                    try:
-                        response_line = ser.readline().decode('utf-8', errors='replace').strip()
-                        if response_line and response_line.startswith("+QTEMP"):  # Capture only temperature lines
-                            response_lines.append(response_line)
-                    except Exception as read_error:
-                        print(f"Error reading line: {read_error}")
-
-                if response_lines:
-                    timestamp = int(datetime.utcnow().timestamp() * 1000)  # Unix timestamp in milliseconds
-                    temperature_data = extract_temperatures(response_lines)
-
-                    print_to_terminal(timestamp, temperature_data)  # Print structured data to terminal
-                    log_to_csv(csv_filename, timestamp, temperature_data)  # Log to specified CSV file
+        asyncio.run(poll(args, pipeline, timings))
 
     except KeyboardInterrupt:
         print("\nPolling stopped by user.")
 
-    except serial.SerialException as serial_err:
+    except OSError as serial_err:
         print(f"Serial error: {serial_err}")
 
     except Exception as e:
         print(f"An error occurred: {e}")
 
+    finally:
+        pipeline.close()
+        timings.close()
+        for line in pipeline.report() + timings.report():
+            print(line)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,81 @@
+"""Benchmark the JSON backends of gude.status_decoder on status documents.
+
+Times decoding a statusjsn.js answer down to the line-in values (and the
+device clock, as the v1/v2 layouts need it) with every installed backend:
+
+    python bench/json_decode.py
+    python bench/json_decode.py --payload recorded.json --number 20000
+
+Without --payload it uses the simulator's documents: the sensor-values-only
+answer and the much larger components=ALL answer. Before timing, every
+backend must decode each document to the same values and clock.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Make the shared energylogger package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from energylogger.gude import JSON_BACKENDS, status_decoder
+from simulators import full_status_document, load_payloads, status_document
+
+
+def measure(decode, body, number):
+    """Mean CPU microseconds per decode (best of three runs)."""
+    decode(body)  # warm up and fail early on a bad payload
+    best = float("inf")
+    for _ in range(3):
+        start = time.process_time()
+        for _ in range(number):
+            decode(body)
+        best = min(best, time.process_time() - start)
+    return best / number * 1e6
+
+
+def check_agreement(label, body, backends):
+    """Exit unless every backend decodes `body` to the same values and clock as the first."""
+    (reference_name, reference), *others = [(name, decode(body)) for name, decode in backends]
+    for name, decoded in others:
+        if decoded != reference:
+            sys.exit(f"{label}: {name} decodes {decoded!r}, {reference_name} {reference!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON decode of the Gude status document.")
+    parser.add_argument("--payload", action="append", default=None,
+                        help="Recorded statusjsn.js document(s), JSON or JSON lines (repeatable).")
+    parser.add_argument("--number", type=int, default=10000, help="Decodes per measurement (default: 10000).")
+    args = parser.parse_args()
+
+    if args.payload:
+        payloads = [(f"{os.path.basename(name)}[{i}]", body)
+                    for name in args.payload for i, body in enumerate(load_payloads(name))]
+    else:
+        payloads = [("sensor values", json.dumps(status_document()).encode()),
+                    ("components=ALL", json.dumps(full_status_document()).encode())]
+
+    backends = []
+    for name in JSON_BACKENDS[1:]:
+        try:
+            backends.append((name, status_decoder(name, clock=True)[1]))
+        except ImportError:
+            print(f"{name}: not installed")
+
+    # Timing backends that disagree would compare different work
+    for label, body in payloads:
+        check_agreement(label, body, backends)
+
+    for label, body in payloads:
+        print(f"{label} ({len(body)} bytes):")
+        results = [(name, measure(decode, body, args.number)) for name, decode in backends]
+        baseline = dict(results).get("json")
+        for name, micros in results:
+            speedup = f"  {baseline / micros:4.1f}x json" if baseline else ""
+            print(f"  {name:8s} {micros:8.2f} µs{speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Benchmark the loggers against the local device simulators.
+
+Each scenario starts a simulator (bench/simulators.py), runs one logger
+against it for --duration seconds with --quiet --timing, stops it with Ctrl+C
+(SIGINT) and reports samples/s, the request and cycle latency percentiles
+from the logger's <csv>_timing.csv, CPU time and peak RSS of the logger
+process:
+
+    python bench/run.py                      # all scenarios, 10 s each
+    python bench/run.py v2-http modem --duration 30 --output results.csv
+
+Results are appended to --output, so runs before and after a change can be
+compared.
+"""
+import argparse
+import csv
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# Make the shared energylogger package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulators import FakeModem, ModbusServer, StatusServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# device: "http", "modbus" or "modem"; latency: simulated device answer time in seconds
+Scenario = namedtuple("Scenario", "name script device rate latency args", defaults=(0.0, ()))
+
+SCENARIOS = (
+    Scenario("v1-http", "logger.py", "http", 0.01),
+    Scenario("v2-http", "logger_v2.py", "http", 0.01),
+    Scenario("v2-http-slow", "logger_v2.py", "http", 0.01, latency=0.02),
+    Scenario("v2-http-bin", "logger_v2.py", "http", 0.01, args=("--format", "bin")),
+    Scenario("energy-http", "EnergyLogging/log.py", "http", 0.01),
+    Scenario("modbus", "TCP-MODBUS/datalogger.py", "modbus", 0.005),
+    Scenario("modem", "TemperatureLogging/temperature_logger.py", "modem", 0.0, latency=0.005),
+)
+
+RESULT_HEADER = ["Date", "Scenario", "Rate (s)", "Latency (s)", "Duration (s)", "Samples", "Samples/s",
+                 "Request p50 (ms)", "Request p99 (ms)", "Cycle p50 (ms)", "Cycle p99 (ms)", "Cycle max (ms)",
+                 "CPU (s)", "CPU (%)", "Max RSS (MB)", "Exit"]
+
+
+def start_simulator(scenario):
+    """Start the scenario's simulator; returns it and the logger's device arguments."""
+    if scenario.device == "http":
+        simulator = StatusServer(latency=scenario.latency)
+        host, port = simulator.start()
+        return simulator, ["--host", host, "--port", str(port)]
+    if scenario.device == "modbus":
+        simulator = ModbusServer()
+        host, port = simulator.start()
+        return simulator, ["--host", host, "--port", str(port)]
+    simulator = FakeModem(scenario.latency)
+    return simulator, ["--port", simulator.start()]
+
+
+def read_totals(filename):
+    """{stage: row} of the "total" rows of a timing summary."""
+    totals = {}
+    try:
+        with open(filename, newline="") as f:
+            for row in csv.DictReader(f):
+                if row["Scope"] == "total":
+                    totals[row["Stage"]] = row
+    except OSError:
+        pass
+    return totals
+
+
+def wait(process, timeout=10.0):
+    """Wait for a stopping logger (killing it after `timeout` s); returns (exit code, rusage).
+
+    os.wait4 reports the CPU time and peak RSS of exactly this child.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, usage
+        if time.monotonic() > deadline:
+            process.kill()
+            deadline = float("inf")
+        time.sleep(0.05)
+
+
+def run_scenario(scenario, duration, directory):
+    """Run one logger against its simulator and return the RESULT_HEADER row."""
+    simulator, device_args = start_simulator(scenario)
+    filename = os.path.join(directory, f"{scenario.name}.csv")
+    command = [sys.executable, os.path.join(REPO, scenario.script), "--csv", filename,
+               "--rate", str(scenario.rate), "--quiet", "--timing", "--timing-interval", str(duration),
+               *device_args, *scenario.args]
+    try:
+        with open(os.path.join(directory, f"{scenario.name}.log"), "w") as log:
+            process = subprocess.Popen(command, cwd=REPO, stdout=log, stderr=subprocess.STDOUT)
+            started = time.perf_counter()
+            time.sleep(duration)
+            process.send_signal(signal.SIGINT)
+            status, usage = wait(process)
+            elapsed = time.perf_counter() - started
+    finally:
+        simulator.close()
+
+    totals = read_totals(os.path.join(directory, f"{scenario.name}_timing.csv"))
+    cycle = totals.get("cycle", {})
+    request = totals.get("request", {})
+    samples = int(cycle.get("Count", 0))
+    cpu = usage.ru_utime + usage.ru_stime if usage else 0.0
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10) if usage else 0.0
+    return [
+        datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), scenario.name, scenario.rate, scenario.latency,
+        round(elapsed, 2), samples, cycle.get("Rate (1/s)", ""),
+        request.get("p50 (ms)", ""), request.get("p99 (ms)", ""),
+        cycle.get("p50 (ms)", ""), cycle.get("p99 (ms)", ""), cycle.get("Max (ms)", ""),
+        round(cpu, 2), round(100 * cpu / elapsed, 1), round(rss, 1), status,
+    ]
+
+
+def print_results(rows):
+    columns = [RESULT_HEADER.index(name) for name in (
+        "Scenario", "Samples/s", "Request p50 (ms)", "Request p99 (ms)", "Cycle p99 (ms)", "CPU (%)", "Max RSS (MB)")]
+    table = [[RESULT_HEADER[i] for i in columns]] + [[str(row[i]) for i in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(value.rjust(width) for value, width in zip(line, widths)))
+
+
+def main():
+    names = [scenario.name for scenario in SCENARIOS]
+    parser = argparse.ArgumentParser(description="Benchmark the loggers against local device simulators.")
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"Scenarios to run (default: all): {', '.join(names)}.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario (default: 10).")
+    parser.add_argument("--output", type=str, default=None, help="CSV file the results are appended to.")
+    parser.add_argument("--keep", type=str, default=None,
+                        help="Directory for the loggers' CSV, timing and console output (default: a temporary one).")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(names)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.keep or scratch
+        os.makedirs(directory, exist_ok=True)
+        rows = []
+        for scenario in selected:
+            print(f"Running {scenario.name} for {args.duration:g} s ...")
+            try:
+                rows.append(run_scenario(scenario, args.duration, directory))
+            except (ImportError, OSError) as e:
+                print(f"Skipping {scenario.name}: {e}")
+
+    if rows:
+        print_results(rows)
+    if rows and args.output:
+        new_file = not os.path.isfile(args.output) or os.path.getsize(args.output) == 0
+        with open(args.output, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(RESULT_HEADER)
+            writer.writerows(rows)
+        print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
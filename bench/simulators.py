@@ -0,0 +1,386 @@
+"""Local stand-ins for the devices, so the loggers can be measured without hardware.
+
+    StatusServer   Gude statusjsn.js over HTTP/1.1 keep-alive, with configurable latency
+    ModbusServer   Modbus TCP server (pymodbus) with the Gude line-in register map
+    FakeModem      pty that answers AT+QTEMP like the modem on /dev/ttyUSB2
+
+Each simulator runs on background threads; start() returns the address the
+logger should use and close() stops it. Run this file to start one by hand:
+
+    python bench/simulators.py http --port 8080 --latency 0.005
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import math
+import os
+import pty
+import random
+import struct
+import sys
+import threading
+import time
+import tty
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlsplit
+
+# Make the shared energylogger package importable when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from energylogger.gude import ALL_COMPONENTS, COMPONENT_SENSOR_VALUES
+from energylogger.registers import GUDE_LINE_IN, TYPE_CODES
+
+
+def line_in_values(now=None):
+    """Plausible line-in readings that change over time (a slow power swing)."""
+    now = time.time() if now is None else now
+    power = 40.0 + 25.0 * math.sin(now / 5.0)
+    voltage = 230.0 + math.sin(now / 17.0)
+    power_factor = 0.62
+    current = power / (voltage * power_factor)
+    return {
+        "voltage": voltage,
+        "current": current,
+        "frequency": 50.0,
+        "phase": math.degrees(math.acos(power_factor)),
+        "power_active": power,
+        "power_reactive": power * 1.27,
+        "power_apparent": voltage * current,
+        "power_factor": power_factor,
+        "absolute_active_energy": 32.957 + now % 1000 / 1e5,
+        "absolute_active_energy_resettable": 14.16 + now % 1000 / 1e5,
+    }
+
+
+def status_document(values=None, now=None):
+    """Gude statusjsn.js document with the clock and the line-in sensor values."""
+    values = line_in_values(now) if values is None else values
+    clock = datetime.now(timezone.utc)
+    order = ("voltage", "current", "frequency", "phase", "power_active", "power_reactive",
+             "power_apparent", "power_factor", "absolute_active_energy", "absolute_active_energy_resettable")
+    return {
+        "clock": {"systemtime": {"year": clock.year, "month": clock.month, "day": clock.day,
+                                 "hour": clock.hour, "minute": clock.minute, "second": clock.second}},
+        "sensor_values": [{"type": 1, "num": 1, "values": [[{"v": round(values[name], 3)} for name in order]]}],
+    }
+
+
+def full_status_document(values=None, now=None):
+    """status_document() plus the other sections a components=ALL query returns.
+
+    The extra sections mimic the shape and size of the 1105's full answer
+    (descriptions of every sensor field, outputs, network and device info),
+    which the loggers ask for when they need the device clock.
+    """
+    document = status_document(values, now)
+    fields = ("Voltage", "Current", "Frequency", "PhaseIU", "ActivePower", "ReactivePower", "ApparentPower",
+              "Powerfactor", "AbsActEnergy", "AbsActEnergyRes", "AbsReactEnergy", "AbsReactEnergyRes",
+              "FwdActEnergy", "FwdReactEnergy", "FwdActEnergyRes", "FwdReactEnergyRes", "RevActEnergy",
+              "RevReactEnergy", "RevActEnergyRes", "RevReactEnergyRes")
+    units = ("V", "A", "Hz", "deg", "W", "VAR", "VA", "", "kWh", "kWh", "kVARh", "kVARh", "kWh", "kVARh",
+             "kWh", "kVARh", "kWh", "kVARh", "kWh", "kVARh")
+    document.update({
+        "misc": {"product_name": "Expert Power Control 1105", "firmware": "1.4.1", "bootloader": "0.2",
+                 "serial": "0x00E4A1", "uptime": int(time.time()) % 10_000_000},
+        "outputs": [{"name": "Power Port", "state": 1, "type": 1, "batch": [0, 0, 0, 0], "wdog": [0, 2, "192.168.0.1"]}],
+        "sensor_descr": [{
+            "type": 1, "num": 1,
+            "properties": [{"id": "Line-In", "name": "Line In",
+                            "real_id": 0, "in_alarm": 0, "alarm_count": 0}],
+            "fields": [{"name": name, "unit": unit, "decPrecision": 3, "chartMin": 0, "chartMax": 1000,
+                        "limits": {"min": None, "max": None, "hyst": 0}}
+                       for name, unit in zip(fields, units)],
+        }],
+        "eth": {"mac": "00:19:32:00:e4:a1", "dhcp": 0, "ip": "192.168.0.2", "netmask": "255.255.255.0",
+                "gateway": "192.168.0.1", "dns": ["192.168.0.1", "0.0.0.0"], "ipv6": {"enabled": 0, "addrs": []}},
+        "hardware": {"pcb": "EPC1105-rev3", "cpu": "ARM Cortex-M3", "ports": 1, "meters": 1},
+        "syslog": {"enabled": 0, "server": "", "port": 514},
+        "snmp": {"enabled": 0, "community": "public", "traps": []},
+        "email": {"enabled": 0, "server": "", "port": 25, "sender": "", "recipient": ""},
+    })
+    # The full answer carries every line-in field, not just the ten logged ones
+    document["sensor_values"][0]["values"][0].extend({"v": 0.0} for _ in fields[10:])
+    return document
+
+
+def load_payloads(filename):
+    """Recorded status documents to replay: a JSON document or JSON lines, one document per line."""
+    with open(filename, "rb") as f:
+        text = f.read()
+    try:
+        return [json.dumps(json.loads(text)).encode()]
+    except ValueError:
+        return [json.dumps(json.loads(line)).encode() for line in text.splitlines() if line.strip()]
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A logger stopping mid-request is expected, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StatusServer:
+    """HTTP server answering /statusjsn.js after `latency` (+ up to `jitter`) seconds.
+
+    Without `payloads` every answer is a fresh document: status_document() for
+    a sensor-values-only components mask, full_status_document() otherwise.
+    With `payloads` the recorded documents are replayed in a loop.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, payloads=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.payloads = payloads
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the meter
+            # One write per answer with Nagle off; headers and body in separate segments
+            # would stall on delayed ACKs for ~40 ms
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if not self.path.startswith("/statusjsn.js"):
+                    self.send_error(404)
+                    return
+                body = server.payload(self.path)
+                delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _HTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def payload(self, path="/statusjsn.js"):
+        with self._lock:
+            index = self.requests
+            self.requests += 1
+        if self.payloads:
+            return self.payloads[index % len(self.payloads)]
+        query = parse_qs(urlsplit(path).query)
+        components = int(query.get("components", [ALL_COMPONENTS])[0])
+        full = components & ~COMPONENT_SENSOR_VALUES
+        return json.dumps(full_status_document() if full else status_document()).encode()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="status-server", daemon=True)
+        self._thread.start()
+        return self.address
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def encode_registers(register_map, values):
+    """Raw input registers {address: word} for the given {name: value} readings."""
+    registers = {}
+    for r in register_map:
+        raw = int(round(values.get(r.name, 0.0) / r.scale))
+        data = struct.pack(">" + TYPE_CODES[(r.width, bool(r.signed))], raw)
+        words = list(struct.unpack(f">{r.width}H", data))
+        if r.word_order == "little":
+            words.reverse()
+        for offset, word in enumerate(words):
+            registers[r.address + offset] = word
+    return registers
+
+
+class ModbusServer:
+    """pymodbus TCP server exposing a register map as input registers.
+
+    The readings are refreshed every `update` seconds from line_in_values().
+    Needs pymodbus (3.x).
+    """
+
+    def __init__(self, host="127.0.0.1", port=5020, register_map=GUDE_LINE_IN, update=0.1):
+        self.host = host
+        self.port = port
+        self.register_map = register_map
+        self.update = update
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="modbus-server", daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        if self._error is not None:
+            raise self._error
+        return self.address
+
+    def close(self):
+        if self._loop is not None and self._server is not None:
+            asyncio.run_coroutine_threadsafe(self._server.shutdown(), self._loop)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+
+    async def _serve(self):
+        from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext
+        from pymodbus.server import ModbusTcpServer
+        try:
+            from pymodbus.datastore import ModbusDeviceContext as DeviceContext  # pymodbus >= 3.10
+        except ImportError:
+            from pymodbus.datastore import ModbusSlaveContext as DeviceContext
+
+        end = max(r.address + r.width for r in self.register_map)
+        # The device context adds 1 to request addresses, so register N is block entry N + 1
+        block = ModbusSequentialDataBlock(1, [0] * end)
+        context = ModbusServerContext(DeviceContext(ir=block), single=True)
+        self._loop = asyncio.get_running_loop()
+        self._server = ModbusTcpServer(context, address=(self.host, self.port))
+        updater = asyncio.create_task(self._update(block))
+        self._ready.set()
+        try:
+            await self._server.serve_forever()
+        finally:
+            updater.cancel()
+
+    async def _update(self, block):
+        while True:
+            values = line_in_values()
+            # The Modbus interface reports energy in Wh, statusjsn.js in kWh
+            for name in ("absolute_active_energy", "absolute_active_energy_resettable"):
+                values[name] *= 1000
+            for address, word in encode_registers(self.register_map, values).items():
+                block.setValues(address + 1, [word])
+            await asyncio.sleep(self.update)
+
+
+class FakeModem:
+    """pty answering AT+QTEMP after `delay` seconds with +QTEMP lines and OK.
+
+    Other commands get ERROR. Like the real modem the command is echoed first.
+    """
+
+    SENSORS = ("cpu0-a7-usr", "modem-lte-sub6-pa1", "modem-sdr0-pa0", "aoss0-usr", "mdmq6-0-usr")
+
+    def __init__(self, delay=0.005, sensors=SENSORS, echo=True):
+        self.delay = delay
+        self.sensors = sensors
+        self.echo = echo
+        self.commands = 0
+        self._master = self._slave = None
+        self._thread = None
+        self.path = None
+
+    @property
+    def address(self):
+        return self.path
+
+    def start(self):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._master)
+        self.path = os.ttyname(self._slave)
+        self._thread = threading.Thread(target=self._run, name="fake-modem", daemon=True)
+        self._thread.start()
+        return self.path
+
+    def close(self):
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def answer(self, command):
+        out = command + b"\r\n" if self.echo else b""
+        if command.strip().upper() != b"AT+QTEMP":
+            return out + b"\r\nERROR\r\n"
+        base = 35 + int(5 * math.sin(time.time() / 10.0))
+        lines = b"".join(b'+QTEMP:"%s","%d"\r\n' % (name.encode(), base + i) for i, name in enumerate(self.sensors))
+        return out + b"\r\n" + lines + b"\r\nOK\r\n"
+
+    def _run(self):
+        buffer = b""
+        while True:
+            try:
+                data = os.read(self._master, 1024)
+            except (OSError, TypeError):
+                return
+            if not data:
+                return
+            buffer += data
+            while b"\r" in buffer:
+                command, _, buffer = buffer.partition(b"\r")
+                command = command.strip(b"\n")
+                if not command:
+                    continue
+                if self.delay > 0:
+                    time.sleep(self.delay)
+                self.commands += 1
+                try:
+                    os.write(self._master, self.answer(command))
+                except (OSError, TypeError):  # closed while answering
+                    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one device simulator until Ctrl+C.")
+    parser.add_argument("device", choices=("http", "modbus", "modem"))
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Listen address (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Listen port (default: 8080 for http, 5020 for modbus).")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds before each answer (HTTP and modem; default: 0).")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Extra random HTTP latency of up to this many seconds (default: 0).")
+    parser.add_argument("--payload", type=str, default=None,
+                        help="Recorded statusjsn.js document(s) to replay, JSON or JSON lines.")
+    args = parser.parse_args()
+
+    if args.device == "http":
+        payloads = load_payloads(args.payload) if args.payload else None
+        simulator = StatusServer(args.host, 8080 if args.port is None else args.port,
+                                 args.latency, args.jitter, payloads)
+    elif args.device == "modbus":
+        simulator = ModbusServer(args.host, 5020 if args.port is None else args.port)
+    else:
+        simulator = FakeModem(args.latency)
+    print(f"{args.device} simulator at {simulator.start()}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Shared building blocks for the Gude / Modbus / modem loggers."""
@@ -0,0 +1,361 @@
+"""Rolling per-window summaries of the sample stream, for long captures.
+
+With --aggregate 1,60 a logger additionally writes `<name>_1s.csv` and
+`<name>_60s.csv` with one row per window: the window start, the number of
+samples and timeouts, mean, min, max and standard deviation of every numeric
+column, and the energy (trapezoid over the power samples, split exactly at
+window edges, so the windows add up to the total). Aggregates are updated in
+O(1) per sample. --no-raw drops the full-rate CSV; --ring-buffer keeps the
+last raw rows in memory and writes them out around events (failed samples,
+power steps of at least --event-threshold watts).
+"""
+import argparse
+import collections
+import csv
+import math
+import os
+import threading
+
+from energylogger.clock import timestamp_ms
+from energylogger.csv_writer import BufferedCSVWriter
+
+POWER_COLUMN = "Active Power (W)"
+_STATISTICS = ("mean", "min", "max", "std")
+
+
+class RunningStats:
+    """Count, mean, variance (Welford), min and max of a stream of values."""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def std(self):
+        """Sample standard deviation (0 for fewer than two values)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self):
+        if not self.count:
+            return ["", "", "", ""]
+        return [self.mean, self.min, self.max, self.std]
+
+
+class WindowAggregator:
+    """Summarize samples over consecutive windows of `window` seconds.
+
+    add(timestamp_ms, values) takes one sample (None for values that are
+    missing) and returns the rows of the windows it completed. Windows are
+    aligned to multiples of their length in Unix time. Energy is integrated
+    from the column at `power_index` with the trapezoidal rule; an interval
+    that crosses window edges is split at the edges, and windows that pass
+    without samples (a gap) get a row with only their share of the energy.
+    """
+
+    def __init__(self, columns, window, power_index=None):
+        self.columns = list(columns)
+        self.width = max(1, int(round(window * 1000)))
+        self.power_index = power_index
+        self.stats = [RunningStats() for _ in self.columns]
+        self.samples = 0
+        self.timeouts = 0
+        self.energy = 0.0  # joules in the current window
+        self._window = None
+        self._last = None  # (timestamp_ms, power) of the last sample with power
+
+    @property
+    def header(self):
+        header = ["Window Start (ms)", "Samples", "Timeouts"]
+        for name in self.columns:
+            header.extend(f"{name} {statistic}" for statistic in _STATISTICS)
+        if self.power_index is not None:
+            header.append("Energy (Wh)")
+        return header
+
+    def add(self, timestamp, values):
+        rows = []
+        window = timestamp // self.width
+        if self._window is None:
+            self._window = window
+        elif window > self._window:
+            rows.extend(self._advance(timestamp, values))
+        # Samples stamped before the current window (a clock step) count towards it
+
+        self.samples += 1
+        missing = False
+        for stats, value in zip(self.stats, values):
+            if value is None:
+                missing = True
+            else:
+                stats.add(value)
+        if missing:
+            self.timeouts += 1
+
+        if self.power_index is not None:
+            power = values[self.power_index]
+            if power is not None:
+                if self._last is not None and timestamp > self._last[0]:
+                    last_time, last_power = self._last
+                    self.energy += (last_power + power) / 2.0 * (timestamp - last_time) / 1000.0
+                self._last = (timestamp, power)
+        return rows
+
+    def finish(self):
+        """Return the row of the current, incomplete window (if it has samples)."""
+        if self._window is None or not self.samples:
+            return []
+        row = self._row()
+        self._window = None
+        return [row]
+
+    def _advance(self, timestamp, values):
+        """Close windows up to the one `timestamp` falls in, splitting the energy at each edge."""
+        rows = []
+        power = values[self.power_index] if self.power_index is not None else None
+        window = timestamp // self.width
+        while self._window < window:
+            edge = (self._window + 1) * self.width
+            if self._last is not None and self._last[0] < edge:
+                last_time, last_power = self._last
+                if power is None:
+                    # The sample after the edge failed: hold the last known power up to the edge
+                    edge_power = last_power
+                else:
+                    # Linear interpolation of the power at the window edge
+                    edge_power = last_power + (power - last_power) * (edge - last_time) / (timestamp - last_time)
+                self.energy += (last_power + edge_power) / 2.0 * (edge - last_time) / 1000.0
+                self._last = (edge, edge_power)
+            if self.samples or self.energy:
+                rows.append(self._row())
+            self._window += 1
+        return rows
+
+    def _row(self):
+        row = [self._window * self.width, self.samples, self.timeouts]
+        for stats in self.stats:
+            row.extend(stats.summary())
+            stats.reset()
+        if self.power_index is not None:
+            row.append(self.energy / 3600.0)
+        self.samples = 0
+        self.timeouts = 0
+        self.energy = 0.0
+        return row
+
+
+class RingBuffer:
+    """Keep the last `capacity` raw rows and write them to a CSV around events.
+
+    trigger() starts an event capture: after another capacity // 2 rows the
+    buffer (half before, half after the event) is written to
+    `<prefix>_event_<timestamp>.csv` on a background thread.
+    """
+
+    def __init__(self, capacity, prefix, header):
+        self.rows = collections.deque(maxlen=capacity)
+        self.prefix = prefix
+        self.header = header
+        self.events = 0
+        self._remaining = None
+        self._name = None
+        self._threads = []
+
+    def add(self, row):
+        self.rows.append(row)
+        if self._remaining is not None:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._dump()
+
+    def trigger(self, timestamp, reason):
+        """Start capturing around an event (ignored while one is being captured)."""
+        if self._remaining is None:
+            self.events += 1
+            self._remaining = self.rows.maxlen // 2
+            self._name = f"{self.prefix}_event_{timestamp}.csv"
+            print(f"Event at {timestamp}: {reason}; raw samples go to {self._name}")
+
+    def close(self):
+        if self._remaining is not None:
+            self._dump()
+        for thread in self._threads:
+            thread.join()
+
+    def _dump(self):
+        rows = list(self.rows)
+        thread = threading.Thread(target=self._write, args=(self._name, rows), daemon=True)
+        thread.start()
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        self._remaining = None
+
+    def _write(self, filename, rows):
+        try:
+            with open(filename, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(self.header)
+                writer.writerows(rows)
+        except OSError as e:
+            print(f"Error writing to {filename}: {e}")
+
+
+class AggregatingWriter:
+    """Writer front end that feeds each row to the aggregators and the ring buffer.
+
+    It takes the rows a logger would write (same layout as `header`), passes
+    them on to `raw` (a writer, or None to drop the full-rate stream) and
+    updates one WindowAggregator, with its own CSV, per window length.
+    """
+
+    def __init__(self, raw, filename, header, windows=(), timestamp_format=None, skip=(),
+                 ring_buffer=0, event_threshold=None, **options):
+        self.raw = raw
+        self.filename = filename
+        self.timestamp_format = timestamp_format
+        self.columns = [i for i, name in enumerate(header) if i > 0 and name not in skip]
+        names = [header[i] for i in self.columns]
+        power_index = names.index(POWER_COLUMN) if POWER_COLUMN in names else None
+        self.power_index = power_index
+
+        base = os.path.splitext(filename)[0]
+        self.aggregators = []
+        for window in windows:
+            aggregator = WindowAggregator(names, window, power_index)
+            writer = BufferedCSVWriter(f"{base}_{window:g}s.csv", aggregator.header, **options)
+            self.aggregators.append((aggregator, writer))
+
+        self.ring = RingBuffer(ring_buffer, base, header) if ring_buffer else None
+        self.event_threshold = event_threshold
+        self._last_power = None
+
+    def writerow(self, row):
+        if self.raw is not None:
+            self.raw.writerow(row)
+        timestamp = timestamp_ms(row[0], self.timestamp_format)
+        values = [_number(row[i]) for i in self.columns]
+        for aggregator, writer in self.aggregators:
+            rows = aggregator.add(timestamp, values)
+            if rows:
+                writer.writerows(rows)
+        if self.ring is not None:
+            self.ring.add(row)
+            self._check_event(timestamp, values)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if self.raw is not None:
+            self.raw.flush()
+        for _, writer in self.aggregators:
+            writer.flush()
+
+    def close(self):
+        for aggregator, writer in self.aggregators:
+            writer.writerows(aggregator.finish())
+            writer.close()
+        if self.ring is not None:
+            self.ring.close()
+        if self.raw is not None:
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _check_event(self, timestamp, values):
+        if self.power_index is None:
+            return
+        power = values[self.power_index]
+        if power is None:
+            self.ring.trigger(timestamp, "sample failed")
+        elif (self.event_threshold is not None and self._last_power is not None
+              and abs(power - self._last_power) >= self.event_threshold):
+            self.ring.trigger(timestamp, f"power step {self._last_power:g} W -> {power:g} W")
+        if power is not None:
+            self._last_power = power
+
+
+def _number(value):
+    """The value if it is a number, None if it is missing (failed reads are NaN or text)."""
+    if isinstance(value, (int, float)) and value == value:
+        return value
+    return None
+
+
+def _windows(value):
+    try:
+        windows = [float(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid window list {value!r}") from None
+    if not windows or any(w <= 0 for w in windows):
+        raise argparse.ArgumentTypeError(f"invalid window list {value!r} (expected positive seconds)")
+    return windows
+
+
+def add_aggregate_arguments(parser):
+    """Add the aggregation and ring buffer options to an argparse parser."""
+    group = parser.add_argument_group("aggregation")
+    group.add_argument("--aggregate", type=_windows, default=None, metavar="SECONDS[,SECONDS...]",
+                       help="Also write per-window summaries (mean/min/max/std, energy) for these window "
+                            "lengths, e.g. 1,60, to <csv>_1s.csv, <csv>_60s.csv.")
+    group.add_argument("--no-raw", action="store_true",
+                       help="Do not write the full-rate samples (only the --aggregate summaries and events).")
+    group.add_argument("--ring-buffer", type=int, default=0, metavar="ROWS",
+                       help="Keep the last ROWS raw samples in memory and write them to <csv>_event_<ms>.csv "
+                            "around failed samples and power steps (default: off).")
+    group.add_argument("--event-threshold", type=float, default=None, metavar="WATTS",
+                       help="Power step between two samples that counts as an event for --ring-buffer.")
+    return group
+
+
+def check_aggregate_arguments(parser, args):
+    """Report invalid combinations of the aggregation options with parser.error (exits)."""
+    if args.ring_buffer < 0:
+        parser.error("--ring-buffer must not be negative")
+    if args.no_raw and not args.aggregate and not args.ring_buffer:
+        parser.error("--no-raw needs --aggregate or --ring-buffer, or nothing would be written")
+    if args.event_threshold is not None:
+        if not args.ring_buffer:
+            parser.error("--event-threshold needs --ring-buffer")
+        if args.event_threshold <= 0:
+            parser.error("--event-threshold must be positive")
+
+
+def aggregate_from_args(args, raw_factory, filename, header, timestamp_format=None, skip=(), **options):
+    """Wrap the writer made by `raw_factory()` in an AggregatingWriter if aggregation was requested.
+
+    Without --aggregate, --ring-buffer or --no-raw this returns the raw writer unchanged.
+    Loggers check the options with check_aggregate_arguments first; invalid
+    ones still raise ValueError here.
+    """
+    windows = getattr(args, "aggregate", None) or ()
+    ring_buffer = getattr(args, "ring_buffer", 0)
+    no_raw = getattr(args, "no_raw", False)
+    if not windows and not ring_buffer and not no_raw:
+        return raw_factory()
+    if no_raw and not windows and not ring_buffer:
+        raise ValueError("--no-raw needs --aggregate or --ring-buffer")
+    return AggregatingWriter(None if no_raw else raw_factory(), filename, header, windows,
+                             timestamp_format=timestamp_format, skip=skip, ring_buffer=ring_buffer,
+                             event_threshold=getattr(args, "event_threshold", None), **options)
@@ -0,0 +1,422 @@
+"""Per-run energy analysis of logged captures.
+
+Integrates active power over the real timestamp deltas (trapezoidal rule)
+instead of assuming the nominal rate, cross-checks the result against the
+meter's cumulative energy counter, and summarizes repeats of the same
+experiment (files named like download_100MB_1.csv, download_100MB_2.csv, ...)
+with a 95 % confidence interval.
+
+Usage: python -m energylogger.analysis PATH [PATH ...] [--csv results.csv] [--jobs N]
+
+PATH may be a capture (.csv or .bin) or a directory searched recursively.
+Captures without a power column (temperature, video statistics) are skipped.
+Files are summarized in a process pool and the summaries are cached by path,
+size and modification time (--cache, default .analysis_cache.json), so a
+re-run only reads new or changed captures. A final table compares services
+(twitch, youtube, ...) per resolution.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from energylogger.schemas import detect_schema, read_csv_head
+
+# Generic file names whose parent directories identify the run
+_GENERIC_NAMES = {"energy_data", "energy_log"}
+# Trailing repeat number (not a resolution such as _360): download_100MB_2, Speedtest-3
+_REPEAT_SUFFIX = re.compile(r"[_-]\d{1,2}$")
+# Services and video heights recognized in run names
+_SERVICE = re.compile(r"(twitch|youtube|facebook|vimeo|speedtest|download|upload)")
+_RESOLUTION = re.compile(r"(?<!\d)(144|240|360|480|720|1080|1140|1440|2160)(?:p|(?![\dA-Za-z]))")
+
+# Format version of ResultCache files
+CACHE_VERSION = 1
+DEFAULT_CACHE = ".analysis_cache.json"
+
+# Two-sided 95 % Student t quantiles by degrees of freedom; 1.96 beyond the table
+_T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+RUN_COLUMNS = ["Run", "Group", "Service", "Resolution", "Schema", "Samples", "Timeouts", "Duration (s)", "Mean Interval (ms)",
+               "Energy (Wh)", "Counter Energy (Wh)", "Counter Difference (Wh)",
+               "Mean Power (W)", "P95 Power (W)", "Max Power (W)"]
+
+
+def find_captures(paths):
+    """Expand files and directories into a sorted list of .csv / .bin captures."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                found.extend(os.path.join(root, f) for f in sorted(files) if f.endswith((".csv", ".bin")))
+        else:
+            found.append(path)
+    return found
+
+
+def run_label(filename, root=None):
+    """Name of the run a capture belongs to: its path below `root`, without extension.
+
+    Captures with generic names (energy_data.csv) are named after their directory.
+    """
+    relative = os.path.relpath(filename, root) if root else os.path.basename(filename)
+    relative = os.path.splitext(relative)[0].replace(os.sep, "/")
+    directory, _, stem = relative.rpartition("/")
+    if directory and (stem.lower() in _GENERIC_NAMES or stem.lower().endswith(("_energy_log", "_energy_data"))):
+        return directory
+    return relative
+
+
+def group_label(run):
+    """Experiment a run repeats, with the trailing repeat number removed."""
+    return _REPEAT_SUFFIX.sub("", run)
+
+
+def load_power(filename, schema=None):
+    """Load the time (ms), power (W) and energy counter (Wh) columns of a capture.
+
+    Returns (schema, timestamps int64, power float64, energy float64 or None),
+    or None if the capture has no power column.
+    """
+    import numpy as np
+
+    if filename.endswith(".bin"):
+        from energylogger.binlog import BinaryLog
+
+        log = BinaryLog(filename)
+        schema = schema or detect_schema([log.timestamp] + log.columns)
+        if schema is None or schema.power is None:
+            return None
+        energy = log.column(schema.energy) * schema.energy_scale if schema.energy else None
+        return schema, log.column(log.timestamp), np.asarray(log.column(schema.power), dtype=np.float64), energy
+
+    import pandas as pd
+
+    if schema is None:
+        schema = detect_schema(*read_csv_head(filename))
+    if schema is None or schema.power is None:
+        return None
+
+    columns = [schema.timestamp, schema.power] + ([schema.energy] if schema.energy else [])
+    frame = pd.read_csv(filename, usecols=columns, engine="c", na_values=["TIMEOUT"],
+                        dtype={schema.timestamp: str} if schema.timestamp_format else None)
+    # Drop blank rows left behind by spreadsheet edits
+    frame = frame.dropna(subset=[schema.timestamp])
+    if schema.timestamp_format:
+        parsed = pd.to_datetime(frame[schema.timestamp], format=schema.timestamp_format)
+        timestamps = parsed.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    else:
+        # Parsed as float: spreadsheet round trips leave values such as 1.74056E+12
+        timestamps = frame[schema.timestamp].to_numpy(dtype=np.float64).astype(np.int64)
+    power = pd.to_numeric(frame[schema.power], errors="coerce").to_numpy(dtype=np.float64)
+    energy = None
+    if schema.energy:
+        energy = pd.to_numeric(frame[schema.energy], errors="coerce").to_numpy(dtype=np.float64) * schema.energy_scale
+    return schema, timestamps, power, energy
+
+
+def summarize_run(timestamps, power, energy=None):
+    """Energy and power statistics of one run, fully vectorized.
+
+    Samples without a power value (timeouts) are dropped; the trapezoid then
+    spans the gap. Timestamps are sorted first, because the v2 layout mixes the
+    device's seconds with the host's milliseconds and can step backwards.
+    """
+    import numpy as np
+
+    valid = ~np.isnan(power)
+    t = timestamps[valid]
+    p = power[valid]
+    order = np.argsort(t, kind="stable")
+    t = t[order]
+    p = p[order]
+
+    summary = {"Samples": int(valid.sum()), "Timeouts": int((~valid).sum())}
+    if len(t) < 2:
+        return summary
+
+    seconds = (t - t[0]) / 1000.0
+    duration = float(seconds[-1])
+    energy_wh = float(np.sum((p[1:] + p[:-1]) * np.diff(seconds)) / 2.0 / 3600.0)
+    summary.update({
+        "Duration (s)": duration,
+        "Mean Interval (ms)": duration * 1000.0 / (len(t) - 1),
+        "Energy (Wh)": energy_wh,
+        "Mean Power (W)": energy_wh * 3600.0 / duration if duration > 0 else float(p.mean()),
+        "P95 Power (W)": float(np.percentile(p, 95)),
+        "Max Power (W)": float(p.max()),
+    })
+    if energy is not None:
+        counter = energy[valid][order]
+        counter = counter[~np.isnan(counter)]
+        if len(counter) >= 2:
+            summary["Counter Energy (Wh)"] = float(counter[-1] - counter[0])
+            summary["Counter Difference (Wh)"] = summary["Counter Energy (Wh)"] - energy_wh
+    return summary
+
+
+def summarize_file(filename):
+    """Load and summarize one capture, without run labels; None if it has no power data."""
+    loaded = load_power(filename)
+    if loaded is None:
+        return None
+    schema, timestamps, power, energy = loaded
+    summary = {"Schema": schema.name, "File": filename}
+    summary.update(summarize_run(timestamps, power, energy))
+    return summary
+
+
+def analyze_file(filename, root=None):
+    """Load and summarize one capture; returns None if it has no power data."""
+    summary = summarize_file(filename)
+    if summary is not None:
+        summary.update(_labels(filename, root))
+    return summary
+
+
+def _labels(filename, root):
+    run = run_label(filename, root)
+    service, resolution = service_label(run)
+    return {"Run": run, "Group": group_label(run), "Service": service, "Resolution": resolution}
+
+
+def service_label(run):
+    """Return (service, resolution) of a run name such as Measurements/twitch_live_720p_2.
+
+    The service is the first known service name in the run (lower case, "other"
+    if none), the resolution the first known video height ("" if none).
+    """
+    lowered = run.lower()
+    match = _SERVICE.search(lowered)
+    service = match.group(1) if match else "other"
+    match = _RESOLUTION.search(lowered)
+    return service, f"{match.group(1)}p" if match else ""
+
+
+class ResultCache:
+    """On-disk JSON cache of per-file summaries, keyed by path, size and mtime.
+
+    Files without power data are cached too (as None), so unchanged captures
+    are never read again. Bump CACHE_VERSION when summaries change.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self.hits = 0
+        self._dirty = False
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data["files"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"Ignoring unreadable cache {filename}: {e}", file=sys.stderr)
+
+    @staticmethod
+    def key(filename):
+        stat = os.stat(filename)
+        return os.path.abspath(filename), [stat.st_size, stat.st_mtime_ns]
+
+    def get(self, filename):
+        """Return (found, summary) for a file that has not changed since it was cached."""
+        path, signature = self.key(filename)
+        entry = self.entries.get(path)
+        if entry is None or entry["signature"] != signature:
+            return False, None
+        self.hits += 1
+        summary = entry["summary"]
+        return True, dict(summary, File=filename) if summary is not None else None
+
+    def put(self, filename, summary):
+        path, signature = self.key(filename)
+        self.entries[path] = {"signature": signature, "summary": summary}
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        # Write to a temporary file first so an interrupted run never leaves a truncated cache
+        temporary = self.filename + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "files": self.entries}, f)
+        os.replace(temporary, self.filename)
+        self._dirty = False
+
+
+def _summarize_job(filename):
+    try:
+        return filename, summarize_file(filename), None
+    except (OSError, ValueError, KeyError) as e:
+        return filename, None, str(e)
+
+
+def summarize_files(filenames, jobs=None, cache=None):
+    """Summarize many captures in a process pool, reusing cached results.
+
+    Returns {filename: summary or None}. Files that fail to load are reported
+    on stderr, left out of the result and not cached.
+    """
+    results = {}
+    pending = []
+    for filename in filenames:
+        found, summary = cache.get(filename) if cache is not None else (False, None)
+        if found:
+            results[filename] = summary
+        else:
+            pending.append(filename)
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            outcomes = list(pool.map(_summarize_job, pending, chunksize=max(1, len(pending) // (4 * jobs))))
+    else:
+        outcomes = [_summarize_job(filename) for filename in pending]
+
+    for filename, summary, error in outcomes:
+        if error is not None:
+            print(f"Error reading {filename}: {error}", file=sys.stderr)
+            continue
+        results[filename] = summary
+        if cache is not None:
+            cache.put(filename, summary)
+    return results
+
+
+def confidence_interval(values):
+    """Mean and 95 % confidence half-width (Student t) of repeated measurements."""
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, float("nan")
+    sd = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    t = _T_95[n - 2] if n - 2 < len(_T_95) else 1.96
+    return mean, t * sd / math.sqrt(n)
+
+
+def _combine(members, keys):
+    energy, energy_ci = confidence_interval([r["Energy (Wh)"] for r in members])
+    power, power_ci = confidence_interval([r["Mean Power (W)"] for r in members])
+    duration, _ = confidence_interval([r["Duration (s)"] for r in members])
+    return dict(keys, **{
+        "Runs": len(members), "Mean Duration (s)": duration,
+        "Energy (Wh)": energy, "Energy CI95 (Wh)": energy_ci,
+        "Mean Power (W)": power, "Mean Power CI95 (W)": power_ci,
+    })
+
+
+def summarize_groups(runs):
+    """Combine runs of the same group: mean ± 95 % CI of energy and mean power."""
+    groups = {}
+    for run in runs:
+        if "Energy (Wh)" in run:
+            groups.setdefault(run["Group"], []).append(run)
+    return [_combine(members, {"Group": name}) for name, members in sorted(groups.items())]
+
+
+def summarize_services(runs):
+    """Comparison table with one row per service and resolution over all campaigns.
+
+    Runs differ in length, so mean power is the figure to compare; energy is
+    per run.
+    """
+    services = {}
+    for run in runs:
+        if "Energy (Wh)" in run:
+            services.setdefault((run["Service"], run["Resolution"]), []).append(run)
+    return [_combine(members, {"Service": service, "Resolution": resolution})
+            for (service, resolution), members in sorted(services.items(), key=_service_order)]
+
+
+def _service_order(item):
+    (service, resolution), _ = item
+    return service, int(resolution[:-1]) if resolution else 0
+
+
+def _format(value):
+    if isinstance(value, float):
+        return "" if math.isnan(value) else f"{value:.3f}"
+    return "" if value is None else str(value)
+
+
+def print_table(rows, columns):
+    widths = [max([len(c)] + [len(_format(r.get(c))) for r in rows]) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_format(row.get(c)).ljust(w) for c, w in zip(columns, widths)))
+
+
+def write_csv(filename, rows, columns):
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_format(row.get(c)) for c in columns])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute per-run energy from logged captures.")
+    parser.add_argument("paths", nargs="+", help="Capture files or directories (searched recursively).")
+    parser.add_argument("--csv", type=str, default=None, help="Also write the per-run results to this CSV file.")
+    parser.add_argument("--groups-csv", type=str, default=None, help="Also write the per-group results to this CSV file.")
+    parser.add_argument("--services-csv", type=str, default=None,
+                        help="Also write the per-service and resolution results to this CSV file.")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--cache", type=str, default=DEFAULT_CACHE,
+                        help=f"Cache file for per-file results (default: {DEFAULT_CACHE}).")
+    parser.add_argument("--no-cache", action="store_true", help="Re-read every capture and do not update the cache.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    roots = {}
+    for path in args.paths:
+        root = path if os.path.isdir(path) else None
+        for filename in find_captures([path]):
+            roots.setdefault(filename, root)
+
+    cache = None if args.no_cache else ResultCache(args.cache)
+    results = summarize_files(list(roots), args.jobs, cache)
+    if cache is not None:
+        cache.save()
+
+    runs = []
+    for filename, root in roots.items():
+        summary = results.get(filename)
+        if summary is not None:
+            summary.update(_labels(filename, root))
+            runs.append(summary)
+    skipped = sum(1 for summary in results.values() if summary is None)
+    elapsed = time.perf_counter() - start
+
+    print_table(runs, RUN_COLUMNS)
+    groups = summarize_groups(runs)
+    if groups:
+        print()
+        print_table(groups, list(groups[0]))
+    services = summarize_services(runs)
+    if services:
+        print()
+        print_table(services, list(services[0]))
+    cached = f", {cache.hits} from cache" if cache is not None else ""
+    print(f"\n{len(runs)} runs analyzed{cached}, {skipped} files without power data skipped, in {elapsed:.3f} s")
+
+    if args.csv:
+        write_csv(args.csv, runs, RUN_COLUMNS + ["File"])
+    if args.groups_csv and groups:
+        write_csv(args.groups_csv, groups, list(groups[0]))
+    if args.services_csv and services:
+        write_csv(args.services_csv, services, list(services[0]))
+
+
+if __name__ == "__main__":
+    main()
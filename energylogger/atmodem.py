@@ -0,0 +1,187 @@
+"""Event-driven AT command channel to a modem's serial port."""
+import asyncio
+import collections
+import os
+import termios
+import time
+import tty
+
+# Final result codes that end a response
+_OK = "OK"
+_ERRORS = ("ERROR", "+CME ERROR", "+CMS ERROR")
+
+
+class ATError(Exception):
+    """Raised when the modem answers ERROR or does not answer in time."""
+
+
+class ATModem:
+    """Send AT commands and collect their framed responses without polling.
+
+    The serial device is opened non-blocking in raw mode and read from the
+    event loop whenever data arrives. A response is every line received after
+    a command up to its final result code: command() returns the lines before
+    OK and raises ATError on ERROR, +CME ERROR or when `timeout` passes first.
+    Up to `depth` commands may be in flight at once (pipelining); responses
+    are matched to commands in order. After a timeout the next command first
+    waits (up to its own timeout) for the late answer to finish, so that
+    answer is discarded instead of being taken for the next one. Create the
+    modem inside a running event loop.
+
+    `last_rtt` holds the round-trip time of the last command in seconds;
+    `commands`, `total_rtt` and `max_rtt` accumulate over all of them.
+    """
+
+    def __init__(self, path, baudrate=115200, depth=1):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            _configure(self.fd, baudrate)
+        except (termios.error, ValueError):
+            os.close(self.fd)
+            raise
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(depth)
+        self._write_lock = asyncio.Lock()
+        self._pending = collections.deque()  # [future, lines] per command awaiting its result code
+        self._buffer = bytearray()
+        self._synced = asyncio.Event()  # cleared while a timed-out answer may still arrive
+        self._synced.set()
+        self._closed = False
+
+        self.commands = 0
+        self.last_rtt = 0.0
+        self.total_rtt = 0.0
+        self.max_rtt = 0.0
+
+        self._loop.add_reader(self.fd, self._on_readable)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def mean_rtt(self):
+        return self.total_rtt / self.commands if self.commands else 0.0
+
+    def slot_free(self):
+        """True if another command can be sent without waiting for a response."""
+        return not self._slots.locked()
+
+    async def command(self, command, timeout=1.0):
+        """Send `command` and return its response lines (without echo and OK)."""
+        async with self._slots:
+            if self._closed:
+                raise ATError(f"{self.path} is closed")
+            future = self._loop.create_future()
+            async with self._write_lock:
+                if not self._synced.is_set():
+                    try:
+                        await asyncio.wait_for(self._synced.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        self._synced.set()  # the late answer never came
+                self._pending.append([future, []])
+                start = time.perf_counter()
+                await self._write((command + "\r").encode("ascii"))
+            try:
+                lines = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self._resync(f"no response to {command} within {timeout} s")
+                raise ATError(f"no response to {command} within {timeout} s") from None
+
+            rtt = time.perf_counter() - start
+            self.commands += 1
+            self.last_rtt = rtt
+            self.total_rtt += rtt
+            self.max_rtt = max(self.max_rtt, rtt)
+            return lines
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._loop.remove_reader(self.fd)
+            self._fail_pending(ATError(f"{self.path} is closed"))
+            os.close(self.fd)
+
+    async def _write(self, data):
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                writable = self._loop.create_future()
+                self._loop.add_writer(self.fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self._loop.remove_writer(self.fd)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b""
+            error = e
+        else:
+            error = None
+        if not data:
+            # Device gone (USB unplugged, pty closed)
+            self._loop.remove_reader(self.fd)
+            self._closed = True
+            self._fail_pending(ATError(f"{self.path} closed: {error or 'end of file'}"))
+            return
+
+        self._buffer += data
+        *lines, rest = self._buffer.split(b"\n")
+        self._buffer = bytearray(rest)
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                self._on_line(line)
+
+    def _on_line(self, line):
+        if not self._synced.is_set():
+            # Rest of an answer to a timed-out command
+            if line == _OK or line.startswith(_ERRORS):
+                self._synced.set()
+            return
+        if not self._pending:
+            return  # unsolicited result code
+        future, lines = self._pending[0]
+        if line == _OK:
+            self._pending.popleft()
+            if not future.done():
+                future.set_result(lines)
+        elif line.startswith(_ERRORS):
+            self._pending.popleft()
+            if not future.done():
+                future.set_exception(ATError(line))
+        elif not line.startswith("AT"):  # skip the command echo (ATE1)
+            lines.append(line)
+
+    def _resync(self, reason):
+        """Forget every command in flight after a timeout, so later answers are not misattributed."""
+        self._buffer.clear()
+        self._synced.clear()
+        self._fail_pending(ATError(f"resynchronized: {reason}"))
+
+    def _fail_pending(self, error):
+        while self._pending:
+            future, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+
+def _configure(fd, baudrate):
+    """Put the terminal in raw mode at `baudrate`, 8N1, ignoring modem control lines."""
+    speed = getattr(termios, f"B{baudrate}", None)
+    if speed is None:
+        raise ValueError(f"unsupported baud rate {baudrate}")
+    tty.setraw(fd)
+    attributes = termios.tcgetattr(fd)
+    attributes[2] |= termios.CLOCAL | termios.CREAD
+    attributes[4] = attributes[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attributes)
+    termios.tcflush(fd, termios.TCIOFLUSH)
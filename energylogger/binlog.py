@@ -0,0 +1,255 @@
+"""Append-only binary capture format with fixed-width records.
+
+Layout of a .bin capture:
+
+    8 bytes   magic b"ELOGBIN1"
+    4 bytes   little-endian length N of the JSON schema
+    N bytes   JSON schema {"timestamp": name, "columns": [[name, "f4" | "f8"], ...]}
+    padding   zero bytes up to a multiple of 8
+    records   int64 Unix timestamp (ms) followed by one float per column, little-endian
+
+Records are only ever appended whole, so after a crash at most the last,
+partially written record is lost; readers ignore it and BinaryWriter cuts it
+off before appending again. Missing values (timeouts) are stored as NaN.
+
+Usage:
+    python -m energylogger.binlog info capture.bin
+    python -m energylogger.binlog to-csv capture.bin [-o capture.csv]
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+
+from energylogger.clock import timestamp_ms
+from energylogger.csv_writer import BufferedWriter
+
+MAGIC = b"ELOGBIN1"
+TIMESTAMP_COLUMN = "Unix Timestamp (ms)"
+_TYPE_CODES = {"f4": "f", "f8": "d"}
+_NAN = float("nan")
+
+
+def _encode_header(timestamp, columns):
+    schema = json.dumps({"timestamp": timestamp, "columns": [list(c) for c in columns]}).encode("utf-8")
+    header = MAGIC + struct.pack("<I", len(schema)) + schema
+    return header + b"\0" * (-len(header) % 8)
+
+
+def read_header(file):
+    """Read the schema of an open capture; returns (schema, data_offset)."""
+    prefix = file.read(len(MAGIC) + 4)
+    if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{getattr(file, 'name', 'file')} is not an energylogger binary capture")
+    (length,) = struct.unpack("<I", prefix[len(MAGIC):])
+    schema = json.loads(file.read(length))
+    offset = len(MAGIC) + 4 + length
+    return schema, offset + (-offset % 8)
+
+
+def record_struct(schema):
+    return struct.Struct("<q" + "".join(_TYPE_CODES[t] for _, t in schema["columns"]))
+
+
+class BinaryWriter(BufferedWriter):
+    """BufferedWriter producing fixed-width binary records.
+
+    Rows use the same layout as the CSV header passed in `header`, so a logger
+    can write identical row lists to either format: the first column is the
+    timestamp (int ms, or a string parsed with `timestamp_format` as UTC),
+    columns named in `skip` (e.g. human-readable times) are dropped, and the
+    remaining columns are stored as `dtype` ("f8" or "f4"). Conversion happens
+    on the writer thread, not in the capture loop. Non-numeric values become
+    NaN; a row that cannot be stored at all (its timestamp does not parse) is
+    skipped and counted in `rows_skipped`, the rest of its batch is written.
+    """
+
+    def __init__(self, filename, header, dtype="f8", timestamp_format=None, skip=(), **options):
+        if dtype not in _TYPE_CODES:
+            raise ValueError(f"unsupported dtype {dtype!r} (expected one of {', '.join(_TYPE_CODES)})")
+        self._keep = [i for i, name in enumerate(header) if i > 0 and name not in skip]
+        self.columns = [(header[i], dtype) for i in self._keep]
+        self.timestamp_format = timestamp_format
+        self._header = _encode_header(TIMESTAMP_COLUMN, self.columns)
+        self._struct = record_struct({"columns": self.columns})
+        super().__init__(filename, **options)
+
+    def row_size(self, row):
+        return self._struct.size
+
+    def _open(self, new_file):
+        if new_file:
+            file = open(self.filename, "wb")
+            file.write(self._header)
+            file.flush()
+            os.fsync(file.fileno())
+            return file
+
+        with open(self.filename, "rb") as existing:
+            schema, offset = read_header(existing)
+        if [tuple(c) for c in schema["columns"]] != self.columns:
+            raise ValueError(f"{self.filename} was written with different columns")
+        recover(self.filename)
+        return open(self.filename, "ab")
+
+    def _write_rows(self, rows):
+        pack = self._struct.pack
+        keep = self._keep
+        chunks = []
+        skipped = 0
+        error = None
+        for row in rows:
+            try:
+                timestamp = row[0]
+                if type(timestamp) is not int:
+                    timestamp = timestamp_ms(timestamp, self.timestamp_format)
+                values = [row[i] for i in keep]
+                try:
+                    chunks.append(pack(timestamp, *values))
+                except struct.error:
+                    # Timeout rows and other non-numeric values become NaN
+                    chunks.append(pack(timestamp, *[v if isinstance(v, (int, float)) else _NAN for v in values]))
+            except (TypeError, ValueError, IndexError, OverflowError, struct.error) as e:
+                # One bad row (unparsable timestamp, missing columns) must not cost the batch
+                skipped += 1
+                error = error or e
+        self._file.write(b"".join(chunks))
+        if skipped:
+            self.rows_skipped += skipped
+            print(f"Skipped {skipped} rows that could not be stored in {self.filename}: {error}")
+
+
+def recover(filename):
+    """Cut off a partially written last record; returns the number of whole records."""
+    with open(filename, "r+b") as f:
+        schema, offset = read_header(f)
+        size = os.fstat(f.fileno()).st_size
+        record_size = record_struct(schema).size
+        count = max(0, size - offset) // record_size
+        if offset + count * record_size != size:
+            f.truncate(offset + count * record_size)
+            f.flush()
+            os.fsync(f.fileno())
+    return count
+
+
+class BinaryLog:
+    """Read-only view of a binary capture.
+
+    `records` is a NumPy structured array memory-mapped over the file, and
+    column(name) returns a field of it, so columns are available without
+    copying or parsing. A partially written last record is ignored.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self.schema, self.offset = read_header(f)
+            size = os.fstat(f.fileno()).st_size
+        self.timestamp = self.schema["timestamp"]
+        self.columns = [name for name, _ in self.schema["columns"]]
+        self.record_size = record_struct(self.schema).size
+        self.count = max(0, size - self.offset) // self.record_size
+        self._records = None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def dtype(self):
+        import numpy as np  # only needed for array access
+
+        return np.dtype([(self.timestamp, "<i8")] + [(name, "<" + t) for name, t in self.schema["columns"]])
+
+    @property
+    def records(self):
+        if self._records is None:
+            import numpy as np
+
+            if self.count == 0:
+                self._records = np.empty(0, dtype=self.dtype)
+            else:
+                self._records = np.memmap(self.filename, dtype=self.dtype, mode="r",
+                                          offset=self.offset, shape=(self.count,))
+        return self._records
+
+    def column(self, name):
+        """Return one column (or the timestamp) as a zero-copy NumPy array."""
+        return self.records[name]
+
+    def iter_rows(self):
+        """Yield (timestamp_ms, value, ...) tuples without needing NumPy."""
+        if self.count == 0:
+            return
+        unpack = record_struct(self.schema).iter_unpack
+        end = self.offset + self.count * self.record_size
+        chunk = 4096 * self.record_size
+        with open(self.filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(self.offset, end, chunk):
+                yield from unpack(mm[start:min(start + chunk, end)])
+
+    def iter_range(self, start, end):
+        """Yield the rows with start <= timestamp_ms < end (as iter_rows does).
+
+        Records have a fixed width and increasing timestamps, so the first one
+        is found by bisecting the file; no index is needed.
+        """
+        if self.count == 0:
+            return
+        unpack = record_struct(self.schema).iter_unpack
+        timestamp = struct.Struct("<q").unpack_from
+        with open(self.filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            low, high = 0, self.count
+            while low < high:
+                middle = (low + high) // 2
+                if timestamp(mm, self.offset + middle * self.record_size)[0] < start:
+                    low = middle + 1
+                else:
+                    high = middle
+            end_offset = self.offset + self.count * self.record_size
+            chunk = 4096 * self.record_size
+            for position in range(self.offset + low * self.record_size, end_offset, chunk):
+                for row in unpack(mm[position:min(position + chunk, end_offset)]):
+                    if row[0] >= end:
+                        return
+                    yield row
+
+    def to_csv(self, output):
+        """Write the capture as CSV (timestamp in ms plus one column per value)."""
+        with open(output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([self.timestamp] + self.columns)
+            writer.writerows(self.iter_rows())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or convert energylogger binary captures.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    info = subparsers.add_parser("info", help="Show the schema and record count.")
+    info.add_argument("file")
+    to_csv = subparsers.add_parser("to-csv", help="Convert a binary capture to CSV.")
+    to_csv.add_argument("file")
+    to_csv.add_argument("-o", "--output", help="CSV filename (default: input name with .csv).")
+    args = parser.parse_args()
+
+    try:
+        log = BinaryLog(args.file)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {args.file}: {e}")
+        sys.exit(1)
+
+    if args.command == "info":
+        print(f"{args.file}: {len(log)} records of {log.record_size} bytes")
+        for name, dtype in log.schema["columns"]:
+            print(f"  {name} ({dtype})")
+    else:
+        output = args.output or os.path.splitext(args.file)[0] + ".csv"
+        log.to_csv(output)
+        print(f"Data saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
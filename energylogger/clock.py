@@ -0,0 +1,161 @@
+"""Shared timestamp base for all devices polled by one process, and request timing.
+
+TimeBase maps time.monotonic_ns() readings onto Unix time. With --precise-time
+the loggers stamp each sample at the midpoint of its request (the device
+took the reading somewhere between sending the request and receiving the
+answer) and store half the request time as the uncertainty of that stamp.
+Loggers that read the device clock also estimate its offset from the host
+clock, NTP-style, with OffsetEstimator.
+"""
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+# Columns appended to a capture by PreciseTimestamps
+MIDPOINT_COLUMNS = ["Midpoint (ms)", "Uncertainty (ms)"]
+OFFSET_COLUMNS = ["Device Offset (ms)", "Offset Uncertainty (ms)"]
+
+
+class TimeBase:
+    """Wall-clock timestamps derived from the monotonic clock.
+
+    The wall clock is read once when the TimeBase is created; later timestamps
+    add the monotonic time elapsed since then. Every device stamped from the
+    same TimeBase is therefore on one consistent time axis, unaffected by NTP
+    steps during a capture.
+    """
+
+    def __init__(self):
+        self.anchor_wall_ns = time.time_ns()
+        self.anchor_mono_ns = time.monotonic_ns()
+
+    def to_wall_ns(self, mono_ns):
+        """Convert a time.monotonic_ns() reading to Unix time in nanoseconds."""
+        return self.anchor_wall_ns + (mono_ns - self.anchor_mono_ns)
+
+    def now_ns(self):
+        return self.to_wall_ns(time.monotonic_ns())
+
+    def now_ms(self):
+        """Current Unix time in milliseconds."""
+        return self.now_ns() // 1_000_000
+
+    def midpoint(self, start_ns, end_ns):
+        """(Unix ns, uncertainty ns) of an event between two time.monotonic_ns() readings."""
+        return self.to_wall_ns((start_ns + end_ns) // 2), (end_ns - start_ns) // 2
+
+
+class OffsetEstimator:
+    """NTP-style estimate of a device clock's offset (device minus host) and drift.
+
+    add(start_ns, end_ns, device_ns) takes one request: the host's Unix times
+    when it was sent and answered, and the device clock read in between,
+    truncated to `resolution_ns` (whole seconds for the Gude systemtime). Each
+    request bounds the offset to [device - end, device + resolution - start];
+    intersecting the bounds of the last `window` requests narrows a 1 s clock
+    down to a few ms as the requests fall on different phases of its seconds.
+    When the bounds no longer overlap (drift or a clock step), the oldest
+    requests are dropped until they do. Drift is the change of the offset
+    since the first estimate better than `reference_ns`, once `min_span_ns`
+    have passed.
+    """
+
+    def __init__(self, resolution_ns=1_000_000_000, window=120, reference_ns=50_000_000,
+                 min_span_ns=60_000_000_000):
+        self.resolution_ns = resolution_ns
+        self.reference_ns = reference_ns
+        self.min_span_ns = min_span_ns
+        self.offset_ns = None
+        self.uncertainty_ns = None
+        self.drift_ppm = None
+        self.requests = 0
+        self.discarded = 0
+        self._bounds = deque(maxlen=window)  # (low, high) offset bounds per request
+        self._reference = None  # (host ns, offset ns) of the first good estimate
+
+    def add(self, start_ns, end_ns, device_ns):
+        """Add one request and return the (offset, uncertainty) estimate in ns."""
+        self.requests += 1
+        bounds = self._bounds
+        bounds.append((device_ns - end_ns, device_ns + self.resolution_ns - start_ns))
+        low = max(b[0] for b in bounds)
+        high = min(b[1] for b in bounds)
+        while low > high:
+            bounds.popleft()
+            self.discarded += 1
+            low = max(b[0] for b in bounds)
+            high = min(b[1] for b in bounds)
+        self.offset_ns = (low + high) // 2
+        self.uncertainty_ns = (high - low) // 2
+
+        now = (start_ns + end_ns) // 2
+        if self._reference is None:
+            if self.uncertainty_ns <= self.reference_ns:
+                self._reference = (now, self.offset_ns)
+        elif now - self._reference[0] >= self.min_span_ns:
+            self.drift_ppm = (self.offset_ns - self._reference[1]) / (now - self._reference[0]) * 1e6
+        return self.offset_ns, self.uncertainty_ns
+
+
+class PreciseTimestamps:
+    """Midpoint timestamp columns (and device clock offset columns) for each sample's row.
+
+    `columns` lists the extra column names: MIDPOINT_COLUMNS, plus
+    OFFSET_COLUMNS with `device_clock`. Values are in ms with µs decimals.
+    """
+
+    def __init__(self, device_clock=False, time_base=None):
+        self.time_base = time_base or TimeBase()
+        self.offsets = OffsetEstimator() if device_clock else None
+        self.columns = MIDPOINT_COLUMNS + (OFFSET_COLUMNS if device_clock else [])
+
+    def stamp(self, start_ns, end_ns, device_ns=None):
+        """Values of the extra columns for a request between two time.monotonic_ns() readings."""
+        base = self.time_base
+        midpoint, uncertainty = base.midpoint(start_ns, end_ns)
+        values = [round(midpoint / 1e6, 3), round(uncertainty / 1e6, 3)]
+        if self.offsets is not None:
+            if device_ns is None:
+                values += ["", ""]
+            else:
+                offset, spread = self.offsets.add(base.to_wall_ns(start_ns), base.to_wall_ns(end_ns), device_ns)
+                values += [round(offset / 1e6, 3), round(spread / 1e6, 3)]
+        return values
+
+    def failed(self):
+        """Values of the extra columns for a failed sample."""
+        return [""] * len(self.columns)
+
+    def report(self):
+        """Summary lines for the end of a capture."""
+        offsets = self.offsets
+        if offsets is None or offsets.offset_ns is None:
+            return []
+        drift = f", drift {offsets.drift_ppm:+.1f} ppm" if offsets.drift_ppm is not None else ""
+        return [f"device clock: offset {offsets.offset_ns / 1e6:+.3f} ms "
+                f"(± {offsets.uncertainty_ns / 1e6:.3f} ms){drift}"]
+
+
+def add_clock_arguments(parser):
+    """Add the timestamp precision option to an argparse parser."""
+    parser.add_argument("--precise-time", action="store_true",
+                        help="Add the request midpoint (Unix ms, µs resolution) and its uncertainty to each row, "
+                             "and the estimated device clock offset where the device clock is logged.")
+
+
+def timestamp_ms(value, timestamp_format=None):
+    """Unix milliseconds of a row timestamp: an int, or a string in `timestamp_format` taken as UTC.
+
+    "ISO8601" (see schemas) parses ISO 8601 strings, honouring their offset.
+    """
+    if type(value) is int:
+        return value
+    if timestamp_format is None:
+        return int(value)
+    if timestamp_format == "ISO8601":
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp() * 1000)
+    parsed = datetime.strptime(value, timestamp_format).replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
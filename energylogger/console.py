@@ -0,0 +1,132 @@
+"""Console output for the loggers: a throttled status line, full per-sample output, or nothing.
+
+--console status (the default) redraws one line at --ui-rate frames per
+second with the latest values, the sample rate and the fetch latency of the
+samples since the previous frame. Samples only update a few counters; the
+line is formatted when a frame is drawn, so the cost does not grow with the
+sample rate. --console samples prints every sample in full (as far as the
+terminal keeps up; it always shows the latest), and --quiet prints nothing.
+"""
+import sys
+import threading
+import time
+
+from energylogger.pipeline import DROP_OLDEST, Sink
+
+STATUS = "status"
+SAMPLES = "samples"
+CONSOLE_MODES = (STATUS, SAMPLES)
+
+
+class StatusLine:
+    """Pipeline sink that redraws a one-line status at a fixed rate.
+
+    `render(record)` returns the text for the latest record. `latency(record)`
+    (seconds, optional) and `failed(record)` (optional) feed the statistics.
+    On a terminal the line is redrawn in place; otherwise one line is
+    written per frame.
+    """
+
+    name = "console"
+
+    def __init__(self, render, latency=None, failed=None, interval=0.5, stream=None):
+        self.render = render
+        self.latency = latency
+        self.failed = failed
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.in_place = self.stream.isatty()
+
+        self.handled = 0
+        self.failures = 0
+        self.frames = 0
+        self._latest = None
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._latency_max = 0.0  # since the last frame
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="console-status", daemon=True)
+        self._thread.start()
+
+    def put(self, record, now=None):
+        """Record a sample; O(1), nothing is formatted here."""
+        self._latest = record
+        self.handled += 1
+        if self.failed is not None and self.failed(record):
+            self.failures += 1
+        if self.latency is not None:
+            latency = self.latency(record)
+            if latency is not None:
+                self._latency_sum += latency
+                self._latency_count += 1
+                if latency > self._latency_max:
+                    self._latency_max = latency
+
+    def summary(self):
+        return f"{self.name}: {self.frames} status frames for {self.handled} samples"
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        if self.frames and self.in_place:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def _run(self):
+        last_time = time.perf_counter()
+        last_handled = last_sum = last_count = 0
+        while not self._stop.wait(self.interval):
+            record = self._latest
+            if record is None:
+                continue
+            now = time.perf_counter()
+            handled, latency_sum, latency_count = self.handled, self._latency_sum, self._latency_count
+            latency_max, self._latency_max = self._latency_max, 0.0
+
+            parts = [f"{(handled - last_handled) / (now - last_time):6.1f} samples/s"]
+            if latency_count > last_count:
+                mean = (latency_sum - last_sum) / (latency_count - last_count)
+                parts.append(f"latency {mean * 1000:6.2f} ms (max {latency_max * 1000:6.2f})")
+            if self.failed is not None:
+                parts.append(f"{self.failures} failed")
+            try:
+                parts.append(self.render(record))
+            except Exception as e:
+                parts.append(f"({e})")
+            self._draw(" | ".join(parts))
+
+            last_time, last_handled, last_sum, last_count = now, handled, latency_sum, latency_count
+
+    def _draw(self, line):
+        try:
+            if self.in_place:
+                self.stream.write("\r" + line + "\x1b[K")
+            else:
+                self.stream.write(line + "\n")
+            self.stream.flush()
+        except (OSError, ValueError):
+            return
+        self.frames += 1
+
+
+def add_console_arguments(parser):
+    """Add the console output options to an argparse parser."""
+    group = parser.add_argument_group("console")
+    group.add_argument("--console", choices=CONSOLE_MODES, default=STATUS,
+                       help="status: one line refreshed --ui-rate times per second; samples: print every "
+                            "sample in full (default: status).")
+    group.add_argument("--ui-rate", type=float, default=2.0,
+                       help="Status line refreshes per second (default: 2).")
+    group.add_argument("--quiet", action="store_true", help="No console output while logging.")
+    return group
+
+
+def console_from_args(args, print_sample, render, latency=None, failed=None):
+    """Return the console sink selected by the command-line options (None with --quiet)."""
+    if args.quiet:
+        return None
+    if args.console == SAMPLES:
+        # Keep only the latest sample, so a slow terminal skips samples instead of falling behind
+        return Sink("console", print_sample, capacity=1, overflow=DROP_OLDEST, drain=False)
+    return StatusLine(render, latency, failed, interval=1.0 / max(args.ui_rate, 0.1))
@@ -0,0 +1,389 @@
+import atexit
+import csv
+import os
+import threading
+import time
+
+
+class BufferedWriter:
+    """Keep an output file open and write rows to it in batches from a background thread.
+
+    Rows are buffered in memory and flushed when `flush_rows` rows are pending,
+    when `flush_interval` seconds have passed since the last flush, or when the
+    writer is closed (also done automatically at interpreter exit). The capture
+    loop only appends to a list, so it never waits on the disk.
+
+    `fsync_interval` controls durability: None never fsyncs (except on close),
+    0 fsyncs after every flush, and a positive value fsyncs at most once per
+    that many seconds. `on_flush(rows, seconds)` is called after each flush.
+    Errors writing the file are printed and counted in `errors`, and that
+    batch is lost; the writer keeps going with the next one.
+
+    Subclasses implement _open() and _write_rows() for their file format.
+    Rows a format cannot represent are counted in `rows_skipped`; rows it
+    cannot write yet are returned by _write_rows() and retried first on the
+    next flush.
+    """
+
+    def __init__(self, filename, flush_rows=100, flush_interval=1.0,
+                 fsync_interval=None, on_flush=None):
+        self.filename = filename
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.on_flush = on_flush
+
+        # Flush statistics
+        self.flush_count = 0
+        self.rows_written = 0
+        self.rows_skipped = 0
+        self.errors = 0
+        self.last_flush_time = 0.0
+        self.max_flush_time = 0.0
+
+        self._rows = []
+        self._held = 0  # rows at the front of _rows that a flush handed back
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._last_fsync = time.monotonic()
+
+        new_file = not os.path.isfile(filename) or os.path.getsize(filename) == 0
+        self._file = self._open(new_file)
+
+        self._thread = threading.Thread(target=self._run, name=f"csv-writer:{filename}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def writerow(self, row):
+        """Queue a single row; returns immediately."""
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"writer for {self.filename} is closed")
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_rows:
+                self._cond.notify()
+
+    def writerows(self, rows):
+        """Queue several rows at once."""
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"writer for {self.filename} is closed")
+            self._rows.extend(rows)
+            if len(self._rows) >= self.flush_rows:
+                self._cond.notify()
+
+    @property
+    def pending(self):
+        """Number of rows buffered but not yet written."""
+        return len(self._rows)
+
+    def flush(self):
+        """Write all pending rows now, from the calling thread."""
+        with self._write_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+                self._held = 0
+            self._flush_rows(rows)
+
+    def close(self):
+        """Flush remaining rows, fsync and close the file."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        if self._rows:
+            print(f"Error: {len(self._rows)} rows could not be written to {self.filename}")
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            print(f"Error syncing {self.filename}: {e}")
+        self._file.close()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        """Background loop: wait for enough rows or the flush interval, then write."""
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval if self.flush_interval else None
+                while not self._closed and len(self._rows) - self._held < self.flush_rows:
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep the thread alive, or rows would pile up in memory until exit
+                self.errors += 1
+                print(f"Error in the writer for {self.filename}: {e}")
+
+    def _flush_rows(self, rows):
+        if not rows:
+            return
+        start = time.perf_counter()
+        skipped = self.rows_skipped
+        try:
+            held = self._write_rows(rows) or []
+            self._file.flush()
+            if self.fsync_interval is not None:
+                now = time.monotonic()
+                if now - self._last_fsync >= self.fsync_interval:
+                    os.fsync(self._file.fileno())
+                    self._last_fsync = now
+        except Exception as e:
+            # OSError from the disk, or anything a row makes the format or the index raise
+            self.errors += 1
+            print(f"Error writing {len(rows)} rows to {self.filename}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        if held:
+            with self._cond:
+                self._rows[:0] = held
+                self._held = len(held)
+
+        written = len(rows) - len(held)
+        self.flush_count += 1
+        self.rows_written += written - (self.rows_skipped - skipped)
+        self.last_flush_time = elapsed
+        self.max_flush_time = max(self.max_flush_time, elapsed)
+        if self.on_flush:
+            self.on_flush(written, elapsed)
+
+    def row_size(self, row):
+        """Bytes `row` takes in the file (an estimate where the format varies)."""
+        raise NotImplementedError
+
+    def _open(self, new_file):
+        """Open and return the output file (appending if it exists)."""
+        raise NotImplementedError
+
+    def _write_rows(self, rows):
+        """Write `rows`; return those that must wait for the next flush (None if all were written)."""
+        raise NotImplementedError
+
+
+class BufferedCSVWriter(BufferedWriter):
+    """BufferedWriter for CSV files; `header` is written when the file is new.
+
+    With `index_every` > 0 the sparse time index `<filename>.idx` (see
+    energylogger.index) gets an entry every that many rows; the first column
+    holds the timestamps, as Unix ms or in `timestamp_format`.
+    """
+
+    def __init__(self, filename, header=None, index_every=0, timestamp_format=None, **options):
+        self.header = header
+        self.index_every = index_every
+        self.timestamp_format = timestamp_format
+        self._index = None
+        super().__init__(filename, **options)
+
+    def close(self):
+        super().close()
+        if self._index is not None:
+            self._index.close()
+
+    def row_size(self, row):
+        # Formatted like csv.writer does: comma separated, \r\n terminated (quoting is rare)
+        return len(",".join(map(str, row)).encode("utf-8")) + 2
+
+    def _open(self, new_file):
+        file = open(self.filename, mode="a", newline="")
+        self._writer = csv.writer(file)
+        if self.header and new_file:
+            self._writer.writerow(self.header)
+            file.flush()
+        if self.index_every:
+            from energylogger.index import CaptureIndexer
+
+            self._index = CaptureIndexer(self.filename, self.index_every, self.timestamp_format, new_file)
+        return file
+
+    def _write_rows(self, rows):
+        if self._index is None:
+            self._writer.writerows(rows)
+            return
+        # Write up to each indexed row, whose offset is where the file ends at that point
+        index = self._index
+        position = 0
+        while position < len(rows):
+            due = index.due()
+            if due == 0:
+                index.add(rows[position][0], self._file.tell())
+                due = index.every
+            chunk = rows[position:position + due]
+            self._writer.writerows(chunk)
+            index.rows += len(chunk)
+            position += len(chunk)
+        index.flush()
+
+
+class DynamicCSVWriter(BufferedCSVWriter):
+    """BufferedCSVWriter whose columns grow as records bring new keys.
+
+    Records are written with writerecord(first, values), where `values` maps
+    column names to values. The column list is read from the file once when
+    an existing file is opened and is kept in memory afterwards; new keys
+    become new columns on the right. When that happens the writer thread
+    migrates the file: it copies the rows below the extended header into a
+    temporary file, fsyncs it and renames it over the original, so earlier
+    rows are never lost and a crash leaves either the old or the new file.
+    If the migration fails, rows with the new columns stay queued until a
+    later flush manages it.
+    """
+
+    def __init__(self, filename, first_column="Timestamp", **options):
+        self.first_column = first_column
+        self.columns = []
+        self.migrations = 0
+        self._known = set()
+        self._header_columns = None  # value columns in the file's header, None before it is written
+        super().__init__(filename, **options)
+
+    def writerecord(self, first, values):
+        """Queue one row: `first` followed by `values` in column order ("" where missing)."""
+        if not self._known.issuperset(values):
+            for name in values:
+                if name not in self._known:
+                    self._known.add(name)
+                    self.columns.append(name)
+        self.writerow([first] + [values.get(name, "") for name in self.columns])
+
+    def _open(self, new_file):
+        if not new_file:
+            with open(self.filename, "r", newline="") as file:
+                header = next(csv.reader(file), [])
+            self.columns = header[1:]
+            self._known = set(self.columns)
+            self._header_columns = len(self.columns)
+        file = open(self.filename, mode="a", newline="")
+        self._writer = csv.writer(file)
+        return file
+
+    def _write_rows(self, rows):
+        # Rows only ever contain columns that existed when they were queued
+        columns = list(self.columns)
+        held = None
+        if self._header_columns is None:
+            self._writer.writerow([self.first_column] + columns)
+            self._header_columns = len(columns)
+        elif len(columns) > self._header_columns:
+            try:
+                self._migrate(columns)
+            except OSError as e:
+                # Write the rows that fit the old header and keep the wider ones
+                # queued; the migration is retried on the next flush
+                print(f"Error adding columns to {self.filename}: {e}")
+                fit = 0
+                while fit < len(rows) and len(rows[fit]) <= self._header_columns + 1:
+                    fit += 1
+                rows, held = rows[:fit], rows[fit:]
+        width = self._header_columns + 1
+        self._writer.writerows(row if len(row) == width else row + [""] * (width - len(row)) for row in rows)
+        return held
+
+    def _migrate(self, columns):
+        """Rewrite the file with the extended header, padding the existing rows."""
+        temporary = self.filename + ".tmp"
+        width = len(columns) + 1
+        self._file.flush()
+        try:
+            with open(self.filename, "r", newline="") as source, open(temporary, "w", newline="") as target:
+                reader = csv.reader(source)
+                next(reader, None)
+                writer = csv.writer(target)
+                writer.writerow([self.first_column] + columns)
+                for row in reader:
+                    writer.writerow(row + [""] * (width - len(row)))
+                target.flush()
+                os.fsync(target.fileno())
+            self._file.close()
+            os.replace(temporary, self.filename)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        finally:
+            if self._file.closed:
+                self._file = open(self.filename, mode="a", newline="")
+                self._writer = csv.writer(self._file)
+        self._header_columns = len(columns)
+        self.migrations += 1
+
+
+def add_writer_arguments(parser):
+    """Add the buffered writer options to an argparse parser."""
+    group = parser.add_argument_group("output")
+    group.add_argument("--format", choices=("csv", "bin"), default="csv",
+                       help="Output format: text CSV or fixed-width binary records (a .csv name becomes .bin; "
+                            "convert with 'python -m energylogger.binlog to-csv'). Default: csv.")
+    group.add_argument("--dtype", choices=("f8", "f4"), default="f8",
+                       help="Float width of the binary format columns (default: f8).")
+    group.add_argument("--flush-rows", type=int, default=100,
+                       help="Write buffered rows to disk after this many samples (default: 100).")
+    group.add_argument("--flush-interval", type=float, default=1.0,
+                       help="Write buffered rows to disk at least this often, in seconds (default: 1).")
+    group.add_argument("--fsync-interval", type=float, default=None,
+                       help="fsync the output at most once per this many seconds; 0 syncs every flush "
+                            "(default: only on exit).")
+    group.add_argument("--index-every", type=int, default=0,
+                       help="Keep the CSV's time index (<csv>.idx, see energylogger.index) up to date while "
+                            "logging, with an entry every this many rows (default: 0, off; the index is built "
+                            "on the first query instead).")
+    return group
+
+
+def writer_from_args(args, filename, header, timestamp_format=None, skip=(), **kwargs):
+    """Create a CSV or binary writer configured from parsed command-line arguments.
+
+    `timestamp_format` is the format of the first column (see BinaryWriter and
+    BufferedCSVWriter); `skip` only applies to the binary format.
+    If the parser also has the segment options (see add_segment_arguments),
+    --segment-size/--segment-time and --events wrap it in a SegmentedWriter
+    and an EventWriter (see energylogger.segments). If it has the
+    aggregation options (see add_aggregate_arguments) and they are used, the
+    writer is wrapped in an AggregatingWriter, which still sees failed samples.
+    """
+    flush_options = dict(
+        flush_rows=args.flush_rows,
+        flush_interval=args.flush_interval,
+        fsync_interval=args.fsync_interval,
+    )
+    options = dict(flush_options, **kwargs)
+
+    def open_writer(name):
+        if args.format == "bin":
+            from energylogger.binlog import BinaryWriter
+
+            return BinaryWriter(name, header, dtype=args.dtype, timestamp_format=timestamp_format,
+                                skip=skip, **options)
+        return BufferedCSVWriter(name, header, index_every=getattr(args, "index_every", 0),
+                                 timestamp_format=timestamp_format, **options)
+
+    def raw_writer():
+        from energylogger.segments import segments_from_args
+
+        name = filename
+        if args.format == "bin" and filename.endswith(".csv"):
+            name = filename[:-len(".csv")] + ".bin"
+        return segments_from_args(args, open_writer, name, header, timestamp_format=timestamp_format,
+                                  **flush_options)
+
+    if getattr(args, "aggregate", None) or getattr(args, "ring_buffer", 0) or getattr(args, "no_raw", False):
+        from energylogger.aggregate import aggregate_from_args
+
+        return aggregate_from_args(args, raw_writer, filename, header, timestamp_format=timestamp_format,
+                                   skip=skip, **flush_options)
+    return raw_writer()
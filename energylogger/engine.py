@@ -0,0 +1,206 @@
+"""Poll many meters concurrently from one asyncio event loop.
+
+Devices are listed in a JSON config file:
+
+    {
+      "output_dir": "captures",
+      "devices": [
+        {"name": "pi", "type": "gude-http", "host": "192.168.0.2", "rate": 1.0},
+        {"name": "modem", "type": "modbus", "host": "192.168.0.3", "rate": 0.1}
+      ]
+    }
+
+Every device runs on its own fixed-rate schedule and writes its own CSV
+(`<output_dir>/<name>.csv` unless "csv" is given) and, with "index_every"
+set, keeps its time index (`<csv>.idx`, an entry every that many rows, see
+energylogger.index) up to date, while all samples are stamped from one shared
+TimeBase. HTTP connections are pooled per host and Modbus clients are shared
+per host:port.
+
+Usage: python -m energylogger.engine --config devices.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from energylogger import modbus
+from energylogger.clock import TimeBase
+from energylogger.csv_writer import BufferedCSVWriter
+from energylogger.gude import METRICS, component_mask, status_decoder, status_path
+from energylogger.httpclient import AsyncHTTPPool, HTTPError
+from energylogger.registers import GUDE_LINE_IN, RegisterDecoder, load_register_map, select
+from energylogger.scheduler import SKIP, FixedRateScheduler
+
+TIMESTAMP_COLUMN = "Unix Timestamp (ms)"
+ELAPSED_COLUMN = "Elapsed Time (µs)"
+
+
+class GudeHTTPDevice:
+    """Gude meter polled through its JSON status page."""
+
+    def __init__(self, config, engine):
+        self.host = config["host"]
+        self.port = config.get("port", 80)
+        self.path = config.get("path", status_path(config.get("components", component_mask())))
+        self.pool = engine.http_pool
+        self.columns = METRICS
+        _, self.decode = status_decoder(config.get("json", "auto"))
+
+    async def read(self):
+        body = await self.pool.get(self.host, self.port, self.path)
+        return self.decode(body)[0]
+
+    async def close(self):
+        pass
+
+
+class ModbusDevice:
+    """Meter read over Modbus TCP through a compiled register map."""
+
+    def __init__(self, config, engine):
+        self.host = config["host"]
+        self.port = config.get("port", 502)
+        register_map = load_register_map(config["register_map"]) if "register_map" in config else GUDE_LINE_IN
+        if "registers" in config:
+            register_map = select(register_map, config["registers"])
+        self.decoder = RegisterDecoder(register_map, max_gap=config.get("max_gap"))
+        self.columns = self.decoder.names
+        self.clients = engine.modbus_clients
+
+    async def read(self):
+        client = await self.clients.get(self.host, self.port)
+        blocks = await modbus.read_ranges(client, self.decoder.plan)
+        if not any(block is not None for block in blocks):
+            raise ConnectionError(f"no registers could be read from {self.host}:{self.port}")
+        return self.decoder.decode(blocks)
+
+    async def close(self):
+        pass
+
+
+class ModbusClients:
+    """One shared AsyncModbusTcpClient per host:port."""
+
+    def __init__(self):
+        self._clients = {}
+
+    async def get(self, host, port):
+        client = self._clients.get((host, port))
+        if client is None:
+            from pymodbus.client import AsyncModbusTcpClient  # only needed when Modbus devices are configured
+            client = self._clients[(host, port)] = AsyncModbusTcpClient(host, port=port)
+        if not client.connected:
+            await client.connect()
+            if not client.connected:
+                raise ConnectionError(f"failed to connect to Modbus server {host}:{port}")
+        return client
+
+    async def close(self):
+        for client in self._clients.values():
+            result = client.close()  # a coroutine in older pymodbus releases
+            if asyncio.iscoroutine(result):
+                await result
+        self._clients.clear()
+
+
+# Device "type" values accepted in the config file
+DEVICE_TYPES = {
+    "gude-http": GudeHTTPDevice,
+    "modbus": ModbusDevice,
+}
+
+
+class Engine:
+    """Run every configured device on the current event loop."""
+
+    def __init__(self, config):
+        self.config = config
+        self.time_base = TimeBase()
+        http = config.get("http", {})
+        self.http_pool = AsyncHTTPPool(max_per_host=http.get("max_per_host", 1), timeout=http.get("timeout", 5.0))
+        self.modbus_clients = ModbusClients()
+        self.writer_options = {key: config[key] for key in ("flush_rows", "flush_interval", "fsync_interval")
+                               if key in config}
+        self.writer_options["index_every"] = config.get("index_every", 0)
+
+        output_dir = config.get("output_dir", ".")
+        os.makedirs(output_dir, exist_ok=True)
+        self.devices = []
+        names = set()
+        for device_config in config["devices"]:
+            name = device_config["name"]
+            if name in names:
+                raise ValueError(f"duplicate device name {name!r}")
+            names.add(name)
+            device_type = DEVICE_TYPES.get(device_config.get("type"))
+            if device_type is None:
+                raise ValueError(f"device {name!r}: unknown type {device_config.get('type')!r} "
+                                 f"(expected one of {', '.join(DEVICE_TYPES)})")
+            device = device_type(device_config, self)
+            device.name = name
+            device.rate = device_config.get("rate", 1.0)
+            device.missed = device_config.get("missed", SKIP)
+            device.csv = device_config.get("csv", os.path.join(output_dir, f"{name}.csv"))
+            self.devices.append(device)
+
+    async def run(self, duration=None):
+        """Poll all devices until cancelled or for `duration` seconds."""
+        writers = [
+            BufferedCSVWriter(device.csv, [TIMESTAMP_COLUMN, *device.columns, ELAPSED_COLUMN], **self.writer_options)
+            for device in self.devices
+        ]
+        tasks = [asyncio.create_task(self._poll(device, writer), name=device.name)
+                 for device, writer in zip(self.devices, writers)]
+        try:
+            if duration is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.wait(tasks, timeout=duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for device in self.devices:
+                await device.close()
+            await self.http_pool.close()
+            await self.modbus_clients.close()
+            for writer in writers:
+                writer.close()
+
+    async def _poll(self, device, writer):
+        scheduler = FixedRateScheduler(device.rate, device.missed)
+        failed = ["TIMEOUT"] * len(device.columns)
+        while True:
+            await scheduler.wait_async()
+            start = time.monotonic_ns()
+            try:
+                values = await device.read()
+            except (HTTPError, ConnectionError, OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                print(f"{device.name}: Error fetching data: {e}")
+                values = failed
+            end = time.monotonic_ns()
+            writer.writerow([self.time_base.to_wall_ns(end) // 1_000_000, *values, (end - start) // 1000])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll several meters concurrently and save each to its own CSV file.")
+    parser.add_argument("--config", type=str, required=True, help="JSON file listing the devices to poll.")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds (default: run until Ctrl+C).")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    engine = Engine(config)
+    for device in engine.devices:
+        print(f"{device.name}: polling every {device.rate} s -> {device.csv}")
+
+    try:
+        asyncio.run(engine.run(args.duration))
+    except KeyboardInterrupt:
+        print("\nPolling stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Gude Expert Power Control JSON status interface."""
+import json
+import time
+
+from energylogger.timing import CONNECT, PARSE, REQUEST
+
+# statusjsn.js "components" bits (Gude HTTP interface documentation)
+ALL_COMPONENTS = 1073741823
+COMPONENT_SENSOR_VALUES = 0x4000
+
+# Status document with every component the device offers
+STATUS_PATH = f"/statusjsn.js?components={ALL_COMPONENTS}"
+
+# Values of sensor_values[0].values[0], in device order
+METRICS = (
+    "Voltage (V)", "Current (A)", "Frequency (Hz)", "Phase (deg)",
+    "Active Power (W)", "Reactive Power (VAR)", "Apparent Power (VA)",
+    "Power Factor (PF)", "Total Energy (kWh)", "Resettable Energy (kWh)",
+)
+
+
+class GudeError(Exception):
+    """Raised when the status document cannot be fetched."""
+
+
+# Errors of a kept-alive connection the device has closed, worth one retry on a new connection
+_CLOSED = (ConnectionResetError, BrokenPipeError)  # includes http.client.RemoteDisconnected
+
+
+def component_mask(metrics=METRICS, clock=False):
+    """Return the smallest `components` mask known to deliver the requested data.
+
+    All line-in metrics come from sensor_values, so that bit alone is enough.
+    The bit for the "clock" section is not documented for our firmware, so
+    asking for the device clock gives the full mask; GudeClient then looks
+    the bit up on the device (see find_clock_mask).
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise KeyError(f"unknown metrics: {', '.join(sorted(unknown))}")
+    if clock:
+        return ALL_COMPONENTS
+    return COMPONENT_SENSOR_VALUES if metrics else 0
+
+
+def find_clock_mask(fetch):
+    """Find the sensor values mask plus the one components bit that adds the "clock" section.
+
+    `fetch(components)` returns the decoded status document for a mask. The
+    candidate bits are bisected, which takes six requests. Returns None if
+    no single bit delivers the clock.
+    """
+    candidates = [1 << i for i in range(ALL_COMPONENTS.bit_length()) if 1 << i != COMPONENT_SENSOR_VALUES]
+    while len(candidates) > 1:
+        half = candidates[:len(candidates) // 2]
+        if "clock" in fetch(COMPONENT_SENSOR_VALUES | sum(half)):
+            candidates = half
+        else:
+            candidates = candidates[len(half):]
+    mask = COMPONENT_SENSOR_VALUES | candidates[0]
+    return mask if "clock" in fetch(mask) else None
+
+
+def status_path(components):
+    return f"/statusjsn.js?components={components}"
+
+
+def extract_values(data):
+    """Return the line-in sensor values of a decoded status document, in METRICS order.
+
+    Raises KeyError or IndexError if the document does not have the expected layout.
+    """
+    sensor_values = data["sensor_values"][0]["values"][0]
+    return [sensor_values[i]["v"] for i in range(len(METRICS))]
+
+
+# JSON backends for status_decoder(), in the order "auto" tries them
+JSON_BACKENDS = ("auto", "msgspec", "orjson", "json")
+
+
+def status_decoder(backend="auto", clock=False):
+    """Return (name, decode) for a JSON backend; decode(body) gives (values, systemtime).
+
+    `values` are the line-in sensor values in METRICS order and `systemtime`
+    the device clock section (None unless `clock`). msgspec decodes only these
+    two paths into typed structs and skips the rest of the document; orjson
+    and json build the whole tree. "auto" takes the first one installed. An
+    explicitly requested backend that is not installed raises ImportError.
+    Malformed documents raise ValueError, KeyError or IndexError.
+    """
+    if backend == "auto":
+        for name in JSON_BACKENDS[1:-1]:
+            try:
+                return status_decoder(name, clock)
+            except ImportError:
+                pass
+        backend = "json"
+    if backend == "msgspec":
+        return backend, _msgspec_decoder(clock)
+    if backend == "orjson":
+        import orjson
+
+        return backend, _tree_decoder(orjson.loads, clock)
+    if backend == "json":
+        return backend, _tree_decoder(json.loads, clock)
+    raise ValueError(f"unknown JSON backend {backend!r} (expected one of {', '.join(JSON_BACKENDS)})")
+
+
+def _tree_decoder(loads, clock):
+    def decode(body):
+        data = loads(body)
+        return extract_values(data), data["clock"]["systemtime"] if clock else None
+    return decode
+
+
+def _msgspec_decoder(clock):
+    from typing import Any, Dict, List
+
+    import msgspec
+
+    class Value(msgspec.Struct):
+        v: Any = None
+
+    class SensorGroup(msgspec.Struct):
+        values: List[List[Value]]
+
+    class Clock(msgspec.Struct):
+        systemtime: Dict[str, Any]
+
+    # Fields not declared here are skipped by the decoder without being built
+    if clock:
+        class Status(msgspec.Struct):
+            sensor_values: List[SensorGroup]
+            clock: Clock
+    else:
+        class Status(msgspec.Struct):
+            sensor_values: List[SensorGroup]
+
+    decoder = msgspec.json.Decoder(Status)
+    count = len(METRICS)
+
+    def decode(body):
+        try:
+            status = decoder.decode(body)
+        except msgspec.DecodeError as e:  # also covers ValidationError
+            raise ValueError(str(e)) from None
+        values = status.sensor_values[0].values[0]
+        if len(values) < count:
+            raise IndexError(f"expected {count} line-in values, got {len(values)}")
+        return [values[i].v for i in range(count)], status.clock.systemtime if clock else None
+    return decode
+
+
+class GudeClient:
+    """Fetch the status document over one persistent keep-alive connection.
+
+    After each fetch(), `connect_time` holds the seconds spent opening a new
+    TCP connection (0 when the kept-alive one was reused) and `transfer_time`
+    the seconds from sending the request to having read the whole body.
+    `parse_time` is the seconds fetch() or fetch_values() spent decoding the
+    JSON. fetch_values() decodes with `json_backend` (see status_decoder).
+    `sent_ns` and `answered_ns` are the time.monotonic_ns() readings before
+    sending the request and after receiving the response headers, which
+    bracket the moment the device took the reading.
+
+    With `clock` and no explicit `components`, the first fetch looks up the
+    clock's components bit on the device (find_clock_mask) and the client
+    asks for just that and the sensor values from then on.
+    """
+
+    def __init__(self, host, port=80, components=None, clock=False, timeout=5.0, json_backend="auto"):
+        import http.client  # noqa: F401 (loaded with the client, not the module, but before the first timed request)
+
+        self.json_backend, self._decode = status_decoder(json_backend, clock)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._find_clock = clock and components is None
+        if components is None:
+            components = component_mask(clock=clock)
+        self.path = status_path(components)
+        self.connect_time = 0.0
+        self.transfer_time = 0.0
+        self.parse_time = 0.0
+        self.sent_ns = 0
+        self.answered_ns = 0
+        self.connections = 0
+        self._conn = None
+
+    def fetch(self):
+        """Return the decoded status document, raising GudeError on failure."""
+        body = self.fetch_raw()
+        start = time.perf_counter()
+        data = json.loads(body)
+        self.parse_time = time.perf_counter() - start
+        return data
+
+    def fetch_values(self):
+        """Return (line-in values, device systemtime or None); see status_decoder()."""
+        body = self.fetch_raw()
+        start = time.perf_counter()
+        result = self._decode(body)
+        self.parse_time = time.perf_counter() - start
+        return result
+
+    def fetch_raw(self):
+        """Return the raw status document bytes, raising GudeError on failure."""
+        import http.client
+
+        if self._find_clock:
+            self._find_clock = False
+            self._trim_clock_query()
+
+        # A kept-alive connection may have been closed by the device; retry once on a new one.
+        # Not after a timeout: that would stall the poll for twice the timeout.
+        reused = self._conn is not None
+        try:
+            return self._fetch()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            if not reused or not isinstance(e, _CLOSED):
+                raise GudeError(f"{type(e).__name__}: {e}") from e
+        try:
+            return self._fetch()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise GudeError(f"{type(e).__name__}: {e}") from e
+
+    def record_timings(self, timings):
+        """Add the connect (if one was opened), request and parse times of the last fetch to a Timings."""
+        if self.connect_time:
+            timings.record(CONNECT, self.connect_time)
+        timings.record(REQUEST, self.transfer_time)
+        timings.record(PARSE, self.parse_time)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _trim_clock_query(self):
+        """Replace the full components mask with the sensor values and clock bits, if the device has one."""
+        full = self.path
+
+        def fetch(components):
+            self.path = status_path(components)
+            return json.loads(self.fetch_raw())
+
+        try:
+            mask = find_clock_mask(fetch)
+        except GudeError:
+            # Device not reachable yet: this counts as the failed fetch, look again next time
+            self.path = full
+            self._find_clock = True
+            raise
+        except (ValueError, KeyError, TypeError):
+            mask = None
+        self.path = full if mask is None else status_path(mask)
+
+    def _fetch(self):
+        import http.client
+
+        self.connect_time = 0.0
+        if self._conn is None:
+            start = time.perf_counter()
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.connect()
+            self._conn = conn
+            self.connections += 1
+            self.connect_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.sent_ns = time.monotonic_ns()
+        self._conn.request("GET", self.path, headers={"Accept": "application/json"})
+        response = self._conn.getresponse()
+        self.answered_ns = time.monotonic_ns()
+        body = response.read()
+        self.transfer_time = time.perf_counter() - start
+        if response.will_close:
+            self.close()
+        if not 200 <= response.status < 300:
+            raise GudeError(f"HTTP {response.status} {response.reason} for http://{self.host}:{self.port}{self.path}")
+        return body
+
+
+def add_gude_arguments(parser):
+    """Add the device address and query options to an argparse parser."""
+    parser.add_argument("--host", type=str, default="192.168.0.2", help="Address of the Gude meter (default: 192.168.0.2).")
+    parser.add_argument("--port", type=int, default=80, help="HTTP port of the Gude meter (default: 80).")
+    parser.add_argument("--components", type=int, default=None,
+                        help="Override the statusjsn.js components mask (default: smallest mask for the logged data).")
+    parser.add_argument("--json", choices=JSON_BACKENDS, default="auto",
+                        help="JSON decoder for the status document: msgspec (decodes only the needed fields), "
+                             "orjson or json; auto takes the fastest one installed (default: auto).")
+
+
+def client_from_args(args, clock=False):
+    """Create a GudeClient configured from parsed command-line arguments."""
+    backend = getattr(args, "json", "auto")
+    try:
+        return GudeClient(args.host, args.port, components=args.components, clock=clock, json_backend=backend)
+    except ImportError as e:
+        print(f"JSON backend {backend} is not available ({e}); using json instead.")
+        return GudeClient(args.host, args.port, components=args.components, clock=clock, json_backend="json")
@@ -0,0 +1,205 @@
+"""Streaming reader for HAR (HTTP Archive) files exported from browser DevTools.
+
+iter_entries() yields log.entries one at a time, so memory use depends on
+the largest single entry, not on the size of the file. It uses ijson when
+that is installed and otherwise a small incremental reader built on
+json.JSONDecoder.raw_decode.
+"""
+import csv
+import json
+import re
+
+from energylogger.schemas import SCHEMAS
+
+# Columns of the request table (the "har" capture layout)
+COLUMNS = SCHEMAS["har"].header
+
+_WHITESPACE = " \t\n\r"
+_CHUNK_SIZE = 1 << 20
+_DELIMITERS = _WHITESPACE + ",]}"
+_STRUCTURE = re.compile(r'["{}\[\]]')
+_STRING_END = re.compile(r'["\\]')
+
+
+def iter_entries(file):
+    """Yield the entries of a HAR file opened in text mode, one by one."""
+    try:
+        import ijson
+    except ImportError:
+        yield from _StreamReader(file).items(("log", "entries"))
+        return
+    # ijson wants bytes; floats stay floats rather than Decimal
+    yield from ijson.items(getattr(file, "buffer", file), "log.entries.item", use_float=True)
+
+
+def entry_row(entry):
+    """Return the request table row of one HAR entry, in COLUMNS order."""
+    request = entry.get("request", {})
+    response = entry.get("response", {})
+    content = response.get("content", {})
+    return [
+        request.get("url", "N/A"),
+        entry.get("startedDateTime", "N/A"),
+        request.get("httpVersion", "N/A"),
+        response.get("status", "N/A"),
+        content.get("size", "N/A"),
+        content.get("mimeType", "N/A"),
+        response.get("_transferSize", "N/A"),
+    ]
+
+
+def har_to_csv(har_filename, csv_filename, chunk_rows=1000):
+    """Convert a HAR file to the request table CSV, streaming; returns the number of entries."""
+    count = 0
+    with open(har_filename, "r", encoding="utf-8") as source, open(csv_filename, "w", newline="", encoding="utf-8") as target:
+        writer = csv.writer(target)
+        writer.writerow(COLUMNS)
+        rows = []
+        for entry in iter_entries(source):
+            rows.append(entry_row(entry))
+            if len(rows) >= chunk_rows:
+                writer.writerows(rows)
+                count += len(rows)
+                rows = []
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+class _StreamReader:
+    """Walk a JSON document incrementally, decoding only the values asked for.
+
+    Members before the wanted key (HAR pages, creator, ...) are skipped by
+    scanning for the bracket or quote that closes them, without building them.
+    """
+
+    def __init__(self, file, chunk_size=_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def items(self, path):
+        """Yield the elements of the array at `path` (a tuple of object keys)."""
+        for key in path:
+            if not self._find_key(key):
+                return
+        if self._next_char() != "[":
+            raise ValueError(f"{'.'.join(path)} is not an array")
+        self.pos += 1
+        if self._next_char() == "]":
+            return
+        while True:
+            yield self._decode()
+            separator = self._next_char()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"expected ',' or ']' in {'.'.join(path)}, found {separator!r}")
+
+    def _find_key(self, key):
+        """Enter the object at the current position and stop before the value of `key`."""
+        if self._next_char() != "{":
+            raise ValueError(f"expected an object containing {key!r}")
+        self.pos += 1
+        if self._next_char() == "}":
+            return False
+        while True:
+            name = self._decode()
+            if self._next_char() != ":":
+                raise ValueError(f"expected ':' after {name!r}")
+            self.pos += 1
+            if name == key:
+                return True
+            self._skip()
+            separator = self._next_char()
+            self.pos += 1
+            if separator == "}":
+                return False
+            if separator != ",":
+                raise ValueError(f"expected ',' or '}}' after {name!r}, found {separator!r}")
+
+    def _next_char(self):
+        """Skip whitespace and return the next character ("" at the end of the file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._read():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def _skip(self):
+        """Move past the value at the current position without decoding it."""
+        if self._next_char() not in ("{", "[", '"'):
+            self._decode()  # a number or literal
+            return
+        depth = 0
+        in_string = False
+        pos = self.pos
+        while True:
+            buffer = self.buffer
+            if in_string:
+                match = _STRING_END.search(buffer, pos)
+                if match is not None and match.group() == '"':
+                    in_string = False
+                    pos = match.end()
+                    if depth == 0:
+                        self.pos = pos
+                        return
+                    continue
+                if match is not None and match.end() < len(buffer):
+                    pos = match.end() + 1  # a backslash and the character it escapes
+                    continue
+                # The string goes on in the next chunk (keep a trailing backslash for it)
+                pos = len(buffer) if match is None else match.start()
+            else:
+                match = _STRUCTURE.search(buffer, pos)
+                if match is not None:
+                    pos = match.end()
+                    token = match.group()
+                    if token == '"':
+                        in_string = True
+                    elif token in "{[":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            self.pos = pos
+                            return
+                    continue
+                pos = len(buffer)
+            self.pos = pos
+            if not self._read():
+                raise ValueError("unexpected end of file in a skipped value")
+            pos = self.pos
+
+    def _decode(self):
+        """Decode the complete value at the current position, reading more input as needed."""
+        self._next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            # A number or literal is only complete once a delimiter follows: "-0." may go on as "-0.0125"
+            if (not isinstance(value, (str, list, dict)) and not self.eof
+                    and (end == len(self.buffer) or self.buffer[end] not in _DELIMITERS) and self._read()):
+                continue
+            self.pos = end
+            return value
+
+    def _read(self):
+        """Append the next chunk, dropping what has been consumed; False at the end of the file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
@@ -0,0 +1,113 @@
+"""Minimal asyncio HTTP/1.1 client with per-host keep-alive connection pools.
+
+Only what the meters need: GET requests, Content-Length, chunked and
+read-until-close bodies. Connections are reused across requests and shared by
+every device that talks to the same host, so polling dozens of meters needs
+neither threads nor a new TCP handshake per sample.
+"""
+import asyncio
+
+
+class HTTPError(Exception):
+    """Raised for failed requests: connection errors, timeouts and non-2xx status codes."""
+
+
+# Errors of a kept-alive connection the peer has closed, worth a retry on a new connection
+_CLOSED = (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError)
+
+
+class _HostPool:
+    def __init__(self, max_connections):
+        self.idle = []
+        self.slots = asyncio.Semaphore(max_connections)
+
+
+class AsyncHTTPPool:
+    """Keep-alive connection pools keyed by (host, port)."""
+
+    def __init__(self, max_per_host=1, timeout=5.0):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._pools = {}
+
+    async def get(self, host, port, path):
+        """GET `path` from host:port and return the response body as bytes."""
+        pool = self._pools.get((host, port))
+        if pool is None:
+            pool = self._pools[(host, port)] = _HostPool(self.max_per_host)
+
+        async with pool.slots:
+            # A kept-alive connection may have been closed by the device; retry on a new one.
+            # Not after a timeout: that would stall the poll for twice the timeout.
+            while True:
+                reused = bool(pool.idle)
+                writer = None
+                try:
+                    if reused:
+                        reader, writer = pool.idle.pop()
+                    else:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection(host, port), self.timeout)
+                    status, body, keep_alive = await asyncio.wait_for(
+                        self._request(reader, writer, host, path), self.timeout)
+                except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError) as e:
+                    if writer is not None:
+                        writer.close()
+                    if reused and isinstance(e, _CLOSED):
+                        continue
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise HTTPError(f"timeout after {self.timeout} s for http://{host}:{port}{path}") from e
+                    raise HTTPError(f"{type(e).__name__}: {e}") from e
+                if keep_alive:
+                    pool.idle.append((reader, writer))
+                else:
+                    writer.close()
+                if not 200 <= status < 300:
+                    raise HTTPError(f"HTTP {status} for http://{host}:{port}{path}")
+                return body
+
+    async def close(self):
+        """Close every idle connection."""
+        for pool in self._pools.values():
+            while pool.idle:
+                _, writer = pool.idle.pop()
+                writer.close()
+        self._pools.clear()
+
+    async def _request(self, reader, writer, host, path):
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n"
+            f"Accept: application/json\r\n\r\n".encode("ascii")
+        )
+        await writer.drain()
+
+        status_line = await reader.readuntil(b"\r\n")
+        version, status = status_line.split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version != b"HTTP/1.0"
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    # Skip trailers
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), body, keep_alive
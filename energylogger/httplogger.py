@@ -0,0 +1,270 @@
+"""Poll a Gude meter's JSON status page and log one of the historic CSV layouts.
+
+logger.py, logger_v2.py and EnergyLogging/log.py are thin wrappers around
+this module; --schema selects the layout they used to write:
+
+    v1      device clock (day first, whole seconds) and the ten line-in values (kWh)
+    v2      device clock plus host milliseconds and the ten line-in values (kWh)
+    energy  host Unix ms and UTC time, a subset of the values (Wh), computed
+            active/apparent power and the request time in µs
+
+The column lists are the capture schemas of energylogger.schemas. The status
+document is decoded by the fastest JSON backend installed (--json, see
+gude.status_decoder) down to the line-in values and the device clock; each
+layout builds its output row from those in one step, without intermediate
+dicts. Installed as the `energy-logger` command (see pyproject.toml), or run
+as `python -m energylogger.httplogger`.
+"""
+import argparse
+import calendar
+import os
+import time
+
+from energylogger.aggregate import add_aggregate_arguments, check_aggregate_arguments
+from energylogger.clock import PreciseTimestamps, add_clock_arguments
+from energylogger.console import add_console_arguments, console_from_args
+from energylogger.csv_writer import add_writer_arguments, writer_from_args
+from energylogger.gude import GudeError, add_gude_arguments, client_from_args
+from energylogger.metrics import add_metrics_arguments, metrics_from_args, serve_in_thread
+from energylogger.pipeline import add_pipeline_arguments, pipeline_from_args
+from energylogger.scheduler import (FixedRateScheduler, adaptive_from_args, add_adaptive_arguments,
+                                    add_scheduler_arguments)
+from energylogger.schemas import SCHEMAS
+from energylogger.segments import add_segment_arguments
+from energylogger.timing import CYCLE, ENQUEUE, LATENESS, add_timing_arguments, timings_from_args
+
+TIMEOUT = "TIMEOUT"
+
+
+class Layout:
+    """Turns the decoded line-in values (and device clock) into rows of one capture schema.
+
+    Subclasses set `name` (a key of SCHEMAS) and implement row() and
+    failed_row(); `clock` asks the device for its clock section, `skip`
+    lists columns the binary format leaves out.
+    """
+
+    name = None
+    clock = False
+    skip = ()
+
+    def __init__(self):
+        self.schema = SCHEMAS[self.name]
+        self.header = self.schema.header
+        self.timestamp_format = self.schema.timestamp_format
+        self.power_index = self.header.index(self.schema.power)
+        self.voltage_index = self.header.index("Voltage (V)")
+        self.current_index = self.header.index("Current (A)")
+        self.energy_index = self.header.index(self.schema.energy)
+        self.energy_unit = "kWh" if self.schema.energy_scale == 1000.0 else "Wh"
+
+    def row(self, v, c, start):
+        """Row for line-in values `v` and device systemtime `c`, fetched from time.time() `start` on."""
+        raise NotImplementedError
+
+    def failed_row(self, start):
+        """Row logged when the fetch or the parse failed."""
+        raise NotImplementedError
+
+
+class V1Layout(Layout):
+    """logger.py: device clock as DD-MM-YYYY HH:MM:SS."""
+
+    name = "v1"
+    clock = True
+
+    def row(self, v, c, start):
+        return [
+            f"{c['day']:02d}-{c['month']:02d}-{c['year']} {c['hour']:02d}:{c['minute']:02d}:{c['second']:02d}",
+            v[0], v[1], v[2], v[3], v[4], v[5], v[6], v[7], v[8], v[9],
+        ]
+
+    def failed_row(self, start):
+        return [time.strftime("%d-%m-%Y %H:%M:%S", time.gmtime())] + [TIMEOUT] * 10
+
+
+class V2Layout(Layout):
+    """logger_v2.py: device clock as YYYY-MM-DD HH:MM:SS plus the host's milliseconds."""
+
+    name = "v2"
+    clock = True
+
+    def row(self, v, c, start):
+        return [
+            f"{c['year']}-{c['month']:02d}-{c['day']:02d} {c['hour']:02d}:{c['minute']:02d}:{c['second']:02d}"
+            f".{time.time_ns() // 1_000_000 % 1000:03d}",
+            v[0], v[1], v[2], v[3], v[4], v[5], v[6], v[7], v[8], v[9],
+        ]
+
+    def failed_row(self, start):
+        now_ms = time.time_ns() // 1_000_000
+        return [_utc_ms(now_ms)] + [TIMEOUT] * 10
+
+
+class EnergyLayout(Layout):
+    """EnergyLogging/log.py: host time, energy in Wh, computed powers and the request time."""
+
+    name = "energy"
+    skip = ("UTC Human-Readable",)
+
+    def row(self, v, c, start):
+        voltage, current = v[0], v[1]
+        power_factor = round(v[7], 2)  # stored with 2 decimals, as received
+        now_ms = time.time_ns() // 1_000_000
+        return [
+            now_ms, _utc_ms(now_ms),
+            voltage, current, v[4], round(voltage * current * power_factor, 3),
+            v[2], v[6], round(voltage * current, 3), power_factor,
+            v[8] * 1000, v[9] * 1000,  # kWh to Wh
+            int((time.time() - start) * 1e6),
+        ]
+
+    def failed_row(self, start):
+        now_ms = time.time_ns() // 1_000_000
+        return [now_ms, _utc_ms(now_ms)] + [TIMEOUT] * 10 + [-1]
+
+
+def _utc_ms(unix_ms):
+    """YYYY-MM-DD HH:MM:SS.mmm (UTC) of a Unix millisecond timestamp."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(unix_ms // 1000)) + f".{unix_ms % 1000:03d}"
+
+
+LAYOUTS = {layout.name: layout for layout in (V1Layout, V2Layout, EnergyLayout)}
+
+
+def _device_ns(c):
+    """Unix ns of a device systemtime, read as UTC."""
+    return calendar.timegm((c["year"], c["month"], c["day"], c["hour"], c["minute"], c["second"])) * 1_000_000_000
+
+
+def fetch_row(client, layout, precise=None):
+    """Fetch one sample and return its row (a failed_row() on errors).
+
+    With `precise` (a clock.PreciseTimestamps) the row ends with its columns.
+    """
+    start = time.time()
+    try:
+        values, systemtime = client.fetch_values()
+        row = layout.row(values, systemtime, start)
+        if precise is not None:
+            row += precise.stamp(client.sent_ns, client.answered_ns, _device_ns(systemtime) if layout.clock else None)
+        return row
+    except GudeError as e:
+        print(f"Error fetching data: {e}")
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        print(f"Error parsing data: {e}")
+    row = layout.failed_row(start)
+    return row + precise.failed() if precise is not None else row
+
+
+def parse_arguments(argv=None, schema=None):
+    """Parse command-line arguments; `schema` is the default --schema."""
+    parser = argparse.ArgumentParser(description="Poll the device and save data to a CSV file.")
+    parser.add_argument("--schema", choices=tuple(LAYOUTS), default=schema or "v2",
+                        help=f"CSV layout: v1 (logger.py), v2 (logger_v2.py) or energy (EnergyLogging/log.py) "
+                             f"(default: {schema or 'v2'}).")
+    parser.add_argument("--rate", type=float, default=1.0, help="Polling rate in seconds (default: 1 second).")
+    parser.add_argument("--csv", type=str, required=True, help="Filename for the CSV output.")
+    add_gude_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_adaptive_arguments(parser)
+    add_clock_arguments(parser)
+    add_writer_arguments(parser)
+    add_segment_arguments(parser)
+    add_aggregate_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_console_arguments(parser)
+    add_timing_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    check_aggregate_arguments(parser, args)
+    return args
+
+
+def main(argv=None, schema=None):
+    args = parse_arguments(argv, schema)
+    layout = LAYOUTS[args.schema]()
+    # --precise-time: request midpoint and device clock offset columns after the layout's own
+    precise = PreciseTimestamps(device_clock=layout.clock) if args.precise_time else None
+    header = layout.header + precise.columns if precise else layout.header
+
+    def print_sample(record):
+        """Print one sample (runs on the console output thread)."""
+        row, connect_time, transfer_time = record
+        if row[layout.power_index] == TIMEOUT:
+            print(f"{header[0]}: {row[0]} - Request Failed (Logged as TIMEOUT)")
+        else:
+            for name, value in zip(header, row):
+                print(f"{name}: {value}")
+            print(f"Connect Time: {connect_time * 1e6:.0f} µs | Transfer Time: {transfer_time * 1e6:.0f} µs")
+        print("-" * 50)
+
+    def status_line(record):
+        """Short summary of the latest sample for the status line."""
+        row = record[0]
+        if row[layout.power_index] == TIMEOUT:
+            return f"{row[0]} TIMEOUT"
+        return (f"{row[0]} | {row[layout.power_index]} W | {row[layout.voltage_index]} V | "
+                f"{row[layout.current_index]} A | {row[layout.energy_index]} {layout.energy_unit}")
+
+    timings = timings_from_args(args, args.csv)
+    writer = writer_from_args(args, args.csv, header, timestamp_format=layout.timestamp_format,
+                              skip=layout.skip, on_flush=timings.on_flush)
+    client = client_from_args(args, clock=layout.clock)
+
+    # Console and CSV output run on their own threads, fed through bounded queues
+    console = console_from_args(args, print_sample, status_line,
+                                latency=lambda record: record[1] + record[2],
+                                failed=lambda record: record[0][layout.power_index] == TIMEOUT)
+    pipeline = pipeline_from_args(args, lambda record: writer.writerow(record[0]), writer.close, console)
+
+    def power(record):
+        value = record[0][layout.power_index]
+        return None if value == TIMEOUT else value
+
+    # Live metrics endpoint, served from a background thread
+    metrics = metrics_from_args(args, lambda record: zip(header, record[0]), power,
+                                latency=lambda record: record[1] + record[2],
+                                failed=lambda record: record[0][layout.power_index] == TIMEOUT,
+                                labels={"logger": args.schema, "csv": os.path.basename(args.csv)})
+    if metrics is not None:
+        try:
+            host, port = serve_in_thread(metrics, args.metrics_host, args.metrics_port)
+            pipeline.add(metrics)
+            metrics.pipeline = pipeline
+            print(f"Metrics on http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"Error starting the metrics endpoint: {e}")
+
+    # Polling loop, paced on fixed deadlines so request and CSV time do not add drift
+    scheduler = FixedRateScheduler(args.rate, args.missed)
+    # With --adaptive: slow while the watched column is steady, --rate around transients
+    adaptive = adaptive_from_args(args, scheduler)
+    watched = layout.current_index if args.adaptive_signal == "current" else layout.power_index
+    try:
+        while True:
+            timings.record(LATENESS, scheduler.wait())
+            start = time.perf_counter()
+            row = fetch_row(client, layout, precise)
+            if row[layout.power_index] != TIMEOUT:
+                client.record_timings(timings)
+                if adaptive is not None:
+                    adaptive.update(row[watched])
+            enqueued = time.perf_counter()
+            pipeline.put((row, client.connect_time, client.transfer_time))
+            done = time.perf_counter()
+            timings.record(ENQUEUE, done - enqueued)
+            timings.record(CYCLE, done - start)
+    except KeyboardInterrupt:
+        print("\nPolling stopped.")
+    finally:
+        client.close()
+        pipeline.close()
+        timings.close()
+        for line in (pipeline.report() + timings.report() + (adaptive.report() if adaptive else [])
+                     + (precise.report() if precise else [])):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
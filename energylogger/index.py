@@ -0,0 +1,373 @@
+"""Sparse timestamp index of CSV captures, for time-range queries without full scans.
+
+The index of `capture.csv` is `capture.csv.idx`:
+
+    8 bytes   magic b"ELOGIDX1"
+    8 bytes   little-endian int64 N, rows per entry
+    entries   int64 Unix timestamp (ms), int64 byte offset and int64 row number
+              of every Nth data row, little-endian
+
+Capture timestamps only increase, so a query for [start, end) seeks to the
+last entry before `start` and reads rows until the first one at or after
+`end`: the time taken grows with the result (plus at most N rows), not with
+the file. The index is built on the first query (or with `build`) and
+extended when the file has grown since; with --index-every, writers created
+by writer_from_args keep it up to date while logging instead. An index that no longer matches
+its capture (e.g. after DynamicCSVWriter added columns) is rebuilt. Binary
+captures need no index: their fixed-width records are bisected directly (see
+BinaryLog.iter_range).
+
+Usage:
+    python -m energylogger.index build capture.csv [--every 1000]
+    python -m energylogger.index info capture.csv
+    python -m energylogger.index query capture.csv --start 2025-03-01T12:00:00 --end 2025-03-01T12:03:00 [-o window.csv]
+"""
+import argparse
+import csv
+import os
+import struct
+import sys
+from bisect import bisect_left
+
+from energylogger.clock import timestamp_ms
+from energylogger.schemas import detect_schema
+
+MAGIC = b"ELOGIDX1"
+DEFAULT_EVERY = 1000
+_HEADER = struct.Struct("<8sq")
+_ENTRY = struct.Struct("<qqq")
+
+
+def index_filename(filename):
+    """Sidecar index filename for a capture: `<capture>.idx`."""
+    return filename + ".idx"
+
+
+class SparseIndex:
+    """(timestamp, byte offset, row number) of every `every`th data row of a capture.
+
+    `rows` is the number of data rows seen when the index was last built or
+    extended; `end` the byte offset after them.
+    """
+
+    def __init__(self, every):
+        self.every = every
+        self.timestamps = []
+        self.offsets = []
+        self.numbers = []
+        self.rows = 0
+        self.end = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def add(self, timestamp, offset, number):
+        self.timestamps.append(timestamp)
+        self.offsets.append(offset)
+        self.numbers.append(number)
+
+    def seek(self, start):
+        """Byte offset of the last indexed row before `start` (None if there is none)."""
+        i = bisect_left(self.timestamps, start) - 1
+        return self.offsets[i] if i >= 0 else None
+
+    @classmethod
+    def load(cls, path):
+        """Read an index file; returns None when it is missing or not an index.
+
+        A partially written last entry is ignored.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, every = _HEADER.unpack_from(data)
+        if magic != MAGIC or every < 1:
+            return None
+        index = cls(every)
+        usable = _HEADER.size + (len(data) - _HEADER.size) // _ENTRY.size * _ENTRY.size
+        for timestamp, offset, number in _ENTRY.iter_unpack(data[_HEADER.size:usable]):
+            index.add(timestamp, offset, number)
+        return index
+
+
+class IndexFile:
+    """Append-only writer of an index file."""
+
+    def __init__(self, path, every, truncate=False):
+        self.path = path
+        exists = not truncate and os.path.isfile(path) and os.path.getsize(path) >= _HEADER.size
+        self._file = open(path, "ab" if exists else "wb")
+        if exists:
+            # Cut off a partially written entry before appending
+            size = self._file.tell()
+            self._file.truncate(_HEADER.size + (size - _HEADER.size) // _ENTRY.size * _ENTRY.size)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file.write(_HEADER.pack(MAGIC, every))
+
+    def write(self, timestamp, offset, number):
+        self._file.write(_ENTRY.pack(timestamp, offset, number))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class CaptureIndexer:
+    """The index BufferedCSVWriter keeps while appending rows to a capture.
+
+    For an existing capture the index is first brought up to date (or
+    rebuilt, see load_index) so that row numbers continue where it ends.
+    """
+
+    def __init__(self, filename, every, timestamp_format=None, new_file=True):
+        self.timestamp_format = timestamp_format
+        path = index_filename(filename)
+        if new_file:
+            self.every, self.rows = max(1, int(every)), 0
+            self._file = IndexFile(path, self.every, truncate=True)
+        else:
+            index = load_index(filename, every)
+            self.every, self.rows = index.every, index.rows
+            self._file = IndexFile(path, self.every)
+
+    def due(self):
+        """Rows to write before the next indexed one (0: the next row is indexed)."""
+        return -self.rows % self.every
+
+    def add(self, timestamp, offset):
+        """Index the next row, starting at byte `offset`, with first column `timestamp`."""
+        try:
+            self._file.write(timestamp_ms(timestamp, self.timestamp_format), offset, self.rows)
+        except (TypeError, ValueError):
+            pass  # not a timestamp; the next entry is due `every` rows later
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def timestamp_column(filename):
+    """(byte offset of the first data row, timestamp column index, timestamp format) of a CSV capture."""
+    with open(filename, "rb") as f:
+        header_line = f.readline()
+        first_line = f.readline()
+    header = next(csv.reader([header_line.decode("utf-8", "replace")]), [])
+    first_row = next(csv.reader([first_line.decode("utf-8", "replace")]), None)
+    schema = detect_schema(header, first_row)
+    if schema is None or schema.timestamp not in header:
+        return len(header_line), 0, None
+    return len(header_line), header.index(schema.timestamp), schema.timestamp_format
+
+
+def _row_timestamp(line, column, timestamp_format):
+    """Unix ms of the timestamp in one raw CSV line (None if it cannot be parsed)."""
+    try:
+        if column == 0 and not line.startswith(b'"'):
+            value = line.split(b",", 1)[0].rstrip(b"\r\n").decode("utf-8")
+        else:
+            value = next(csv.reader([line.decode("utf-8", "replace")]))[column]
+        return timestamp_ms(value, timestamp_format)
+    except (ValueError, IndexError, StopIteration):
+        return None
+
+
+def _scan(f, index, offset, number, column, timestamp_format, output=None):
+    """Index the rows of `f` from `offset` (data row `number`) to the end of the file.
+
+    A row whose timestamp cannot be parsed (such as a blank line) hands its
+    entry on to the next row.
+    """
+    every = index.every
+    due = number % every == 0
+    f.seek(offset)
+    for line in f:
+        if due or number % every == 0:
+            timestamp = _row_timestamp(line, column, timestamp_format)
+            due = timestamp is None
+            if not due and (not index.numbers or number > index.numbers[-1]):
+                index.add(timestamp, offset, number)
+                if output is not None:
+                    output.write(timestamp, offset, number)
+        offset += len(line)
+        number += 1
+    index.rows, index.end = number, offset
+
+
+def build_index(filename, every=DEFAULT_EVERY):
+    """Index a CSV capture from scratch and write `<capture>.idx`; returns the SparseIndex."""
+    data_offset, column, timestamp_format = timestamp_column(filename)
+    index = SparseIndex(max(1, int(every)))
+    path = index_filename(filename)
+    temporary = path + ".tmp"
+    output = IndexFile(temporary, index.every, truncate=True)
+    try:
+        with open(filename, "rb") as f:
+            _scan(f, index, data_offset, 0, column, timestamp_format, output)
+        output.close()
+        os.replace(temporary, path)
+    except OSError:
+        output.close()
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return index
+
+
+def _matches(f, index, i, column, timestamp_format):
+    """Whether entry `i` still points at the start of a row with its timestamp."""
+    offset = index.offsets[i]
+    if offset < 1:
+        return False
+    f.seek(offset - 1)
+    if f.read(1) != b"\n":
+        return False
+    return _row_timestamp(f.readline(), column, timestamp_format) == index.timestamps[i]
+
+
+def load_index(filename, every=DEFAULT_EVERY):
+    """The up-to-date SparseIndex of a CSV capture.
+
+    The existing `<capture>.idx` is checked against the capture and extended
+    with the rows appended since it was written; it is rebuilt (with `every`
+    rows per entry) when it is missing or no longer matches.
+    """
+    index = SparseIndex.load(index_filename(filename))
+    if index is None or not index:
+        return build_index(filename, every)
+    data_offset, column, timestamp_format = timestamp_column(filename)
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as f:
+        if index.offsets[-1] >= size or not all(_matches(f, index, i, column, timestamp_format)
+                                                for i in {0, len(index) - 1}):
+            return build_index(filename, every)
+        output = IndexFile(index_filename(filename), index.every)
+        try:
+            _scan(f, index, index.offsets[-1], index.numbers[-1], column, timestamp_format, output)
+        finally:
+            output.close()
+    return index
+
+
+def _range_lines(filename, start, end, index=None):
+    """Yield the raw lines of the data rows with start <= timestamp < end."""
+    index = index or load_index(filename)
+    data_offset, column, timestamp_format = timestamp_column(filename)
+    offset = index.seek(start)
+    with open(filename, "rb") as f:
+        f.seek(data_offset if offset is None else offset)
+        for line in f:
+            timestamp = _row_timestamp(line, column, timestamp_format)
+            if timestamp is None or timestamp < start:
+                continue
+            if timestamp >= end:
+                return
+            yield line
+
+
+def query(filename, start, end):
+    """Yield the rows of a capture with start <= timestamp (Unix ms) < end.
+
+    CSV rows come as lists of strings; binary captures (.bin) yield
+    (timestamp_ms, value, ...) tuples.
+    """
+    if _is_binary(filename):
+        from energylogger.binlog import BinaryLog
+
+        yield from BinaryLog(filename).iter_range(start, end)
+        return
+    lines = (line.decode("utf-8", "replace") for line in _range_lines(filename, start, end))
+    yield from csv.reader(lines)
+
+
+def _is_binary(filename):
+    from energylogger.binlog import MAGIC as BINARY_MAGIC
+
+    with open(filename, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def parse_time(value):
+    """Unix ms from a number of ms or an ISO 8601 date/time (UTC unless it has an offset)."""
+    try:
+        return int(value)
+    except ValueError:
+        return timestamp_ms(value, "ISO8601")
+
+
+def write_range(filename, start, end, output):
+    """Write the header and the rows in [start, end) of a capture to a binary file object; returns the row count."""
+    count = 0
+    if _is_binary(filename):
+        import io
+
+        from energylogger.binlog import BinaryLog
+
+        log = BinaryLog(filename)
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="", write_through=True)
+        writer = csv.writer(text)
+        writer.writerow([log.timestamp] + log.columns)
+        for row in log.iter_range(start, end):
+            writer.writerow(row)
+            count += 1
+        text.detach()
+        return count
+    with open(filename, "rb") as f:
+        output.write(f.readline())
+    for line in _range_lines(filename, start, end):
+        output.write(line)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index CSV captures and extract time ranges from them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="(Re)build the sparse index of a CSV capture.")
+    build.add_argument("file")
+    build.add_argument("--every", type=int, default=DEFAULT_EVERY,
+                       help=f"Rows per index entry (default: {DEFAULT_EVERY}).")
+    info = subparsers.add_parser("info", help="Show the index of a CSV capture (updating it first).")
+    info.add_argument("file")
+    extract = subparsers.add_parser("query", help="Write the rows with start <= timestamp < end as CSV.")
+    extract.add_argument("file")
+    extract.add_argument("--start", type=parse_time, required=True,
+                         help="First timestamp: Unix ms or ISO 8601 (UTC unless an offset is given).")
+    extract.add_argument("--end", type=parse_time, required=True, help="Timestamp after the last row (exclusive).")
+    extract.add_argument("-o", "--output", help="CSV filename (default: standard output).")
+    args = parser.parse_args()
+
+    try:
+        if args.command != "query" and _is_binary(args.file):
+            print(f"{args.file} is a binary capture; its records are searched without an index")
+        elif args.command == "build":
+            index = build_index(args.file, args.every)
+            print(f"{index_filename(args.file)}: {len(index)} entries for {index.rows} rows")
+        elif args.command == "info":
+            index = load_index(args.file)
+            print(f"{index_filename(args.file)}: {len(index)} entries, one per {index.every} rows, "
+                  f"{index.rows} rows in {index.end} bytes")
+            if index:
+                print(f"  first {index.timestamps[0]} ms, last indexed {index.timestamps[-1]} ms")
+        elif args.output:
+            with open(args.output, "wb") as output:
+                count = write_range(args.file, args.start, args.end, output)
+            print(f"{count} rows saved to {args.output}")
+        else:
+            write_range(args.file, args.start, args.end, sys.stdout.buffer)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {args.file}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Align power, temperature, video and network traces of one experiment on a common time grid.
+
+Every input is normalized to int64 Unix milliseconds and cut into fixed
+windows (1 s by default). Per window the output has
+
+    energy (J) and mean power (W)   trapezoid over the power samples, split
+                                    exactly at the window edges
+    requests and bytes              HAR entries started in the window
+    energy per byte (µJ/B)          energy / bytes
+    temperatures, video statistics  last sample at or before the window end
+                                    (as-of), if not older than --tolerance
+
+Inputs are recognized by their header: any power capture the loggers write,
+temperature_logger.py logs, the PUPPETEER video statistics, interpret.py's
+request CSV and raw .har files. All joins are sorted searches (O(n log n)).
+
+Usage: python -m energylogger.merge energy_data.csv temperature_data.csv video_data.csv
+       requests.csv -o merged.csv [--window 1.0] [--shift temperature_data.csv=3600]
+
+--shift corrects an input's clock by a number of seconds. Temperature logs
+written before the logger switched to time.time_ns() were stamped with
+datetime.utcnow().timestamp(), which is off by the host's UTC offset
+(3600 s for the CET captures in measurements/).
+"""
+import argparse
+import csv
+import os
+import sys
+
+from energylogger.analysis import load_power
+from energylogger.har import iter_entries
+from energylogger.schemas import TEMPERATURE, detect_schema, read_csv_head
+
+# Input kinds
+POWER = "power"
+TEMPERATURES = "temperature"
+VIDEO = "video"
+NETWORK = "network"
+
+
+def to_ms(values, timestamp_format=None):
+    """Convert a pandas Series of timestamps to int64 Unix milliseconds.
+
+    `timestamp_format` is a strptime format (naive times are taken as UTC),
+    "ISO8601" for ISO strings with an offset, or None for numbers in ms.
+    Returns (milliseconds, valid): values that do not parse (empty cells, a
+    header line repeated mid-file) are left out, and the boolean array
+    `valid` marks the ones that were kept.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if timestamp_format is None:
+        # Parsed as float: spreadsheet round trips leave values such as 1.74056E+12
+        parsed = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+        valid = ~np.isnan(parsed)
+        return parsed[valid].astype(np.int64), valid
+    parsed = pd.to_datetime(pd.Series(values), format=timestamp_format, utc=True, errors="coerce")
+    valid = parsed.notna().to_numpy()
+    return parsed[valid].dt.tz_localize(None).to_numpy(dtype="datetime64[ms]").astype(np.int64), valid
+
+
+def load_har(filename):
+    """Return (start times in ms, transfer sizes in bytes) of the entries of a .har file."""
+    import numpy as np
+    import pandas as pd
+
+    started = []
+    sizes = []
+    with open(filename, "r", encoding="utf-8") as f:
+        for entry in iter_entries(f):
+            started.append(entry.get("startedDateTime"))
+            sizes.append(entry.get("response", {}).get("_transferSize"))
+    timestamps, valid = to_ms(pd.Series(started, dtype=object), "ISO8601")
+    return timestamps, pd.to_numeric(pd.Series(sizes, dtype=object), errors="coerce").to_numpy(np.float64)[valid]
+
+
+def load_trace(filename):
+    """Load one input; returns (kind, timestamps, data) or None if the file is not recognized.
+
+    data is (power, energy) for power captures, (sizes,) for network traces and
+    a DataFrame of numeric columns for temperature and video statistics.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if filename.endswith(".har"):
+        timestamps, sizes = load_har(filename)
+        return NETWORK, timestamps, (sizes,)
+
+    schema = None if filename.endswith(".bin") else detect_schema(*read_csv_head(filename))
+    if filename.endswith(".bin") or (schema is not None and schema.power is not None):
+        loaded = load_power(filename, schema)
+        if loaded is None:
+            return None
+        _, timestamps, power, energy = loaded
+        return POWER, timestamps, (power, energy)
+    if schema is None:
+        return None
+
+    if schema.name == "har":
+        frame = pd.read_csv(filename, usecols=[schema.timestamp, "Transfer Size"], dtype={schema.timestamp: str})
+        timestamps, valid = to_ms(frame[schema.timestamp], schema.timestamp_format)
+        sizes = pd.to_numeric(frame["Transfer Size"], errors="coerce").to_numpy(np.float64)[valid]
+        return NETWORK, timestamps, (sizes,)
+
+    kind = TEMPERATURES if schema.name == TEMPERATURE.name else VIDEO
+    with open(filename, "r", newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        last = len(header) - 1
+        # The video statistics' free-text Latency_Mode contains unquoted commas
+        # ("Manifestless, Optimized for Normal Latency, seq 3284"): the overflow
+        # is joined back into the last column
+        rows = [row if len(row) <= len(header) else row[:last] + [",".join(row[last:])]
+                for row in reader if row and row[0]]
+    frame = pd.DataFrame(rows, columns=header, dtype=object)
+    timestamps, valid = to_ms(frame.pop(schema.timestamp), schema.timestamp_format)
+    frame = frame[valid]
+    # Keep the numeric statistics only (resolution strings, codecs etc. are dropped)
+    numeric = frame.apply(pd.to_numeric, errors="coerce").dropna(axis=1, how="all")
+    return kind, timestamps, numeric
+
+
+def window_edges(start, end, width):
+    """Edges (ms) of the windows of `width` ms covering [start, end], aligned to multiples of width."""
+    import numpy as np
+
+    first = start // width * width
+    count = max(1, -(-(end - first) // width))
+    return first + width * np.arange(count + 1, dtype=np.int64)
+
+
+def integrate_windows(timestamps, power, edges):
+    """Energy (J) and covered seconds per window from power samples (W).
+
+    The cumulative trapezoid integral is interpolated at the window edges,
+    so samples straddling an edge are split exactly. Samples without a value
+    (timeouts) are bridged.
+    """
+    import numpy as np
+
+    valid = ~np.isnan(power)
+    t = timestamps[valid]
+    p = power[valid]
+    order = np.argsort(t, kind="stable")
+    t = t[order]
+    p = p[order]
+    if len(t) < 2:
+        zeros = np.zeros(len(edges) - 1)
+        return zeros, zeros
+    seconds = (t - t[0]) / 1000.0
+    cumulative = np.concatenate(([0.0], np.cumsum((p[1:] + p[:-1]) / 2.0 * np.diff(seconds))))
+    at_edges = np.interp((edges - t[0]) / 1000.0, seconds, cumulative)
+    covered = np.diff(np.clip(edges, t[0], t[-1])) / 1000.0
+    return np.diff(at_edges), covered
+
+
+def sum_windows(timestamps, values, edges):
+    """Count and sum of `values` per window, by the window their timestamp falls in."""
+    import numpy as np
+
+    index = np.searchsorted(edges, timestamps, side="right") - 1
+    inside = (index >= 0) & (index < len(edges) - 1)
+    index = index[inside]
+    values = np.nan_to_num(values[inside])
+    bins = len(edges) - 1
+    return np.bincount(index, minlength=bins), np.bincount(index, weights=values, minlength=bins)
+
+
+def asof(timestamps, values, targets, tolerance=None):
+    """Last row of `values` at or before each target time (NaN if none within `tolerance` ms)."""
+    import numpy as np
+
+    order = np.argsort(timestamps, kind="stable")
+    timestamps = timestamps[order]
+    values = np.asarray(values, dtype=np.float64)[order]
+    index = np.searchsorted(timestamps, targets, side="right") - 1
+    missing = index < 0
+    if tolerance is not None:
+        missing |= targets - timestamps[np.maximum(index, 0)] > tolerance
+    result = values[np.maximum(index, 0)]
+    result[missing] = np.nan
+    return result
+
+
+def merge(traces, window=1.0, tolerance=None):
+    """Build the aligned per-window table (a DataFrame) from loaded traces.
+
+    `traces` is a list of (name, kind, timestamps, data) as returned by
+    load_trace() plus a name used to prefix columns when there are several
+    inputs of one kind. The windows span the power captures, or all inputs if
+    there is no power capture.
+    """
+    import numpy as np
+    import pandas as pd
+
+    width = max(1, int(round(window * 1000)))
+    if tolerance is None:
+        tolerance = 5 * width
+    spanning = [t for t in traces if t[1] == POWER] or traces
+    start = min(int(t[2].min()) for t in spanning if len(t[2]))
+    end = max(int(t[2].max()) for t in spanning if len(t[2]))
+    edges = window_edges(start, end, width)
+    ends = edges[1:] - 1
+
+    counts = {}
+    for _, kind, _, _ in traces:
+        counts[kind] = counts.get(kind, 0) + 1
+
+    def column(name, label, kind):
+        return f"{name}: {label}" if counts[kind] > 1 else label
+
+    table = {"Window Start (ms)": edges[:-1]}
+    energy_total = np.zeros(len(edges) - 1)
+    bytes_total = np.zeros(len(edges) - 1)
+    for name, kind, timestamps, data in traces:
+        if kind == POWER:
+            energy, covered = integrate_windows(timestamps, data[0], edges)
+            energy_total += energy
+            with np.errstate(invalid="ignore", divide="ignore"):
+                table[column(name, "Mean Power (W)", kind)] = np.where(covered > 0, energy / covered, np.nan)
+            table[column(name, "Energy (J)", kind)] = energy
+        elif kind == NETWORK:
+            requests, transferred = sum_windows(timestamps, data[0], edges)
+            bytes_total += transferred
+            table[column(name, "Requests", kind)] = requests
+            table[column(name, "Bytes", kind)] = transferred.astype(np.int64)
+        else:
+            frame = data
+            for label in frame.columns:
+                table[column(name, label, kind)] = asof(timestamps, frame[label].to_numpy(), ends, tolerance)
+
+    if counts.get(POWER) and counts.get(NETWORK):
+        if counts[POWER] > 1:
+            table["Energy (J)"] = energy_total
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table["Energy per Byte (µJ/B)"] = np.where(bytes_total > 0, energy_total * 1e6 / bytes_total, np.nan)
+    return pd.DataFrame(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge power, temperature, video and network traces per time window.")
+    parser.add_argument("files", nargs="+", help="Captures, temperature logs, video statistics, request CSVs or .har files.")
+    parser.add_argument("-o", "--output", type=str, default="merged.csv", help="Output CSV (default: merged.csv).")
+    parser.add_argument("--window", type=float, default=1.0, help="Window length in seconds (default: 1).")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Oldest temperature/video sample, in seconds, still used for a window "
+                             "(default: 5 windows).")
+    parser.add_argument("--shift", action="append", default=[], metavar="FILE=SECONDS",
+                        help="Add SECONDS to the timestamps of input FILE (may be repeated).")
+    args = parser.parse_args()
+
+    shifts = {}
+    for shift in args.shift:
+        filename, _, seconds = shift.rpartition("=")
+        try:
+            shifts[filename] = int(round(float(seconds) * 1000))
+        except ValueError:
+            parser.error(f"invalid --shift {shift!r} (expected FILE=SECONDS)")
+
+    traces = []
+    for filename in args.files:
+        try:
+            loaded = load_trace(filename)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading {filename}: {e}", file=sys.stderr)
+            sys.exit(1)
+        if loaded is None:
+            print(f"Error: {filename} is not a recognized capture", file=sys.stderr)
+            sys.exit(1)
+        kind, timestamps, data = loaded
+        basename = os.path.basename(filename)
+        if filename in shifts:
+            shift = shifts.pop(filename)
+        elif basename in shifts:
+            shift = shifts.pop(basename)
+        else:
+            shift = 0
+        if shift:
+            timestamps = timestamps + shift
+        print(f"{filename}: {kind}, {len(timestamps)} samples" + (f", shifted by {shift / 1000:g} s" if shift else ""))
+        traces.append((os.path.splitext(os.path.basename(filename))[0], kind, timestamps, data))
+
+    if shifts:
+        parser.error(f"--shift names a file that is not an input: {', '.join(shifts)}")
+    tolerance = None if args.tolerance is None else int(args.tolerance * 1000)
+    table = merge(traces, args.window, tolerance)
+    table.to_csv(args.output, index=False, float_format="%.6g")
+    print(f"Data saved to {args.output} ({len(table)} windows)")
+
+
+if __name__ == "__main__":
+    main()
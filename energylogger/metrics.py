@@ -0,0 +1,301 @@
+"""Live metrics of a running logger over HTTP: Prometheus text and a JSON snapshot.
+
+With --metrics-port a logger serves, on --metrics-host (default 127.0.0.1):
+
+    /metrics        Prometheus text format
+    /metrics.json   the same as one JSON document
+
+with the latest values, the mean power over the last minute, the energy
+integrated since start, the sample rate, failure counts, acquisition latency
+quantiles and the queue statistics of the pipeline outputs. Samples only
+update a few counters (Metrics is a pipeline sink like console.StatusLine);
+everything is formatted when the endpoint is scraped. The HTTP loggers serve
+from a background thread (serve_in_thread), the asyncio Modbus datalogger
+from its own event loop (serve_async).
+"""
+import json
+import math
+import time
+
+from energylogger.timing import Histogram
+
+WINDOW = 60  # seconds of the rolling power mean and sample rate
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+    """Pipeline sink keeping the statistics served by the metrics endpoint.
+
+    `values(record)` returns the (column, value) pairs of a record and is
+    only called when scraped. `power(record)` (W, None or NaN when the sample
+    failed), `latency(record)` (seconds) and `failed(record)` run for every
+    sample and must be cheap. `labels` are added to every Prometheus sample.
+    """
+
+    name = "metrics"
+
+    def __init__(self, values, power=None, latency=None, failed=None, labels=None, max_gap=60.0):
+        self.values = values
+        self.power = power
+        self.latency = latency
+        self.failed = failed
+        self.labels = dict(labels or {})
+        self.max_gap = max_gap
+        self.pipeline = None  # set to report the other outputs' queues
+
+        self.started = time.perf_counter()
+        self.samples = 0
+        self.failures = 0
+        self.energy_wh = 0.0
+        self.scrapes = 0
+        self.latencies = Histogram()
+        self._latest = None
+        self._latest_time = None  # time.time() of the latest sample
+        self._last_power = None  # (perf_counter, watts) of the last sample with power
+        # Per-second buckets of the rolling window: second, samples, power sum, power count
+        self._seconds = [-1] * WINDOW
+        self._counts = [0] * WINDOW
+        self._power_sums = [0.0] * WINDOW
+        self._power_counts = [0] * WINDOW
+        self.server = None
+
+    def put(self, record, now=None):
+        """Account for one sample; O(1)."""
+        if now is None:
+            now = time.perf_counter()
+        self._latest = record
+        self._latest_time = time.time()
+        self.samples += 1
+        second = int(now)
+        i = second % WINDOW
+        if self._seconds[i] != second:
+            self._seconds[i] = second
+            self._counts[i] = 0
+            self._power_sums[i] = 0.0
+            self._power_counts[i] = 0
+        self._counts[i] += 1
+
+        if self.failed is not None and self.failed(record):
+            self.failures += 1
+        if self.latency is not None:
+            latency = self.latency(record)
+            if latency is not None:
+                self.latencies.record(latency)
+        if self.power is not None:
+            power = self.power(record)
+            if power is not None and power == power:
+                self._power_sums[i] += power
+                self._power_counts[i] += 1
+                last = self._last_power
+                if last is not None and now - last[0] <= self.max_gap:
+                    self.energy_wh += (now - last[0]) * (power + last[1]) / 2 / 3600
+                self._last_power = (now, power)
+
+    def snapshot(self):
+        """The current statistics as a dict (the JSON endpoint)."""
+        now = time.perf_counter()
+        elapsed = now - self.started
+        newest = int(now)
+        samples = power_sum = power_count = 0
+        for second, count, total, n in zip(self._seconds, self._counts, self._power_sums, self._power_counts):
+            if newest - second < WINDOW:
+                samples += count
+                power_sum += total
+                power_count += n
+        covered = max(min(elapsed, WINDOW), 1.0)
+        record = self._latest
+        values = {}
+        if record is not None:
+            try:
+                values = {name: value for name, value in self.values(record)}
+            except Exception as e:
+                values = {"error": str(e)}
+        histogram = self.latencies
+        return {
+            "labels": self.labels,
+            "uptime_s": round(elapsed, 3),
+            "samples": self.samples,
+            "failures": self.failures,
+            "sample_rate": round(samples / covered, 3),
+            "last_sample_unix_ms": int(self._latest_time * 1000) if self._latest_time else None,
+            "power_mean_w": power_sum / power_count if power_count else None,
+            "energy_wh": self.energy_wh,
+            "latency_ms": {
+                "mean": histogram.mean / 1000,
+                "p50": histogram.percentile(50) / 1000,
+                "p99": histogram.percentile(99) / 1000,
+                "max": histogram.max / 1000,
+            },
+            "outputs": [{"name": sink.name, "handled": sink.handled, "dropped": getattr(sink, "dropped", 0),
+                         "depth": getattr(sink, "depth", 0)}
+                        for sink in (self.pipeline.sinks if self.pipeline else ()) if sink is not self],
+            "values": values,
+        }
+
+    def prometheus(self):
+        """The current statistics in Prometheus text format."""
+        snapshot = self.snapshot()
+        labels = _labels(self.labels)
+        lines = []
+
+        def metric(name, kind, text, samples):
+            lines.append(f"# HELP energylogger_{name} {text}")
+            lines.append(f"# TYPE energylogger_{name} {kind}")
+            for extra, value in samples:
+                if value is not None:
+                    lines.append(f"energylogger_{name}{_labels(dict(self.labels, **extra))} {_number(value)}")
+
+        metric("samples_total", "counter", "Samples acquired.", [({}, snapshot["samples"])])
+        metric("failures_total", "counter", "Failed samples (timeouts, errors).", [({}, snapshot["failures"])])
+        metric("sample_rate", "gauge", f"Samples per second over the last {WINDOW} s.",
+               [({}, snapshot["sample_rate"])])
+        metric("last_sample_timestamp_seconds", "gauge", "Unix time of the latest sample.",
+               [({}, self._latest_time)])
+        metric("power_mean_watts", "gauge", f"Mean active power over the last {WINDOW} s.",
+               [({}, snapshot["power_mean_w"])])
+        metric("energy_watt_hours_total", "counter", "Energy integrated from the power samples since start.",
+               [({}, snapshot["energy_wh"])])
+        histogram = self.latencies
+        lines.append("# HELP energylogger_latency_seconds Acquisition latency of a sample.")
+        lines.append("# TYPE energylogger_latency_seconds summary")
+        for quantile in (0.5, 0.99):
+            lines.append(f"energylogger_latency_seconds{_labels(dict(self.labels, quantile=str(quantile)))} "
+                         f"{_number(histogram.percentile(quantile * 100) / 1e6)}")
+        lines.append(f"energylogger_latency_seconds_sum{labels} {_number(histogram.total / 1e6)}")
+        lines.append(f"energylogger_latency_seconds_count{labels} {histogram.count}")
+        metric("output_dropped_total", "counter", "Samples dropped by a full output queue.",
+               [({"output": o["name"]}, o["dropped"]) for o in snapshot["outputs"]])
+        metric("output_queue_depth", "gauge", "Samples waiting in an output queue.",
+               [({"output": o["name"]}, o["depth"]) for o in snapshot["outputs"]])
+        metric("value", "gauge", "Latest value of each column.",
+               [({"column": name}, value) for name, value in snapshot["values"].items()
+                if isinstance(value, (int, float))])
+        return "\n".join(lines) + "\n"
+
+    def respond(self, path):
+        """(status, content type, body) for a request path."""
+        self.scrapes += 1
+        path = path.split("?", 1)[0]
+        if path == "/metrics":
+            return 200, PROMETHEUS_TYPE, self.prometheus().encode("utf-8")
+        if path in ("/metrics.json", "/"):
+            return 200, "application/json", json.dumps(_finite(self.snapshot()), default=str).encode("utf-8")
+        return 404, "text/plain", b"not found\n"
+
+    def summary(self):
+        return f"{self.name}: {self.samples} samples, {self.scrapes} scrapes"
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _finite(value):
+    """`value` with NaN and infinities replaced by None, which JSON can represent."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _number(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return "NaN" if value != value else ("+Inf" if value > 0 else "-Inf")
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _ThreadServer:
+    """ThreadingHTTPServer serving a Metrics on a daemon thread."""
+
+    def __init__(self, metrics, host, port):
+        import http.server
+        import threading
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, content_type, body = metrics.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(http.server.ThreadingHTTPServer):
+            daemon_threads = True
+
+        self._server = Server((host, port), Handler)
+        self.address = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def serve_in_thread(metrics, host="127.0.0.1", port=9100):
+    """Serve `metrics` from a background thread; returns the (host, port) bound."""
+    metrics.server = _ThreadServer(metrics, host, port)
+    return metrics.server.address
+
+
+async def serve_async(metrics, host="127.0.0.1", port=9100):
+    """Serve `metrics` on the running event loop; returns the asyncio.Server.
+
+    The server stops with the event loop (or the returned server's close()).
+    """
+    import asyncio
+
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5.0)
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed
+            parts = request.decode("latin-1").split()
+            if len(parts) < 2 or parts[0] != "GET":
+                status, content_type, body = 405, "text/plain", b"only GET\n"
+            else:
+                status, content_type, body = metrics.respond(parts[1])
+            reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def add_metrics_arguments(parser):
+    """Add the metrics endpoint options to an argparse parser."""
+    group = parser.add_argument_group("metrics")
+    group.add_argument("--metrics-port", type=int, default=None,
+                       help="Serve live metrics on this port: /metrics (Prometheus) and /metrics.json "
+                            "(default: off).")
+    group.add_argument("--metrics-host", type=str, default="127.0.0.1",
+                       help="Address the metrics endpoint listens on (default: 127.0.0.1; 0.0.0.0 for all).")
+    return group
+
+
+def metrics_from_args(args, values, power=None, latency=None, failed=None, labels=None):
+    """Create the Metrics sink (None without --metrics-port); the caller starts serving it."""
+    if getattr(args, "metrics_port", None) is None:
+        return None
+    return Metrics(values, power, latency, failed, labels)
@@ -0,0 +1,69 @@
+"""Modbus helpers: merge register reads into as few requests as possible."""
+
+# A single "read input registers" request may return at most 125 registers
+MAX_READ_REGISTERS = 125
+
+
+def plan_reads(addresses, width=2, max_count=MAX_READ_REGISTERS, max_gap=None):
+    """Merge register addresses into the fewest contiguous range reads.
+
+    Each address is the first of `width` consecutive registers (2 for 32-bit
+    values); an (address, width) tuple overrides the width for that entry.
+    Ranges are grown greedily over the sorted addresses, which gives the
+    minimum number of requests for the `max_count` limit. Unused registers
+    between two values are read as well; set `max_gap` to start a new range
+    when the hole is larger than that many registers (some devices reject reads
+    that touch unmapped addresses).
+
+    Returns a list of (start, count) tuples.
+    """
+    spans = {}
+    for entry in addresses:
+        address, size = entry if isinstance(entry, tuple) else (entry, width)
+        if size > max_count:
+            raise ValueError(f"value width {size} exceeds the {max_count} register limit")
+        spans[address] = max(spans.get(address, 0), size)
+
+    plan = []
+    start = end = None
+    for address in sorted(spans):
+        size = spans[address]
+        if start is not None and max(end, address + size) - start <= max_count and (
+                max_gap is None or address - end <= max_gap):
+            end = max(end, address + size)
+            continue
+        if start is not None:
+            plan.append((start, end - start))
+        start, end = address, address + size
+    if start is not None:
+        plan.append((start, end - start))
+    return plan
+
+
+async def read_ranges(client, plan):
+    """Read every (start, count) range of the plan with read_input_registers.
+
+    Returns a list with the registers of each range, or None for ranges whose
+    request failed or returned the wrong number of registers (the error is
+    printed, like single register reads were).
+    """
+    blocks = []
+    for start, count in plan:
+        try:
+            response = await client.read_input_registers(start, count=count)
+            if response.isError():
+                print(f"Skipping registers {hex(start)}-{hex(start + count - 1)}: {response}")
+                blocks.append(None)
+                continue
+            registers = response.registers
+            if len(registers) != count:
+                print(f"Skipping registers {hex(start)}-{hex(start + count - 1)}: "
+                      f"{len(registers)} of {count} registers returned")
+                blocks.append(None)
+                continue
+            blocks.append(registers)
+        except Exception as e:
+            print(f"Exception while reading registers {hex(start)}-{hex(start + count - 1)}: {e}")
+            blocks.append(None)
+    return blocks
+
@@ -0,0 +1,187 @@
+"""Hand samples from the acquisition loop to slow consumers (sinks) on background threads.
+
+The acquisition loop calls Pipeline.put(record) and returns at once; every
+sink (CSV writer, console printer, ...) has its own bounded queue and worker
+thread, so a slow SD card or terminal delays only its own sink, never the
+sample cadence. What happens when a sink's queue is full is its overflow
+policy:
+
+    block        wait for room (lossless, but a stuck sink stalls acquisition)
+    drop-oldest  discard the oldest queued record (the sink sees the latest data)
+    drop-new     discard the new record
+
+Sinks block by default, so measurements are never lost silently; the console
+opts into drop-oldest. Dropped records are counted per sink, and the first
+drop is reported when it happens. Each sink also tracks its lag, the time
+from put() to the record being handled.
+"""
+import collections
+import threading
+import time
+
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+DROP_NEW = "drop-new"
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEW)
+
+
+class Sink:
+    """Bounded queue plus worker thread feeding `handle(record)`.
+
+    `close` (optional) is called once the queue has been drained on
+    shutdown; with `drain=False` records still queued then are discarded
+    (useful for console output).
+    """
+
+    def __init__(self, name, handle, close=None, capacity=10000, overflow=BLOCK, drain=True):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow!r} (expected one of {', '.join(OVERFLOW_POLICIES)})")
+        self.name = name
+        self.handle = handle
+        self._close = close
+        self.capacity = max(1, int(capacity))
+        self.overflow = overflow
+        self.drain = drain
+
+        # Statistics
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"sink:{name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Records waiting in the queue."""
+        return len(self._queue)
+
+    @property
+    def mean_lag(self):
+        return self.total_lag / self.handled if self.handled else 0.0
+
+    def put(self, record, now=None):
+        """Queue a record, applying the overflow policy if the queue is full."""
+        item = (time.perf_counter() if now is None else now, record)
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"sink {self.name} is closed")
+            if len(self._queue) >= self.capacity:
+                # Sinks that need not drain (the console) drop by design; data outputs say so once
+                if self.overflow != BLOCK and not self.dropped and self.drain:
+                    print(f"Output {self.name} is falling behind: its queue is full, dropping samples ({self.overflow})")
+                if self.overflow == DROP_NEW:
+                    self.dropped += 1
+                    return
+                if self.overflow == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.capacity and not self._closed:
+                        self._cond.wait()
+            self._queue.append(item)
+            self._cond.notify_all()
+
+    def summary(self):
+        return (f"{self.name}: {self.handled} handled, {self.dropped} dropped, "
+                f"lag mean {self.mean_lag * 1000:.2f} ms / max {self.max_lag * 1000:.2f} ms")
+
+    def close(self):
+        """Stop the worker after it has handled (or, without drain, discarded) the queue."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            if not self.drain:
+                self._queue.clear()
+            self._cond.notify_all()
+        self._thread.join()
+        if self._close is not None:
+            self._close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                queued, record = self._queue.popleft()
+                self._cond.notify_all()  # wake a producer blocked on a full queue
+            try:
+                self.handle(record)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in {self.name} output: {e}")
+            lag = time.perf_counter() - queued
+            self.handled += 1
+            self.last_lag = lag
+            self.total_lag += lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+
+class Pipeline:
+    """Fan each record out to several sinks.
+
+    A sink is anything with put(record, now), close() and summary(), such as
+    Sink or console.StatusLine.
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def put(self, record):
+        now = time.perf_counter()
+        for sink in self.sinks:
+            sink.put(record, now)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def report(self):
+        """One line of statistics per sink."""
+        return [sink.summary() for sink in self.sinks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def add_pipeline_arguments(parser):
+    """Add the sink queue options to an argparse parser."""
+    group = parser.add_argument_group("pipeline")
+    group.add_argument("--queue-size", type=int, default=10000,
+                       help="Samples buffered per output before the overflow policy applies (default: 10000).")
+    group.add_argument("--overflow", choices=OVERFLOW_POLICIES, default=BLOCK,
+                       help="What the data outputs do when their queue is full: block acquisition, drop the "
+                            "oldest or the newest sample (counted, and reported when it starts and on exit). "
+                            "Default: block, so no sample is lost. Console output always shows the latest "
+                            "sample.")
+    return group
+
+
+def pipeline_from_args(args, writer_handle, writer_close, console=None):
+    """Create a Pipeline with a data sink (queue options from `args`) and an optional console sink.
+
+    `console` is a ready sink, see console.console_from_args().
+    """
+    pipeline = Pipeline()
+    pipeline.add(Sink("file", writer_handle, writer_close,
+                      capacity=args.queue_size, overflow=args.overflow))
+    if console is not None:
+        pipeline.add(console)
+    return pipeline
@@ -0,0 +1,149 @@
+"""Declarative Modbus register maps and a precompiled block decoder.
+
+A register map is a sequence of Register entries. RegisterDecoder compiles it
+once into a read plan plus one struct format per block, so decoding a sample is
+a single struct.unpack per block and a multiply by the precomputed scales of
+the scaled registers, with no per-field branching. Supporting a new meter only needs a new map.
+"""
+import json
+import struct
+from collections import namedtuple
+
+from energylogger.modbus import MAX_READ_REGISTERS, plan_reads
+
+# address: first register, name: column name, scale: multiplier applied to the raw value,
+# signed: two's complement value, word_order: "big" (high word first) or "little",
+# width: number of 16-bit registers (1 or 2)
+Register = namedtuple("Register", "address name scale signed word_order width",
+                      defaults=(1.0, False, "big", 2))
+
+# struct type code of a (width, signed) register; also used to encode registers (bench/simulators.py)
+TYPE_CODES = {(1, False): "H", (1, True): "h", (2, False): "I", (2, True): "i"}
+_BYTE_ORDER = {"big": ">", "little": "<"}
+
+
+# Gude Expert Power Control line-in energy sensor (all 32-bit, high word first)
+GUDE_LINE_IN = (
+    Register(0x400, "absolute_active_energy"),
+    Register(0x402, "power_active"),
+    Register(0x404, "voltage"),  # No scaling needed
+    Register(0x406, "current", scale=0.001),  # mA to A
+    Register(0x408, "frequency", scale=0.01),  # 0.01 Hz to Hz
+    Register(0x40A, "power_factor", scale=0.001),
+    Register(0x40E, "power_apparent"),
+    Register(0x410, "power_reactive"),
+    Register(0x412, "absolute_active_energy_resettable"),
+    Register(0x414, "absolute_reactive_energy"),
+    Register(0x416, "absolute_reactive_energy_resettable"),
+    Register(0x41A, "forward_active_energy"),
+    Register(0x41C, "forward_reactive_energy"),
+    Register(0x41E, "forward_active_energy_resettable"),
+    Register(0x420, "forward_reactive_energy_resettable"),
+    Register(0x422, "reverse_active_energy"),
+    Register(0x424, "reverse_reactive_energy"),
+    Register(0x426, "reverse_active_energy_resettable"),
+    Register(0x428, "reverse_reactive_energy_resettable"),
+)
+
+
+def select(register_map, names):
+    """Return the registers of `register_map` named in `names`, in map order."""
+    wanted = set(names)
+    missing = wanted - {r.name for r in register_map}
+    if missing:
+        raise KeyError(f"unknown registers: {', '.join(sorted(missing))}")
+    return tuple(r for r in register_map if r.name in wanted)
+
+
+def load_register_map(filename):
+    """Load a register map from a JSON list of Register fields.
+
+    Addresses may be given as integers or as strings such as "0x400".
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    registers = []
+    for entry in entries:
+        entry = dict(entry)
+        if isinstance(entry["address"], str):
+            entry["address"] = int(entry["address"], 0)
+        registers.append(Register(**entry))
+    return tuple(registers)
+
+
+class RegisterDecoder:
+    """Compile a register map into a read plan and fixed-layout block decoders.
+
+    Records are lists with one slot per register, ordered by address; `index`
+    maps register names to slots. Unscaled registers keep the integer the
+    meter reports (so CSV columns stay "230", not "230.0"), scaled ones are
+    floats. Registers of a block whose read failed, or whose response has the
+    wrong length, are left as NaN.
+    """
+
+    def __init__(self, registers, max_count=MAX_READ_REGISTERS, max_gap=None):
+        self.registers = tuple(sorted(registers, key=lambda r: r.address))
+        self.names = tuple(r.name for r in self.registers)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        if len(self.index) != len(self.names):
+            raise ValueError("register names must be unique")
+        for r in self.registers:
+            if (r.width, bool(r.signed)) not in TYPE_CODES or r.word_order not in _BYTE_ORDER:
+                raise ValueError(f"unsupported register definition: {r}")
+
+        self.plan = plan_reads([(r.address, r.width) for r in self.registers],
+                               max_count=max_count, max_gap=max_gap)
+        self._empty = [float("nan")] * len(self.registers)
+
+        # For each block its register count and one (pack, unpack, scaled, slots) group
+        # per word order; scaled lists the (position, scale) of the fields to multiply
+        self._blocks = []
+        for start, count in self.plan:
+            groups = []
+            for word_order, byte_order in _BYTE_ORDER.items():
+                fields = [(i, r) for i, r in enumerate(self.registers)
+                          if start <= r.address < start + count and r.word_order == word_order]
+                if not fields:
+                    continue
+                fmt, position = [byte_order], start
+                for _, r in fields:
+                    if r.address < position:
+                        raise ValueError(f"register {r.name} overlaps the previous register")
+                    if r.address > position:
+                        fmt.append(f"{(r.address - position) * 2}x")
+                    fmt.append(TYPE_CODES[(r.width, bool(r.signed))])
+                    position = r.address + r.width
+                slots = [i for i, _ in fields]
+                if slots == list(range(slots[0], slots[-1] + 1)):
+                    slots = slice(slots[0], slots[-1] + 1)
+                groups.append((
+                    struct.Struct(f"{byte_order}{count}H").pack,
+                    struct.Struct("".join(fmt)).unpack_from,
+                    tuple((j, float(r.scale)) for j, (_, r) in enumerate(fields) if r.scale != 1),
+                    slots,
+                ))
+            self._blocks.append((count, groups))
+
+    def decode(self, blocks):
+        """Decode the register lists returned for each planned read into a record."""
+        record = self._empty[:]
+        for (count, groups), registers in zip(self._blocks, blocks):
+            if registers is None or len(registers) != count:
+                continue  # failed or short response: the block stays NaN
+            for pack, unpack, scaled, slots in groups:
+                try:
+                    values = list(unpack(pack(*registers)))
+                except struct.error:
+                    break  # register values out of range
+                for j, scale in scaled:
+                    values[j] *= scale
+                if type(slots) is slice:
+                    record[slots] = values
+                else:
+                    for slot, value in zip(slots, values):
+                        record[slot] = value
+        return record
+
+    def as_dict(self, record):
+        """Return a {name: value} view of a record (for display, not the hot loop)."""
+        return dict(zip(self.names, record))
@@ -0,0 +1,207 @@
+"""Drift-free fixed-rate scheduling on the monotonic clock, optionally adaptive."""
+import time
+
+# What to do when one or more ticks were missed because a sample took too long
+SKIP = "skip"          # drop the missed ticks and stay on the original grid
+CATCH_UP = "catch-up"  # run the missed ticks back to back until on time again
+COALESCE = "coalesce"  # run one tick now and restart the grid from here
+POLICIES = (SKIP, CATCH_UP, COALESCE)
+
+
+class FixedRateScheduler:
+    """Pace a polling loop on absolute deadlines instead of sleeping after the work.
+
+    Call wait() (or `await wait_async()` on an event loop) at the top of every
+    iteration. The first call returns immediately and anchors the grid; later
+    calls sleep until the next deadline, so request and write time do not add
+    up to drift. Both return the lateness of the tick in seconds.
+
+    `period` may be changed between ticks; the new value applies from the next
+    deadline on.
+    """
+
+    def __init__(self, period, policy=SKIP, clock=time.monotonic):
+        if period <= 0:
+            raise ValueError("period must be positive")
+        if policy not in POLICIES:
+            raise ValueError(f"unknown missed-tick policy {policy!r} (expected one of {', '.join(POLICIES)})")
+        self.period = period
+        self.policy = policy
+        self.clock = clock
+        self._next = None
+
+        # Per-tick statistics
+        self.ticks = 0
+        self.missed = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+
+    def delay(self):
+        """Seconds until the next deadline (0 if it has passed)."""
+        if self._next is None:
+            return 0.0
+        return max(0.0, self._next - self.clock())
+
+    def wait(self):
+        """Block until the next deadline and return the tick's lateness."""
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+        return self._tick()
+
+    async def wait_async(self):
+        """Asyncio version of wait()."""
+        import asyncio  # only the asyncio loggers pay for the import
+
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._tick()
+
+    def set_period(self, period):
+        """Change the period and move the pending deadline with it.
+
+        Unlike assigning `period`, a shorter period takes effect for the very
+        next tick: the next deadline becomes the last one plus `period`, or
+        now if that has already passed (which is not a missed tick).
+        """
+        if period <= 0:
+            raise ValueError("period must be positive")
+        if self._next is not None:
+            self._next = max(self._next + period - self.period, self.clock())
+        self.period = period
+
+    @property
+    def mean_lateness(self):
+        return self.total_lateness / self.ticks if self.ticks else 0.0
+
+    def _tick(self):
+        now = self.clock()
+        deadline = now if self._next is None else self._next
+        lateness = max(0.0, now - deadline)
+        period = self.period
+
+        behind = int(lateness // period)  # deadlines after this one that have also passed
+        if self.policy == CATCH_UP:
+            self._next = deadline + period
+        elif self.policy == COALESCE and behind:
+            self._next = now + period
+            self.missed += behind
+        else:
+            self._next = deadline + (behind + 1) * period
+            self.missed += behind
+
+        self.ticks += 1
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.total_lateness += lateness
+        return lateness
+
+
+def add_scheduler_arguments(parser):
+    """Add the missed-tick policy option to an argparse parser."""
+    parser.add_argument("--missed", choices=POLICIES, default=SKIP,
+                        help="What to do with ticks missed because a sample overran the rate "
+                             "(default: skip).")
+
+
+class AdaptiveRate:
+    """Poll slowly while a signal is steady and at the full rate around its transients.
+
+    The scheduler's period at creation is the fast one; it is set to `slow`
+    right away. update(value) runs a change test on every sample: a jump of
+    at least `threshold` from the previous sample, or a two-sided CUSUM of the
+    deviations from a running baseline (slack threshold/4, alarm at
+    `threshold`) for smaller shifts that persist. A change switches to the fast
+    period for the next tick; `hold` seconds after the last change the period
+    doubles on every tick until it is back at `slow`.
+    """
+
+    BASELINE_WEIGHT = 0.1  # EWMA weight of a new sample in the baseline
+
+    def __init__(self, scheduler, slow, threshold, hold=5.0, clock=time.monotonic):
+        if threshold <= 0:
+            raise ValueError("threshold must be positive")
+        self.scheduler = scheduler
+        self.fast = scheduler.period
+        self.slow = max(slow, self.fast)
+        self.threshold = threshold
+        self.hold = hold
+        self.clock = clock
+        self._slack = threshold / 4
+        self._baseline = None
+        self._last = None
+        self._high = 0.0
+        self._low = 0.0
+        self._changed = None
+
+        # Statistics
+        self.samples = 0
+        self.fast_samples = 0
+        self.transients = 0
+        scheduler.set_period(self.slow)
+
+    def update(self, value):
+        """Feed one sample of the watched signal (None or NaN for a failed sample)."""
+        if value is None or value != value:
+            return
+        scheduler = self.scheduler
+        self.samples += 1
+        if scheduler.period < self.slow:
+            self.fast_samples += 1
+        if self._baseline is None:
+            self._baseline = self._last = value
+            return
+
+        deviation = value - self._baseline
+        self._high = max(0.0, self._high + deviation - self._slack)
+        self._low = max(0.0, self._low - deviation - self._slack)
+        now = self.clock()
+        if abs(value - self._last) >= self.threshold or self._high >= self.threshold or self._low >= self.threshold:
+            if scheduler.period >= self.slow:
+                self.transients += 1
+            self._changed = now
+            self._baseline = value
+            self._high = self._low = 0.0
+            if scheduler.period != self.fast:
+                scheduler.set_period(self.fast)
+        else:
+            self._baseline += self.BASELINE_WEIGHT * deviation
+            if scheduler.period < self.slow and now - self._changed >= self.hold:
+                scheduler.set_period(min(self.slow, scheduler.period * 2))
+        self._last = value
+
+    def report(self):
+        """Summary lines for the end of a capture."""
+        share = 100 * self.fast_samples / self.samples if self.samples else 0.0
+        return [f"adaptive: {self.transients} transients, {self.fast_samples} of {self.samples} samples "
+                f"({share:.1f} %) above the slow rate"]
+
+
+_DEFAULT_THRESHOLDS = {"power": 5.0, "current": 0.02}
+
+
+def add_adaptive_arguments(parser):
+    """Add the adaptive polling options to an argparse parser."""
+    signals = tuple(_DEFAULT_THRESHOLDS)
+    group = parser.add_argument_group("adaptive polling")
+    group.add_argument("--adaptive", type=float, default=None, metavar="SECONDS",
+                       help="Poll every SECONDS while the signal is steady and at --rate during transients "
+                            "(default: always at --rate).")
+    group.add_argument("--adaptive-signal", choices=signals, default=signals[0],
+                       help=f"Signal watched for transients (default: {signals[0]}).")
+    group.add_argument("--adaptive-threshold", type=float, default=None,
+                       help="Change of the signal that counts as a transient, as a jump between two samples "
+                            "or a sustained shift (CUSUM) (default: 5 W for power, 0.02 A for current).")
+    group.add_argument("--adaptive-hold", type=float, default=5.0,
+                       help="Seconds at --rate after the last transient before slowing down again (default: 5).")
+    return group
+
+
+def adaptive_from_args(args, scheduler):
+    """Create the AdaptiveRate for a scheduler (None without --adaptive)."""
+    if not getattr(args, "adaptive", None):
+        return None
+    threshold = args.adaptive_threshold or _DEFAULT_THRESHOLDS[args.adaptive_signal]
+    return AdaptiveRate(scheduler, args.adaptive, threshold, args.adaptive_hold)
@@ -0,0 +1,102 @@
+"""CSV layouts produced by the loggers, and detection of a capture's layout."""
+import csv
+from collections import namedtuple
+
+from energylogger.clock import MIDPOINT_COLUMNS, OFFSET_COLUMNS
+
+# header: exact column list, timestamp: time column, timestamp_format: strptime
+# format of that column (None for Unix ms, "ISO8601" for ISO 8601 with offset), power/energy: active power and
+# cumulative energy columns (None for non-power captures), energy_scale: factor
+# from the energy column's unit to Wh
+CaptureSchema = namedtuple("CaptureSchema", "name header timestamp timestamp_format power energy energy_scale")
+
+_GUDE_COLUMNS = [
+    "Voltage (V)", "Current (A)", "Frequency (Hz)", "Phase (deg)",
+    "Active Power (W)", "Reactive Power (VAR)", "Apparent Power (VA)",
+    "Power Factor (PF)", "Total Energy (kWh)", "Resettable Energy (kWh)",
+]
+
+SCHEMAS = {
+    # logger.py: device clock, day first, whole seconds
+    "v1": CaptureSchema("v1", ["Timestamp"] + _GUDE_COLUMNS, "Timestamp", "%d-%m-%Y %H:%M:%S",
+                        "Active Power (W)", "Total Energy (kWh)", 1000.0),
+    # logger_v2.py: device clock plus host milliseconds
+    "v2": CaptureSchema("v2", ["Timestamp"] + _GUDE_COLUMNS, "Timestamp", "%Y-%m-%d %H:%M:%S.%f",
+                        "Active Power (W)", "Total Energy (kWh)", 1000.0),
+    # EnergyLogging/log.py
+    "energy": CaptureSchema("energy", [
+        "Unix Timestamp (ms)", "UTC Human-Readable", "Voltage (V)", "Current (A)", "Active Power (W)",
+        "Computed Active Power (W) - Precise", "Frequency (Hz)", "Apparent Power (VA)", "Computed Apparent Power (VA)",
+        "Power Factor (PF)", "Total Energy (Wh)", "Resettable Energy (Wh)", "Elapsed Time (µs)",
+    ], "Unix Timestamp (ms)", None, "Active Power (W)", "Total Energy (Wh)", 1.0),
+    # TCP-MODBUS/datalogger.py
+    "modbus": CaptureSchema("modbus", [
+        "UTC", "Voltage (V)", "Current (A)", "Active Power (W)", "Computed Power (W)", "Frequency (Hz)",
+        "Apparent Power (VA)", "Power Factor (PF)", "Total Energy (Wh)", "Resettable Energy (Wh)", "Elapsed Time (µs)",
+    ], "UTC", None, "Active Power (W)", "Total Energy (Wh)", 1.0),
+    # energylogger.engine Gude HTTP devices
+    "engine": CaptureSchema("engine", ["Unix Timestamp (ms)"] + _GUDE_COLUMNS + ["Elapsed Time (µs)"],
+                            "Unix Timestamp (ms)", None, "Active Power (W)", "Total Energy (kWh)", 1000.0),
+    # Browser statistics recorded by the PUPPETEER monitors
+    "twitch-video": CaptureSchema("twitch-video", [
+        "UTC_Timestamp", "Download_Resolution", "Download_Bitrate", "Bandwidth_Estimate", "FPS", "Skipped_Frames",
+        "Buffer_Size", "Latency_To_Broadcaster", "Codecs", "Protocol", "Latency_Mode",
+    ], "UTC_Timestamp", None, None, None, None),
+    "youtube-video": CaptureSchema("youtube-video", [
+        "UTC_Timestamp", "Resolution", "FPS", "Codecs", "Bandwidth_kbps", "Network_Activity_KB",
+        "Buffer_Health_s", "Live_Latency_s", "Latency_Mode",
+    ], "UTC_Timestamp", None, None, None, None),
+    # DevToolInterpretation/interpret.py request timeline exported from a HAR file
+    "har": CaptureSchema("har", [
+        "Request URL", "Started DateTime", "Protocol", "Status Code", "Content Size", "MIME Type", "Transfer Size",
+    ], "Started DateTime", "ISO8601", None, None, None),
+}
+
+# TemperatureLogging/temperature_logger.py: Unix ms plus one column per modem sensor
+TEMPERATURE = CaptureSchema("temperature", None, "Timestamp", None, None, None, None)
+
+# Names accepted for the time, power and energy columns of other layouts (e.g. binary captures)
+_TIMESTAMP_COLUMNS = ("Unix Timestamp (ms)", "UTC")
+_ENERGY_COLUMNS = {"Total Energy (Wh)": 1.0, "Total Energy (kWh)": 1000.0}
+
+
+def detect_schema(header, first_row=None):
+    """Return the CaptureSchema of a capture from its header (and first data row).
+
+    The first row tells v1 from v2, which share a header. A known layout may
+    be followed by the --precise-time columns. Headers that match no known
+    layout but have a Unix ms time column and an active power column get an
+    ad-hoc "generic" schema; anything else returns None.
+    """
+    header = list(header)
+    # Columns added by --precise-time (see clock.PreciseTimestamps) follow a known layout
+    known = header
+    for extra in (MIDPOINT_COLUMNS + OFFSET_COLUMNS, MIDPOINT_COLUMNS):
+        if len(header) > len(extra) and header[-len(extra):] == extra:
+            known = header[:-len(extra)]
+            break
+    for schema in SCHEMAS.values():
+        if schema.header == known:
+            if schema.name in ("v1", "v2"):
+                # v1 starts with the day ("01-03-2025 ..."), v2 with the year ("2025-03-01 ...")
+                schema = SCHEMAS["v2" if first_row and first_row[0][4:5] == "-" else "v1"]
+            return schema if known is header else schema._replace(header=header)
+
+    if header and header[0] == "Timestamp":
+        return TEMPERATURE._replace(header=header)
+
+    timestamp = next((c for c in _TIMESTAMP_COLUMNS if c in header), None)
+    energy = next((c for c in _ENERGY_COLUMNS if c in header), None)
+    if timestamp and "Active Power (W)" in header:
+        return CaptureSchema("generic", header, timestamp, None, "Active Power (W)", energy,
+                             _ENERGY_COLUMNS.get(energy))
+    return None
+
+
+def read_csv_head(filename):
+    """Return (header, first_row) of a CSV file without reading the rest."""
+    with open(filename, "r", newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        first_row = next(reader, None)
+    return header, first_row
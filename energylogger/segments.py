@@ -0,0 +1,348 @@
+"""Segmented captures that resume after a crash, and an event log for gaps and timeouts.
+
+With --segment-size MB and/or --segment-time SECONDS, `capture.csv` becomes a
+series capture_000001.csv, capture_000002.csv, ... The segment being written
+is `capture_000003.csv.part`; when it reaches the size or age limit, or the
+logger exits, it is fsynced and renamed to its final name, so every file
+without .part is complete. A run after a crash or reboot finalizes the
+leftover .part segment (cutting off a partially written last row) and
+continues with the next number.
+
+With --events, failed samples (TIMEOUT rows, or a missing active power) are
+not written as rows but as one "timeout" event per run of failures in
+`<csv>_events.csv`; intervals without any sample longer than --gap seconds
+(a Modbus disconnect, a restart) become "gap" events. Starts, stops and
+finalized segments are logged there too. Every event has its Unix ms time,
+a duration and a count, so tools can skip or interpolate gaps without
+scanning the capture for sentinel values.
+"""
+import csv
+import os
+import re
+import time
+
+from energylogger.clock import timestamp_ms
+from energylogger.csv_writer import BufferedCSVWriter
+
+EVENTS_HEADER = ["Unix Timestamp (ms)", "Event", "Duration (ms)", "Count", "Detail"]
+POWER_COLUMN = "Active Power (W)"
+TIMEOUT = "TIMEOUT"
+PART = ".part"
+
+
+def segment_name(filename, number):
+    """Final name of segment `number` of a capture: `<base>_000001<ext>`."""
+    base, extension = os.path.splitext(filename)
+    return f"{base}_{number:06d}{extension}"
+
+
+def list_segments(filename):
+    """Sorted (number, path) of the finalized and .part segments of a capture."""
+    directory, name = os.path.split(filename)
+    base, extension = os.path.splitext(name)
+    pattern = re.compile(re.escape(base) + r"_(\d{6,})" + re.escape(extension) + r"(\.part)?$")
+    segments = []
+    for entry in os.listdir(directory or "."):
+        match = pattern.match(entry)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(directory, entry)))
+    return sorted(segments)
+
+
+def _truncate_partial_row(filename):
+    """Cut off a CSV's last line if it was not completely written."""
+    with open(filename, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        end = tail.rfind(b"\n") + 1
+        keep = size - len(tail) + end
+        if keep != size:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _fsync_directory(path):
+    """Make a rename in the directory of `path` durable (where the OS supports it)."""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def finalize(part):
+    """Rename a .part segment (and its time index) to the final name; returns that name."""
+    final = part[:-len(PART)]
+    os.replace(part, final)
+    if os.path.exists(part + ".idx"):
+        os.replace(part + ".idx", final + ".idx")
+    _fsync_directory(final)
+    return final
+
+
+def last_timestamp(filename, timestamp_format=None):
+    """Unix ms of the last row of a CSV or binary capture (None if it has none)."""
+    try:
+        with open(filename, "rb") as f:
+            from energylogger.binlog import MAGIC, BinaryLog
+
+            if f.read(len(MAGIC)) == MAGIC:
+                log = BinaryLog(filename)
+                if not log.count:
+                    return None
+                f.seek(log.offset + (log.count - 1) * log.record_size)
+                return int.from_bytes(f.read(8), "little", signed=True)
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 65536))
+            lines = f.read().splitlines()
+    except (OSError, ValueError):
+        return None
+    for line in reversed(lines):
+        try:
+            value = next(csv.reader([line.decode("utf-8", "replace")]))[0]
+            return timestamp_ms(value, timestamp_format)
+        except (ValueError, IndexError, StopIteration):
+            continue  # a partial last line or the header
+    return None
+
+
+class SegmentedWriter:
+    """Writer front end that splits a capture into bounded, atomically finalized segments.
+
+    `factory(filename)` opens the writer of one segment (a BufferedCSVWriter or
+    BinaryWriter). A segment is finalized once it holds `max_bytes` bytes or is
+    `max_seconds` old; the next segment is opened with the next row, so no
+    empty segments are left behind. The size is counted as rows are passed
+    on (writer.row_size), not read from the disk, so rows still buffered by
+    the writer thread count too. `on_segment(filename, rows)` is called
+    after each finalize. `resume_from` is the latest segment of an earlier run.
+    """
+
+    def __init__(self, factory, filename, max_bytes=None, max_seconds=None, on_segment=None):
+        self.factory = factory
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.on_segment = on_segment
+        self.segments = 0
+        self.writer = None
+        self.part = None
+        self.rows = 0
+        self.bytes = 0
+        self._opened = 0.0
+
+        self.number = 0
+        self.resume_from = None
+        for number, path in list_segments(filename):
+            if path.endswith(PART):
+                path = self._recover(path)
+            self.number = number
+            self.resume_from = path or self.resume_from
+
+    def _recover(self, part):
+        """Finalize a segment left open by a crashed run; returns its final name (None if empty)."""
+        try:
+            if os.path.getsize(part) == 0:
+                os.remove(part)
+                return None
+            if self.filename.endswith(".bin"):
+                from energylogger.binlog import recover
+
+                recover(part)
+            else:
+                _truncate_partial_row(part)
+            final = finalize(part)
+        except (OSError, ValueError) as e:
+            print(f"Error recovering {part}: {e}")
+            return None
+        print(f"Recovered {final} from an interrupted run")
+        return final
+
+    def writerow(self, row):
+        if self.writer is None:
+            self._open()
+        self.writer.writerow(row)
+        self.rows += 1
+        if self.max_bytes:
+            self.bytes += self.writer.row_size(row)
+        if self._full():
+            self._finalize()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer is not None:
+            self._finalize()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open(self):
+        self.number += 1
+        self.part = segment_name(self.filename, self.number) + PART
+        self.writer = self.factory(self.part)
+        self.rows = 0
+        self.bytes = os.path.getsize(self.part)  # the header
+        self._opened = time.monotonic()
+
+    def _full(self):
+        if self.max_seconds and time.monotonic() - self._opened >= self.max_seconds:
+            return True
+        return bool(self.max_bytes) and self.bytes >= self.max_bytes
+
+    def _finalize(self):
+        writer, self.writer = self.writer, None
+        writer.close()
+        try:
+            final = finalize(self.part)
+        except OSError as e:
+            print(f"Error finalizing {self.part}: {e}")
+            return
+        self.segments += 1
+        self.resume_from = final
+        if self.on_segment:
+            self.on_segment(final, self.rows)
+
+
+class EventWriter:
+    """Writer front end that turns failed samples and sampling gaps into events.
+
+    Rows whose active power is TIMEOUT or NaN are not passed on to `raw`;
+    each run of them becomes one "timeout" event. A longer interval than
+    `gap` seconds between two samples (or since the last row of the previous
+    run, read from `resume_from`) is logged as a "gap" event.
+    """
+
+    def __init__(self, raw, filename, header, timestamp_format=None, gap=5.0, resume_from=None, **options):
+        self.raw = raw
+        self.timestamp_format = timestamp_format
+        self.gap_ms = gap * 1000
+        self.power_index = header.index(POWER_COLUMN) if POWER_COLUMN in header else None
+        base = filename.rsplit(".", 1)[0] if filename.endswith((".csv", ".bin")) else filename
+        # Events are rare: write each at once so a crash loses none
+        self.events = BufferedCSVWriter(f"{base}_events.csv", EVENTS_HEADER, **dict(options, flush_rows=1))
+        self.counts = {}
+        self._last = last_timestamp(resume_from, timestamp_format) if resume_from else None
+        self._restart = self._last is not None
+        self._timeouts = None  # [first, last, count] of the current run of failed samples
+        self.event("start", detail=os.path.basename(filename))
+
+    def event(self, name, timestamp=None, duration="", count="", detail=""):
+        """Log one event (at the current time unless `timestamp`, Unix ms, is given)."""
+        if timestamp is None:
+            timestamp = time.time_ns() // 1_000_000
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.events.writerow([timestamp, name, duration, count, detail])
+
+    def on_segment(self, filename, rows):
+        """SegmentedWriter callback logging each finalized segment."""
+        self.event("segment", count=rows, detail=os.path.basename(filename))
+
+    def writerow(self, row):
+        try:
+            timestamp = timestamp_ms(row[0], self.timestamp_format)
+        except (TypeError, ValueError):
+            timestamp = None
+        if timestamp is not None:
+            if self._last is not None and timestamp - self._last > self.gap_ms:
+                self.event("gap", self._last, timestamp - self._last,
+                           detail="restart" if self._restart else "no samples")
+            self._last = timestamp
+            self._restart = False
+
+        if self.power_index is not None:
+            power = row[self.power_index]
+            if power == TIMEOUT or power != power:  # NaN
+                if self._timeouts is None:
+                    self._timeouts = [timestamp, timestamp, 0]
+                self._timeouts[1] = timestamp
+                self._timeouts[2] += 1
+                return
+            self._end_timeouts()
+        self.raw.writerow(row)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        self.raw.flush()
+        self.events.flush()
+
+    def close(self):
+        self._end_timeouts()
+        self.raw.close()
+        self.event("stop")
+        self.events.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _end_timeouts(self):
+        if self._timeouts is not None:
+            first, last, count = self._timeouts
+            duration = last - first if first is not None and last is not None else ""
+            self.event("timeout", first, duration, count)
+            self._timeouts = None
+
+
+def add_segment_arguments(parser):
+    """Add the segment and event log options to an argparse parser."""
+    group = parser.add_argument_group("segments and events")
+    group.add_argument("--segment-size", type=float, default=None, metavar="MB",
+                       help="Start a new segment <csv>_000001.csv, <csv>_000002.csv, ... once the current one "
+                            "holds this many MB; unfinished segments end in .part (default: one file).")
+    group.add_argument("--segment-time", type=float, default=None, metavar="SECONDS",
+                       help="Start a new segment after this many seconds (default: one file).")
+    group.add_argument("--events", action="store_true",
+                       help="Log failed samples and sampling gaps to <csv>_events.csv instead of writing "
+                            "TIMEOUT rows.")
+    group.add_argument("--gap", type=float, default=None, metavar="SECONDS",
+                       help="Interval without samples logged as a gap event (default: 3 sampling periods, "
+                            "the slow one with --adaptive, at least 1 s).")
+    return group
+
+
+def segments_from_args(args, factory, filename, header, timestamp_format=None, **options):
+    """Wrap the writer of `filename` made by `factory(name)` as --segment-* and --events ask.
+
+    Without those options this returns factory(filename) unchanged.
+    """
+    segment_size = getattr(args, "segment_size", None)
+    segment_time = getattr(args, "segment_time", None)
+    events = getattr(args, "events", False)
+    if segment_size or segment_time:
+        writer = SegmentedWriter(factory, filename, max_bytes=segment_size and int(segment_size * 1e6),
+                                 max_seconds=segment_time)
+        resume_from = writer.resume_from
+    else:
+        writer = factory(filename)
+        resume_from = filename
+    if not events:
+        return writer
+    # The longest sampling period is the slow one of adaptive polling (see scheduler.AdaptiveRate)
+    period = max(getattr(args, "rate", 0) or 0, getattr(args, "adaptive", None) or 0)
+    gap = args.gap if getattr(args, "gap", None) else max(3 * period, 1.0)
+    writer = EventWriter(writer, filename, header, timestamp_format, gap, resume_from, **options)
+    if isinstance(writer.raw, SegmentedWriter):
+        writer.raw.on_segment = writer.on_segment
+    return writer
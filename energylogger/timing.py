@@ -0,0 +1,241 @@
+"""Per-stage timing of the acquisition loop in fixed-memory histograms.
+
+With --timing a logger records how long each stage of a sample takes
+(connect, request, parse/decode, enqueue, flush, scheduler lateness and the
+whole cycle) into HDR-style histograms: log-linear buckets at microsecond
+resolution with under 1 % relative error, so memory is fixed however long the
+capture runs. Every --timing-interval seconds the count, rate, mean, p50, p99
+and max of each stage over the interval are appended to `<csv>_timing.csv`;
+the rate of the "cycle" stage is the effective sample rate. Totals over the
+whole capture are added (scope "total") and printed on exit.
+"""
+import threading
+import time
+
+from energylogger.csv_writer import BufferedCSVWriter
+
+# Stage names used by the loggers
+CONNECT = "connect"
+REQUEST = "request"
+PARSE = "parse"
+DECODE = "decode"
+ENQUEUE = "enqueue"
+FLUSH = "flush"
+LATENESS = "lateness"
+CYCLE = "cycle"
+
+SUMMARY_HEADER = ["Unix Timestamp (ms)", "Scope", "Stage", "Interval (s)", "Count", "Rate (1/s)",
+                  "Mean (ms)", "p50 (ms)", "p99 (ms)", "Max (ms)"]
+
+_SUB_BITS = 8                    # 256 linear sub-buckets per power of two
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+_HIGHEST = 1 << 36               # microseconds, about 19 hours; longer values land in the last bucket
+
+
+def _bucket(value):
+    """Bucket index of a value in microseconds."""
+    if value < _SUB_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BITS
+    return _SUB_COUNT + (shift - 1) * _HALF_COUNT + (value >> shift) - _HALF_COUNT
+
+
+def _bucket_range(index):
+    """Lowest value and width (microseconds) of a bucket."""
+    if index < _SUB_COUNT:
+        return index, 1
+    shift, sub = divmod(index - _SUB_COUNT, _HALF_COUNT)
+    shift += 1
+    return (sub + _HALF_COUNT) << shift, 1 << shift
+
+
+_BUCKETS = _bucket(_HIGHEST - 1) + 1
+
+
+class Histogram:
+    """Log-linear histogram of durations (HDR histogram layout), in microseconds.
+
+    Values below 256 µs are counted exactly; above that each power of two is
+    split into 128 buckets. Count, sum, min and max are kept exactly.
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, seconds):
+        value = round(seconds * 1e6)
+        if value < 0:
+            value = 0
+        self.counts[_bucket(value) if value < _HIGHEST else _BUCKETS - 1] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the counts of another histogram to this one."""
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        """Mean in microseconds (0 when empty)."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Value (microseconds) below which `percent` % of the recorded values fall."""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                if index == _BUCKETS - 1:
+                    # The last bucket also holds everything longer than _HIGHEST
+                    return float(self.max)
+                low, width = _bucket_range(index)
+                # Middle of the bucket, kept within the exact extremes
+                return min(max(low + (width - 1) / 2, self.min), self.max)
+        return float(self.max)
+
+
+class Timings:
+    """Histograms of stage durations, with a periodic summary in a sidecar CSV.
+
+    record(stage, seconds) is safe to call from any thread. A disabled
+    Timings (the default without --timing) ignores everything, so loggers can
+    record unconditionally.
+    """
+
+    def __init__(self, filename=None, interval=10.0, enabled=True):
+        self.enabled = enabled
+        self.filename = filename
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._interval_start = self.started
+        self._current = {}  # stage -> Histogram since the last summary
+        self._totals = {}   # stage -> Histogram over the whole capture
+        self._lock = threading.Lock()
+        self._writer = None
+        self._stop = threading.Event()
+        self._thread = None
+        if enabled and filename:
+            self._writer = BufferedCSVWriter(filename, SUMMARY_HEADER, flush_rows=1, flush_interval=interval)
+            self._thread = threading.Thread(target=self._run, name="timing-summary", daemon=True)
+            self._thread.start()
+
+    def record(self, stage, seconds):
+        """Add one duration (seconds) to a stage's histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._current.get(stage)
+            if histogram is None:
+                histogram = self._current[stage] = Histogram()
+            histogram.record(seconds)
+
+    def on_flush(self, rows, seconds):
+        """BufferedWriter on_flush callback recording the flush stage."""
+        self.record(FLUSH, seconds)
+
+    def summarize(self):
+        """Fold the current interval into the totals and return its summary rows."""
+        with self._lock:
+            now = time.perf_counter()
+            current, self._current = self._current, {}
+            elapsed, self._interval_start = now - self._interval_start, now
+        timestamp = time.time_ns() // 1_000_000
+        rows = []
+        for stage, histogram in current.items():
+            rows.append(_summary_row(timestamp, "interval", stage, elapsed, histogram))
+            total = self._totals.get(stage)
+            if total is None:
+                self._totals[stage] = histogram
+            else:
+                total.merge(histogram)
+        return rows
+
+    def report(self):
+        """One line per stage over the whole capture (empty when disabled)."""
+        elapsed = time.perf_counter() - self.started
+        lines = []
+        for stage, histogram in self._totals.items():
+            rate = histogram.count / elapsed if elapsed > 0 else 0.0
+            lines.append(f"timing {stage}: {histogram.count} ({rate:.1f}/s), "
+                         f"mean {histogram.mean / 1000:.3f} ms, p50 {histogram.percentile(50) / 1000:.3f} ms, "
+                         f"p99 {histogram.percentile(99) / 1000:.3f} ms, max {histogram.max / 1000:.3f} ms")
+        return lines
+
+    def close(self):
+        """Write the last interval and the totals, then close the sidecar file."""
+        if not self.enabled:
+            return
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        rows = self.summarize()
+        if self._writer is not None:
+            elapsed = time.perf_counter() - self.started
+            timestamp = time.time_ns() // 1_000_000
+            rows.extend(_summary_row(timestamp, "total", stage, elapsed, histogram)
+                        for stage, histogram in self._totals.items())
+            self._writer.writerows(rows)
+            self._writer.close()
+            self._writer = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rows = self.summarize()
+            if rows:
+                self._writer.writerows(rows)
+
+
+def _summary_row(timestamp, scope, stage, elapsed, histogram):
+    rate = histogram.count / elapsed if elapsed > 0 else 0.0
+    return [timestamp, scope, stage, round(elapsed, 3), histogram.count, round(rate, 3),
+            round(histogram.mean / 1000, 3), round(histogram.percentile(50) / 1000, 3),
+            round(histogram.percentile(99) / 1000, 3), round(histogram.max / 1000, 3)]
+
+
+def timing_filename(filename):
+    """Sidecar summary filename for a capture file: `<name>_timing.csv`."""
+    base = filename.rsplit(".", 1)[0] if filename.endswith((".csv", ".bin")) else filename
+    return f"{base}_timing.csv"
+
+
+def add_timing_arguments(parser):
+    """Add the timing instrumentation options to an argparse parser."""
+    group = parser.add_argument_group("timing")
+    group.add_argument("--timing", action="store_true",
+                       help="Record per-stage durations (connect, request, parse, enqueue, flush, lateness) "
+                            "and write p50/p99/max and the sample rate to <csv>_timing.csv.")
+    group.add_argument("--timing-interval", type=float, default=10.0,
+                       help="Seconds between timing summaries (default: 10).")
+    return group
+
+
+def timings_from_args(args, filename):
+    """Create the Timings for a capture file (a disabled one without --timing)."""
+    if not getattr(args, "timing", False):
+        return Timings(enabled=False)
+    return Timings(timing_filename(filename), interval=max(args.timing_interval, 0.1))
@@ -0,0 +1,26 @@
+import pytest
+
+from energylogger import scheduler as scheduling
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the test (or a sleep) advances it."""
+
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A FakeClock that also stands in for the scheduler's time.sleep."""
+    clock = FakeClock()
+    monkeypatch.setattr(scheduling.time, "sleep", clock.sleep)
+    return clock
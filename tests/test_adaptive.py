@@ -0,0 +1,54 @@
+import pytest
+
+from energylogger.scheduler import SKIP, AdaptiveRate, FixedRateScheduler
+
+
+def test_set_period_moves_the_pending_deadline(clock):
+    scheduler = FixedRateScheduler(10.0, clock=clock)
+    scheduler.wait()
+    scheduler.set_period(1.0)
+    scheduler.wait()
+    assert clock.now == 101.0
+
+
+def test_faster_period_after_an_overrun_misses_no_ticks(clock):
+    scheduler = FixedRateScheduler(10.0, SKIP, clock=clock)
+    scheduler.wait()
+    clock.now += 0.5  # the sample that shows the transient
+    scheduler.set_period(0.1)
+    assert scheduler.wait() == 0.0
+    assert clock.now == 100.5
+    scheduler.wait()
+    assert clock.now == pytest.approx(100.6)
+    assert scheduler.missed == 0
+
+
+def test_adaptive_rate_speeds_up_on_a_step_and_backs_off(clock):
+    scheduler = FixedRateScheduler(0.1, clock=clock)
+    adaptive = AdaptiveRate(scheduler, slow=1.6, threshold=5.0, hold=1.0, clock=clock)
+    assert scheduler.period == 1.6
+
+    periods = []
+    for second in range(40):
+        scheduler.wait()
+        adaptive.update(50.0 if clock.now < 110 else 80.0)
+        periods.append(scheduler.period)
+    assert adaptive.transients == 1
+    assert scheduler.missed == 0
+    assert 0.1 in periods
+    assert periods[-1] == 1.6
+    # Backing off doubles the period: 0.1, 0.2, 0.4, 0.8, 1.6
+    backing_off = [p for p in periods[periods.index(0.1):] if p != 0.1]
+    assert backing_off[:4] == [0.2, 0.4, 0.8, 1.6]
+
+
+def test_adaptive_rate_detects_a_small_sustained_shift(clock):
+    scheduler = FixedRateScheduler(0.1, clock=clock)
+    adaptive = AdaptiveRate(scheduler, slow=1.0, threshold=5.0, clock=clock)
+    for i in range(30):
+        adaptive.update(50.0 + (i % 2) * 0.5)
+    assert adaptive.transients == 0
+    for _ in range(10):
+        adaptive.update(53.0)  # below the jump threshold, caught by the CUSUM
+    assert adaptive.transients == 1
+    assert scheduler.period == 0.1
@@ -0,0 +1,133 @@
+import csv
+import math
+import random
+import statistics
+
+from energylogger.aggregate import POWER_COLUMN, AggregatingWriter, RingBuffer, RunningStats, WindowAggregator
+
+HEADER = ["Unix Timestamp (ms)", "Voltage (V)", POWER_COLUMN]
+
+
+def read_csv(filename):
+    with open(filename, newline="") as f:
+        return list(csv.reader(f))
+
+
+def trapezoid(samples):
+    """Energy in Wh of (timestamp_ms, watts) samples, one trapezoid over the whole capture."""
+    return sum((p0 + p1) / 2.0 * (t1 - t0) / 1000.0
+               for (t0, p0), (t1, p1) in zip(samples, samples[1:])) / 3600.0
+
+
+def test_running_stats_matches_statistics():
+    rng = random.Random(4)
+    values = [rng.uniform(-50, 400) for _ in range(1000)]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    mean, low, high, std = stats.summary()
+    assert stats.count == 1000
+    assert math.isclose(mean, statistics.fmean(values), rel_tol=1e-12)
+    assert (low, high) == (min(values), max(values))
+    assert math.isclose(std, statistics.stdev(values), rel_tol=1e-9)
+
+    stats.reset()
+    assert stats.summary() == ["", "", "", ""]
+    stats.add(5.0)
+    assert stats.summary() == [5.0, 5.0, 5.0, 0.0]
+
+
+def test_window_energies_add_up_to_the_total():
+    rng = random.Random(7)
+    samples = []
+    timestamp = 1_700_000_000_123
+    for _ in range(500):
+        # Irregular intervals, some of them spanning several windows
+        timestamp += rng.choice((37, 250, 999, 1000, 1001, 2600))
+        samples.append((timestamp, rng.uniform(0, 300)))
+
+    aggregator = WindowAggregator(["Voltage (V)", POWER_COLUMN], 1, power_index=1)
+    rows = []
+    for timestamp, power in samples:
+        rows.extend(aggregator.add(timestamp, [230.0, power]))
+    rows.extend(aggregator.finish())
+
+    starts = [row[0] for row in rows]
+    assert starts == sorted(set(starts))
+    assert all(start % 1000 == 0 for start in starts)
+    assert sum(row[1] for row in rows) == len(samples)
+    assert math.isclose(sum(row[-1] for row in rows), trapezoid(samples), rel_tol=1e-9)
+
+
+def test_interval_is_split_at_the_window_edge():
+    aggregator = WindowAggregator([POWER_COLUMN], 1, power_index=0)
+    assert aggregator.add(500, [100.0]) == []
+    rows = aggregator.add(1500, [200.0])
+    # Power at the edge is 150 W: 0.5 s at a mean of 125 W in the first window
+    assert rows == [[0, 1, 0, 100.0, 100.0, 100.0, 0.0, 125 * 0.5 / 3600]]
+    assert aggregator.finish() == [[1000, 1, 0, 200.0, 200.0, 200.0, 0.0, 175 * 0.5 / 3600]]
+
+
+def test_gap_windows_get_their_share_of_the_energy():
+    aggregator = WindowAggregator([POWER_COLUMN], 1, power_index=0)
+    aggregator.add(0, [100.0])
+    rows = aggregator.add(3000, [100.0])
+    assert [row[:3] for row in rows] == [[0, 1, 0], [1000, 0, 0], [2000, 0, 0]]
+    # A window without samples has no statistics, only its energy
+    assert rows[1][3:7] == ["", "", "", ""]
+    assert [row[-1] for row in rows] == [100 / 3600] * 3
+
+
+def test_failed_sample_at_the_edge_holds_the_last_power():
+    aggregator = WindowAggregator([POWER_COLUMN], 1, power_index=0)
+    aggregator.add(500, [100.0])
+    rows = aggregator.add(1500, [None])
+    # The energy up to the edge stays in the first window
+    assert rows == [[0, 1, 0, 100.0, 100.0, 100.0, 0.0, 100 * 0.5 / 3600]]
+    rows = aggregator.add(2500, [300.0])
+    assert rows[0][:3] == [1000, 1, 1]
+    # From the edge on the power is interpolated from the last known 100 W
+    edge_power = 100 + 200 * 1000 / 1500
+    assert math.isclose(rows[0][-1], (100 + edge_power) / 2 / 3600)
+
+
+def test_nan_sample_counts_as_a_timeout(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    nan = float("nan")
+    rows = [[1000, 230.0, 100.0], [1200, nan, nan], [1400, 230.0, 100.0], [1600, 230.0, 100.0]]
+    with AggregatingWriter(None, filename, HEADER, windows=(1,), ring_buffer=4) as writer:
+        writer.writerows(rows)
+        assert writer.ring.events == 1
+
+    summary = read_csv(str(tmp_path / "capture_1s.csv"))
+    assert summary[0][:3] == ["Window Start (ms)", "Samples", "Timeouts"]
+    assert summary[1][:3] == ["1000", "4", "1"]
+    assert float(summary[1][3]) == 230.0
+    energy = float(summary[1][-1])
+    assert math.isfinite(energy)
+    assert math.isclose(energy, 100 * 0.6 / 3600)
+
+
+def test_power_step_dumps_the_ring_buffer(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    with AggregatingWriter(None, filename, HEADER, ring_buffer=6, event_threshold=50) as writer:
+        for i in range(10):
+            writer.writerow([1000 + i, 230, 10.0 if i < 5 else 100.0])
+        assert writer.ring.events == 1
+
+    # The step at 1005 with the two rows before it and the three after it
+    event = read_csv(str(tmp_path / "capture_event_1005.csv"))
+    assert event[0] == HEADER
+    assert [row[0] for row in event[1:]] == [str(t) for t in range(1003, 1009)]
+
+
+def test_ring_buffer_writes_pending_event_on_close(tmp_path):
+    ring = RingBuffer(10, str(tmp_path / "capture"), HEADER)
+    for i in range(3):
+        ring.add([i, 230, 10.0])
+    ring.trigger(2, "sample failed")
+    ring.trigger(2, "sample failed")
+    ring.add([3, 230, 10.0])
+    ring.close()
+    assert ring.events == 1
+    assert len(read_csv(str(tmp_path / "capture_event_2.csv"))) == 5
@@ -0,0 +1,156 @@
+import math
+import os
+
+import pytest
+
+from energylogger import analysis
+from energylogger.analysis import (CACHE_VERSION, ResultCache, confidence_interval, summarize_file, summarize_files,
+                                   summarize_run, summarize_services)
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+MEASUREMENTS = os.path.join(os.path.dirname(__file__), os.pardir, "EnergyLogging", "Measurements")
+HEADER = ("Unix Timestamp (ms),UTC Human-Readable,Voltage (V),Current (A),Active Power (W),"
+          "Computed Active Power (W) - Precise,Frequency (Hz),Apparent Power (VA),Computed Apparent Power (VA),"
+          "Power Factor (PF),Total Energy (Wh),Resettable Energy (Wh),Elapsed Time (µs)\n")
+# numpy 2 renamed trapz to trapezoid
+trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def write_capture(path, rows):
+    """An "energy" schema capture of (unix ms, power W or "TIMEOUT", counter Wh) rows."""
+    lines = [HEADER]
+    for ms, power, counter in rows:
+        if power == "TIMEOUT":
+            lines.append(f"{ms},," + ",".join(["TIMEOUT"] * 10) + ",0\n")
+        else:
+            lines.append(f"{ms},,230.0,0.1,{power},{power},50.0,{power},{power},1.0,{counter},{counter},1000\n")
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def test_energy_matches_numpy_trapezoid_on_a_capture():
+    filename = os.path.join(MEASUREMENTS, "download_100MB_1.csv")
+    frame = pd.read_csv(filename)
+    seconds = (frame["Unix Timestamp (ms)"] - frame["Unix Timestamp (ms)"].iloc[0]) / 1000.0
+    expected = trapezoid(frame["Active Power (W)"], seconds) / 3600.0
+    summary = summarize_file(filename)
+    assert summary["Schema"] == "energy"
+    assert summary["Samples"] == len(frame) and summary["Timeouts"] == 0
+    assert summary["Energy (Wh)"] == pytest.approx(expected, rel=1e-12)
+    assert summary["Duration (s)"] == pytest.approx(seconds.iloc[-1])
+    assert summary["Mean Power (W)"] == pytest.approx(expected * 3600.0 / seconds.iloc[-1])
+    assert summary["Max Power (W)"] == frame["Active Power (W)"].max()
+
+
+def test_real_timestamp_deltas_and_timeouts(tmp_path):
+    # 100 W for 2 s, a timeout, then 300 W: the trapezoid spans the gap at the real spacing
+    filename = write_capture(tmp_path / "run.csv", [
+        (1_000_000, 100, 10.0), (1_001_000, 100, 10.0), (1_002_000, "TIMEOUT", 0),
+        (1_005_000, 300, 10.5), (1_006_000, 300, 10.5),
+    ])
+    summary = summarize_file(filename)
+    assert (summary["Samples"], summary["Timeouts"]) == (4, 1)
+    assert summary["Duration (s)"] == 6.0
+    assert summary["Mean Interval (ms)"] == 2000.0
+    assert summary["Energy (Wh)"] == pytest.approx((100 + 200 * 4 + 300) / 3600)
+
+
+def test_counter_cross_check(tmp_path):
+    # 360 W for 20 s is 2 Wh; the counter moves by 2 Wh in whole steps
+    rows = [(1_740_000_000_000 + 500 * i, 360, 5000.0 + (i * 500 // 10_000)) for i in range(41)]
+    summary = summarize_file(write_capture(tmp_path / "run.csv", rows))
+    assert summary["Energy (Wh)"] == pytest.approx(2.0)
+    assert summary["Counter Energy (Wh)"] == 2.0
+    assert summary["Counter Difference (Wh)"] == pytest.approx(0.0, abs=1e-12)
+
+
+def test_unsorted_timestamps_and_missing_counter():
+    timestamps = np.array([3000, 1000, 2000], dtype=np.int64)
+    power = np.array([30.0, 10.0, 20.0])
+    counter = np.array([np.nan, 1.0, np.nan])
+    summary = summarize_run(timestamps, power, counter)
+    assert summary["Energy (Wh)"] == pytest.approx((15 + 25) / 3600)
+    assert "Counter Energy (Wh)" not in summary
+    assert summarize_run(timestamps[:1], power[:1]) == {"Samples": 1, "Timeouts": 0}
+
+
+def test_confidence_interval_uses_student_t():
+    mean, half_width = confidence_interval([1.0, 3.0])
+    assert mean == 2.0 and half_width == pytest.approx(12.706)
+    # n = 5: t(0.975, 4) = 2.776, sample standard deviation 1.5811
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert confidence_interval(values) == pytest.approx((3.0, 2.776 * math.sqrt(2.5) / math.sqrt(5)))
+    # Beyond the table (31 degrees of freedom and more) the normal quantile
+    values = [float(i % 2) for i in range(40)]
+    sd = math.sqrt(sum((v - 0.5) ** 2 for v in values) / 39)
+    assert confidence_interval(values)[1] == pytest.approx(1.96 * sd / math.sqrt(40))
+    mean, half_width = confidence_interval([4.0])
+    assert mean == 4.0 and math.isnan(half_width)
+
+
+def test_cache_is_invalidated_by_size_and_mtime(tmp_path):
+    filename = write_capture(tmp_path / "run.csv", [(1000, 100, 1.0), (2000, 100, 1.0)])
+    cache = ResultCache(str(tmp_path / "cache.json"))
+    assert cache.get(filename) == (False, None)
+    cache.put(filename, summarize_file(filename))
+    cache.save()
+
+    cache = ResultCache(str(tmp_path / "cache.json"))
+    found, summary = cache.get(filename)
+    assert found and summary["Energy (Wh)"] == pytest.approx(100 / 3600) and cache.hits == 1
+
+    # Same size, new mtime
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.get(filename) == (False, None)
+    cache.put(filename, summarize_file(filename))
+    assert cache.get(filename)[0]
+
+    # Same mtime, new size
+    stat = os.stat(filename)
+    write_capture(tmp_path / "run.csv", [(1000, 100, 1.0), (2000, 100, 1.0), (3000, 100, 1.0)])
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(filename) == (False, None)
+
+
+def test_summarize_files_reads_only_changed_files(tmp_path, monkeypatch):
+    first = write_capture(tmp_path / "a_1.csv", [(1000, 100, 1.0), (2000, 100, 1.0)])
+    second = write_capture(tmp_path / "a_2.csv", [(1000, 200, 1.0), (2000, 200, 1.0)])
+    no_power = tmp_path / "temperature_data.csv"
+    no_power.write_text("Timestamp,CPU (°C)\n1000,40.0\n", encoding="utf-8")
+    cache = ResultCache(str(tmp_path / "cache.json"))
+    results = summarize_files([first, second, str(no_power)], jobs=2, cache=cache)
+    assert results[str(no_power)] is None
+    assert results[second]["Energy (Wh)"] == pytest.approx(200 / 3600)
+    cache.save()
+
+    read = []
+    monkeypatch.setattr(analysis, "summarize_file", lambda filename: read.append(filename) or {"File": filename})
+    write_capture(tmp_path / "a_2.csv", [(1000, 200, 1.0), (3000, 200, 1.0)])
+    cache = ResultCache(str(tmp_path / "cache.json"))
+    results = summarize_files([first, second, str(no_power)], jobs=1, cache=cache)
+    assert read == [second]
+    assert cache.hits == 2 and results[str(no_power)] is None
+
+
+def test_unusable_caches_are_ignored(tmp_path, capsys):
+    stale = tmp_path / "stale.json"
+    stale.write_text(f'{{"version": {CACHE_VERSION + 1}, "files": {{"x": 1}}}}', encoding="utf-8")
+    assert ResultCache(str(stale)).entries == {}
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+    assert ResultCache(str(broken)).entries == {}
+    assert "Ignoring unreadable cache" in capsys.readouterr().err
+
+
+def test_services_are_compared_per_resolution():
+    runs = [{"Service": "youtube", "Resolution": "1080p", "Energy (Wh)": 2.0, "Mean Power (W)": 4.0, "Duration (s)": 60},
+            {"Service": "youtube", "Resolution": "360p", "Energy (Wh)": 1.0, "Mean Power (W)": 3.0, "Duration (s)": 60},
+            {"Service": "youtube", "Resolution": "360p", "Energy (Wh)": 3.0, "Mean Power (W)": 5.0, "Duration (s)": 60},
+            {"Service": "twitch", "Resolution": "", "Samples": 1}]
+    table = summarize_services(runs)
+    assert [(row["Service"], row["Resolution"], row["Runs"]) for row in table] == [
+        ("youtube", "360p", 2), ("youtube", "1080p", 1)]
+    assert table[0]["Mean Power (W)"] == 4.0 and table[0]["Energy CI95 (Wh)"] == pytest.approx(12.706)
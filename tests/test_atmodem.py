@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from bench.simulators import FakeModem
+from energylogger.atmodem import ATError, ATModem
+
+
+@pytest.fixture
+def fake_modem():
+    modem = FakeModem(delay=0.0)
+    modem.start()
+    yield modem
+    modem.close()
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+def test_qtemp_response_without_echo_and_ok(fake_modem):
+    async def main():
+        modem = ATModem(fake_modem.address)
+        try:
+            return await modem.command("AT+QTEMP"), modem.commands
+        finally:
+            modem.close()
+
+    lines, commands = run(main())
+    assert [line.split(",")[0] for line in lines] == [f'+QTEMP:"{name}"' for name in FakeModem.SENSORS]
+    assert commands == 1
+
+
+def test_error_raises(fake_modem):
+    async def main():
+        modem = ATModem(fake_modem.address)
+        try:
+            with pytest.raises(ATError, match="ERROR"):
+                await modem.command("AT+NOPE")
+            return await modem.command("AT+QTEMP")  # the channel is still usable
+        finally:
+            modem.close()
+
+    assert len(run(main())) == len(FakeModem.SENSORS)
+
+
+def test_pipelined_commands_get_their_own_answers(fake_modem):
+    async def main():
+        modem = ATModem(fake_modem.address, depth=3)
+        try:
+            return await asyncio.gather(modem.command("AT+QTEMP"), modem.command("AT+X"), modem.command("AT+QTEMP"),
+                                        return_exceptions=True)
+        finally:
+            modem.close()
+
+    first, second, third = run(main())
+    assert len(first) == len(third) == len(FakeModem.SENSORS)
+    assert isinstance(second, ATError)
+
+
+def test_late_answer_is_not_taken_for_the_next_one(fake_modem):
+    fake_modem.delay = 0.3
+
+    async def main():
+        modem = ATModem(fake_modem.address)
+        try:
+            with pytest.raises(ATError, match="no response"):
+                await modem.command("AT+QTEMP", timeout=0.05)
+            fake_modem.delay = 0.0
+            # The late QTEMP answer arrives first and is discarded; this command's ERROR is its own
+            with pytest.raises(ATError, match="^ERROR"):
+                await modem.command("AT+NOPE", timeout=2.0)
+            return await modem.command("AT+QTEMP", timeout=2.0)
+        finally:
+            modem.close()
+
+    assert len(run(main())) == len(FakeModem.SENSORS)
+
+
+def test_closed_device_fails_pending_commands(fake_modem):
+    fake_modem.delay = 0.5
+
+    async def main():
+        modem = ATModem(fake_modem.address)
+        pending = asyncio.ensure_future(modem.command("AT+QTEMP", timeout=5.0))
+        await asyncio.sleep(0.05)
+        modem.close()
+        with pytest.raises(ATError, match="closed"):
+            await pending
+        with pytest.raises(ATError, match="closed"):
+            await modem.command("AT+QTEMP")
+
+    run(main())
@@ -0,0 +1,32 @@
+import math
+
+from energylogger.binlog import BinaryLog, BinaryWriter
+
+HEADER = ["Unix Timestamp (ms)", "UTC Human-Readable", "Voltage (V)", "Active Power (W)"]
+
+
+def test_round_trip_with_timeouts(tmp_path):
+    filename = str(tmp_path / "capture.bin")
+    with BinaryWriter(filename, HEADER, skip=("UTC Human-Readable",)) as writer:
+        writer.writerow([1000, "x", 230, 54.5])
+        writer.writerow([2000, "x", 231, "TIMEOUT"])
+    log = BinaryLog(filename)
+    assert log.columns == ["Voltage (V)", "Active Power (W)"]
+    rows = list(log.iter_rows())
+    assert rows[0] == (1000, 230.0, 54.5)
+    assert rows[1][:2] == (2000, 231.0) and math.isnan(rows[1][2])
+    assert list(log.iter_range(1500, 3000))[0][0] == 2000
+
+
+def test_bad_row_does_not_drop_its_batch(tmp_path, capsys):
+    filename = str(tmp_path / "capture.bin")
+    writer = BinaryWriter(filename, HEADER, timestamp_format="%Y-%m-%d %H:%M:%S", flush_rows=1000)
+    writer.writerow(["2025-03-01 12:00:00", "x", 230, 50.0])
+    writer.writerow(["not a time", "x", 230, 51.0])
+    writer.writerow(["2025-03-01 12:00:01", "x", 230])  # missing a column
+    writer.writerow(["2025-03-01 12:00:02", "x", 230, 52.0])
+    writer.close()
+    assert writer.rows_written == 2
+    assert writer.rows_skipped == 2
+    assert [row[-1] for row in BinaryLog(filename).iter_rows()] == [50.0, 52.0]
+    assert "Skipped 2 rows" in capsys.readouterr().out
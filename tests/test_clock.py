@@ -0,0 +1,111 @@
+import random
+
+from energylogger.clock import MIDPOINT_COLUMNS, OFFSET_COLUMNS, OffsetEstimator, PreciseTimestamps, TimeBase
+
+SECOND = 1_000_000_000
+MS = 1_000_000
+HOST_START = 1_741_600_000 * SECOND  # Unix ns
+
+
+def fixed_time_base(wall_ns=HOST_START, mono_ns=5 * SECOND):
+    base = TimeBase()
+    base.anchor_wall_ns = wall_ns
+    base.anchor_mono_ns = mono_ns
+    return base
+
+
+class Device:
+    """Device clock `offset_ns` ahead of the host, drifting by `ppm`, read in whole seconds."""
+
+    def __init__(self, offset_ns, ppm=0.0):
+        self.offset_ns = offset_ns
+        self.ppm = ppm
+
+    def offset_at(self, host_ns):
+        return self.offset_ns + int((host_ns - HOST_START) * self.ppm / 1e6)
+
+    def read(self, host_ns):
+        return (host_ns + self.offset_at(host_ns)) // SECOND * SECOND
+
+
+def poll(estimator, device, count, rng, start=HOST_START, period=SECOND + 37 * MS, check=True):
+    """Requests every `period` with random round trips; returns the host time after the last one.
+
+    With `check` every estimate must contain the true offset (not so under drift,
+    where the window's intersection lags the moving offset).
+    """
+    now = start
+    for _ in range(count):
+        round_trip = rng.randint(2 * MS, 40 * MS)
+        reading = now + rng.randint(0, round_trip)  # the device answers somewhere in between
+        estimate = estimator.add(now, now + round_trip, device.read(reading))
+        if check:
+            offset, uncertainty = estimate
+            assert offset - uncertainty - 1 <= device.offset_at(reading) <= offset + uncertainty + 1
+        now += period
+    return now
+
+
+def test_time_base_maps_monotonic_to_wall_time():
+    base = fixed_time_base()
+    assert base.to_wall_ns(5 * SECOND) == HOST_START
+    assert base.to_wall_ns(7 * SECOND + 250) == HOST_START + 2 * SECOND + 250
+    assert base.midpoint(6 * SECOND, 6 * SECOND + 10 * MS) == (HOST_START + SECOND + 5 * MS, 5 * MS)
+
+
+def test_one_request_bounds_the_offset_to_the_clock_resolution():
+    estimator = OffsetEstimator()
+    # Sent at 0.2 s, answered at 0.22 s, the device showed 10 s: offset in [9.78 s, 10.8 s]
+    offset, uncertainty = estimator.add(200 * MS, 220 * MS, 10 * SECOND)
+    assert (offset - uncertainty, offset + uncertainty) == (9780 * MS, 10800 * MS)
+
+
+def test_offset_converges_within_the_bounds():
+    estimator = OffsetEstimator()
+    device = Device(offset_ns=-1234 * MS - 567_000)
+    poll(estimator, device, 120, random.Random(1))
+    assert estimator.uncertainty_ns < 25 * MS
+    assert abs(estimator.offset_ns - device.offset_ns) <= estimator.uncertainty_ns
+    assert estimator.discarded == 0
+
+
+def test_drift_is_estimated():
+    estimator = OffsetEstimator(min_span_ns=60 * SECOND)
+    device = Device(offset_ns=300 * MS, ppm=200.0)
+    rng = random.Random(2)
+    now = poll(estimator, device, 50, rng, check=False)
+    assert estimator.drift_ppm is None  # not before min_span_ns
+    poll(estimator, device, 600, rng, start=now, check=False)
+    assert abs(estimator.drift_ppm - 200) < 50
+
+
+def test_clock_step_discards_old_requests():
+    estimator = OffsetEstimator()
+    rng = random.Random(3)
+    now = poll(estimator, Device(offset_ns=100 * MS), 60, rng)
+    stepped = Device(offset_ns=2100 * MS)
+    poll(estimator, stepped, 60, rng, start=now)
+    assert estimator.discarded > 0
+    assert abs(estimator.offset_ns - stepped.offset_ns) <= estimator.uncertainty_ns
+
+
+def test_precise_columns_without_device_clock():
+    precise = PreciseTimestamps(time_base=fixed_time_base())
+    assert precise.columns == MIDPOINT_COLUMNS
+    values = precise.stamp(6 * SECOND, 6 * SECOND + 3_500_000)
+    assert values == [(HOST_START + SECOND + 1_750_000) / MS, 1.75]
+    assert precise.failed() == ["", ""]
+    assert precise.report() == []
+
+
+def test_precise_columns_with_device_clock():
+    precise = PreciseTimestamps(device_clock=True, time_base=fixed_time_base())
+    assert precise.columns == MIDPOINT_COLUMNS + OFFSET_COLUMNS
+    # Device 10 s ahead: at host second 1 (+0.2 s) it shows 11 s
+    device_ns = HOST_START + 11 * SECOND
+    midpoint, uncertainty, offset, spread = precise.stamp(6 * SECOND + 200 * MS, 6 * SECOND + 220 * MS, device_ns)
+    assert (midpoint, uncertainty) == ((HOST_START + SECOND + 210 * MS) / MS, 10.0)
+    assert (offset - spread, offset + spread) == (9780.0, 10800.0)
+    assert precise.stamp(7 * SECOND, 7 * SECOND + MS)[2:] == ["", ""]  # no device clock in this answer
+    assert precise.failed() == ["", "", "", ""]
+    assert precise.report()[0].startswith("device clock: offset +")
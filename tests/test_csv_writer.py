@@ -0,0 +1,148 @@
+import os
+import subprocess
+import sys
+import time
+
+import energylogger.csv_writer
+from energylogger.csv_writer import BufferedCSVWriter, DynamicCSVWriter
+
+HEADER = ["Unix Timestamp (ms)", "Voltage (V)", "Active Power (W)"]
+
+
+def lines(filename):
+    with open(filename) as f:
+        return f.read().splitlines()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_flushes_after_flush_rows(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    with BufferedCSVWriter(filename, HEADER, flush_rows=10, flush_interval=None) as writer:
+        writer.writerows([[i, 230, 50.5] for i in range(9)])
+        time.sleep(0.1)
+        assert writer.rows_written == 0
+        assert lines(filename) == [",".join(HEADER)]
+        writer.writerow([9, 230, 50.5])
+        wait_for(lambda: writer.rows_written == 10)
+        assert writer.pending == 0
+        assert writer.flush_count == 1
+    assert len(lines(filename)) == 11
+
+
+def test_flushes_after_flush_interval(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    with BufferedCSVWriter(filename, HEADER, flush_rows=1000, flush_interval=0.05) as writer:
+        writer.writerow([0, 230, 50.5])
+        wait_for(lambda: writer.rows_written == 1)
+        assert lines(filename)[-1] == "0,230,50.5"
+
+
+def test_appends_without_repeating_the_header(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    for start in (0, 5):
+        with BufferedCSVWriter(filename, HEADER) as writer:
+            writer.writerows([[i, 230, 50.5] for i in range(start, start + 5)])
+    assert lines(filename)[0] == ",".join(HEADER)
+    assert [line.split(",")[0] for line in lines(filename)[1:]] == [str(i) for i in range(10)]
+
+
+def test_fsync_interval(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(energylogger.csv_writer.os, "fsync", synced.append)
+
+    def flushes(fsync_interval):
+        synced.clear()
+        writer = BufferedCSVWriter(str(tmp_path / f"capture_{fsync_interval}.csv"), HEADER,
+                                   flush_interval=None, fsync_interval=fsync_interval)
+        for i in range(3):
+            writer.writerow([i, 230, 50.5])
+            writer.flush()
+        during = len(synced)
+        writer.close()
+        return during, len(synced) - during
+
+    # Close always syncs once; flushes sync every time, at most once per interval, or never
+    assert flushes(0) == (3, 1)
+    assert flushes(3600) == (0, 1)
+    assert flushes(None) == (0, 1)
+
+
+def test_rows_are_written_at_exit(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    script = ("import sys\n"
+              "from energylogger.csv_writer import BufferedCSVWriter\n"
+              "writer = BufferedCSVWriter(sys.argv[1], ['a', 'b'], flush_rows=1000, flush_interval=None)\n"
+              "writer.writerows([[i, i * 2] for i in range(50)])\n")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", script, filename], check=True, cwd=root)
+    assert len(lines(filename)) == 51
+    assert lines(filename)[-1] == "49,98"
+
+
+def test_writer_survives_a_failing_batch(tmp_path, capsys):
+    filename = str(tmp_path / "capture.csv")
+    writer = BufferedCSVWriter(filename, HEADER, flush_rows=1, flush_interval=None)
+    write_rows = writer._write_rows
+
+    def failing(rows):
+        if any(row[0] == "bad" for row in rows):
+            raise TypeError("cannot format row")
+        write_rows(rows)
+
+    writer._write_rows = failing
+    writer.writerow(["bad", 230, 50.5])
+    wait_for(lambda: writer.errors == 1)
+    assert "Error writing 1 rows" in capsys.readouterr().out
+    # The thread is still flushing
+    writer.writerow([1, 230, 50.5])
+    wait_for(lambda: writer.rows_written == 1)
+    assert writer._thread.is_alive()
+    writer.close()
+    assert lines(filename)[1:] == ["1,230,50.5"]
+
+
+def test_new_column_migrates_existing_file(tmp_path):
+    filename = str(tmp_path / "temperatures.csv")
+    with DynamicCSVWriter(filename) as writer:
+        writer.writerecord("t1", {"cpu": 40})
+        writer.writerecord("t2", {"cpu": 41})
+    with DynamicCSVWriter(filename) as writer:
+        assert writer.columns == ["cpu"]
+        writer.writerecord("t3", {"cpu": 42, "modem": 50})
+        writer.writerecord("t4", {"modem": 51})
+    assert writer.migrations == 1
+    assert lines(filename) == ["Timestamp,cpu,modem", "t1,40,", "t2,41,", "t3,42,50", "t4,,51"]
+
+
+def test_failed_migration_keeps_wide_rows_queued(tmp_path, monkeypatch, capsys):
+    filename = str(tmp_path / "temperatures.csv")
+    writer = DynamicCSVWriter(filename, flush_interval=None)
+    writer.writerecord("t1", {"cpu": 40})
+    writer.flush()
+
+    def disk_full(source, target):
+        raise OSError("disk full")
+
+    replace = os.replace
+    monkeypatch.setattr(energylogger.csv_writer.os, "replace", disk_full)
+    writer.writerecord("t2", {"cpu": 41})
+    writer.writerecord("t3", {"cpu": 42, "modem": 50})
+    writer.flush()
+    assert "disk full" in capsys.readouterr().out
+    # The row that fits the old header is written, the wider one waits
+    assert lines(filename) == ["Timestamp,cpu", "t1,40", "t2,41"]
+    assert writer.pending == 1
+    assert writer.rows_written == 2
+
+    monkeypatch.setattr(energylogger.csv_writer.os, "replace", replace)
+    writer.writerecord("t4", {"modem": 51})
+    writer.close()
+    assert writer.migrations == 1
+    assert writer.rows_written == 4
+    assert lines(filename) == ["Timestamp,cpu,modem", "t1,40,", "t2,41,", "t3,42,50", "t4,,51"]
@@ -0,0 +1,180 @@
+import asyncio
+import csv
+import time
+
+import pytest
+
+from energylogger.engine import ELAPSED_COLUMN, TIMESTAMP_COLUMN, Engine
+from energylogger.gude import METRICS
+from energylogger.httpclient import AsyncHTTPPool, HTTPError
+
+VALUES = [230, 0.431, 50.01, 51.68, 61.4, 78.0, 99.13, 0.615, 32.965, 14]
+HOUR_NS = 3600 * 10**9
+BODY = ('{"sensor_values":[{"type":1,"num":1,"values":[['
+        + ",".join(f'{{"v":{v}}}' for v in VALUES) + ']]}]}').encode()
+
+
+class MeterServer:
+    """asyncio HTTP/1.1 server answering every GET with BODY on kept-alive connections.
+
+    `mode` changes the answers: "chunked" sends chunked bodies, "close" drops
+    each connection after its first answer, "stall" never answers and
+    "missing" answers 404.
+    """
+
+    def __init__(self, mode="keep-alive"):
+        self.mode = mode
+        self.connections = 0
+        self.requests = []
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        answered = 0
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                self.requests.append(request.split(b" ")[1].decode())
+                if self.mode == "stall":
+                    await asyncio.sleep(10)
+                if self.mode == "close" and answered:
+                    break
+                if self.mode == "missing":
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                elif self.mode == "chunked":
+                    writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+                    for start in range(0, len(BODY), 50):
+                        chunk = BODY[start:start + 50]
+                        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    writer.write(b"0\r\n\r\n")
+                else:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(BODY), BODY))
+                await writer.drain()
+                answered += 1
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(mode, test):
+    server = MeterServer(mode)
+    address = await server.start()
+    try:
+        return await test(server, *address)
+    finally:
+        await server.close()
+
+
+@pytest.mark.parametrize("mode", ["keep-alive", "chunked"])
+def test_pool_reuses_the_connection(mode):
+    async def test(server, host, port):
+        pool = AsyncHTTPPool()
+        bodies = [await pool.get(host, port, f"/statusjsn.js?n={i}") for i in range(5)]
+        await pool.close()
+        assert bodies == [BODY] * 5
+        assert server.connections == 1
+        assert server.requests == [f"/statusjsn.js?n={i}" for i in range(5)]
+
+    asyncio.run(serve(mode, test))
+
+
+def test_pool_retries_a_closed_connection():
+    async def test(server, host, port):
+        pool = AsyncHTTPPool()
+        assert await pool.get(host, port, "/") == BODY
+        assert await pool.get(host, port, "/") == BODY
+        await pool.close()
+        assert server.connections == 2
+
+    asyncio.run(serve("close", test))
+
+
+def test_pool_does_not_retry_a_timeout():
+    async def test(server, host, port):
+        pool = AsyncHTTPPool(timeout=0.2)
+        start = time.monotonic()
+        with pytest.raises(HTTPError, match="timeout"):
+            await pool.get(host, port, "/")
+        assert time.monotonic() - start < 0.35
+        await pool.close()
+        assert server.connections == 1
+
+    asyncio.run(serve("stall", test))
+
+
+def test_pool_reports_http_status():
+    async def test(server, host, port):
+        pool = AsyncHTTPPool()
+        with pytest.raises(HTTPError, match="HTTP 404"):
+            await pool.get(host, port, "/statusjsn.js")
+        await pool.close()
+
+    asyncio.run(serve("missing", test))
+
+
+def read_csv(filename):
+    with open(filename, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_engine_polls_each_device_into_its_own_csv(tmp_path, capsys):
+    async def run():
+        meter, stalled = MeterServer(), MeterServer("stall")
+        (host, port), (stalled_host, stalled_port) = await meter.start(), await stalled.start()
+        config = {
+            "output_dir": str(tmp_path),
+            "http": {"timeout": 0.15},
+            "devices": [
+                {"name": "a", "type": "gude-http", "host": host, "port": port, "rate": 0.1, "json": "json"},
+                {"name": "b", "type": "gude-http", "host": host, "port": port, "rate": 0.1, "json": "json",
+                 "csv": str(tmp_path / "second.csv")},
+                {"name": "down", "type": "gude-http", "host": stalled_host, "port": stalled_port, "rate": 0.1},
+            ],
+        }
+        engine = Engine(config)
+        # Move the shared time axis an hour back: every device must be stamped from it
+        engine.time_base.anchor_wall_ns -= HOUR_NS
+        start = time.time()
+        try:
+            await engine.run(duration=0.55)
+        finally:
+            await meter.close()
+            await stalled.close()
+        return engine, meter, start, time.time()
+
+    engine, meter, start, end = asyncio.run(run())
+    header = [TIMESTAMP_COLUMN, *METRICS, ELAPSED_COLUMN]
+    for filename in (tmp_path / "a.csv", tmp_path / "second.csv"):
+        rows = read_csv(filename)
+        assert rows[0] == header
+        assert 4 <= len(rows) - 1 <= 7
+        for row in rows[1:]:
+            assert [float(value) for value in row[1:-1]] == VALUES
+            assert start * 1000 - 5 <= int(row[0]) + HOUR_NS // 1_000_000 <= end * 1000 + 5
+
+    # Both devices on one host share the kept-alive connection
+    assert meter.connections == 1
+
+    # The device that times out gets TIMEOUT rows and does not hold up the others
+    rows = read_csv(tmp_path / "down.csv")
+    assert rows[1:] and all(row[1:-1] == ["TIMEOUT"] * len(METRICS) for row in rows[1:])
+    assert all(int(row[-1]) >= 150_000 for row in rows[1:])
+    assert "down: Error fetching data: timeout" in capsys.readouterr().out
+    assert all(start * 1000 - 5 <= int(row[0]) + HOUR_NS // 1_000_000 <= end * 1000 + 5 for row in rows[1:])
+
+
+def test_engine_rejects_bad_configs(tmp_path):
+    device = {"name": "a", "type": "gude-http", "host": "127.0.0.1"}
+    with pytest.raises(ValueError, match="duplicate"):
+        Engine({"output_dir": str(tmp_path), "devices": [device, device]})
+    with pytest.raises(ValueError, match="unknown type"):
+        Engine({"output_dir": str(tmp_path), "devices": [dict(device, type="snmp")]})
@@ -0,0 +1,194 @@
+import json
+import socket
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from bench.simulators import StatusServer
+from energylogger.gude import (ALL_COMPONENTS, COMPONENT_SENSOR_VALUES, GudeClient, GudeError, component_mask,
+                               find_clock_mask, status_decoder)
+
+CLOCK = {"year": 2025, "month": 3, "day": 7, "hour": 9, "minute": 5, "second": 3}
+VALUES = [230, 0.431, 50.01, 51.68, 61.4, 78.0, 99.13, 0.615, 32.965, 14]
+# Canned answer of a sensor values query, as the 1105 sends it
+SENSOR_VALUES = (b'{"sensor_values":[{"type":1,"num":1,"values":[[{"v":230},{"v":0.431},{"v":50.01},'
+                 b'{"v":51.68},{"v":61.4},{"v":78.0},{"v":99.13},{"v":0.615},{"v":32.965},{"v":14}]]}]}')
+CLOCK_BIT = 0x200
+
+
+def document(components):
+    data = json.loads(SENSOR_VALUES)
+    if components & CLOCK_BIT:
+        data["clock"] = {"systemtime": CLOCK}
+    if components & 0x1:
+        data["outputs"] = [{"name": "Power Port", "state": 1}]
+    return data
+
+
+class MaskServer(StatusServer):
+    """StatusServer whose answer depends on the components mask, with the clock under CLOCK_BIT."""
+
+    def __init__(self):
+        super().__init__()
+        self.masks = []
+
+    def payload(self, path="/statusjsn.js"):
+        components = int(parse_qs(urlsplit(path).query)["components"][0])
+        self.masks.append(components)
+        return json.dumps(document(components)).encode()
+
+
+def backends():
+    names = []
+    for name in ("json", "orjson", "msgspec"):
+        try:
+            status_decoder(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.fixture
+def server():
+    server = StatusServer(payloads=[SENSOR_VALUES])
+    server.start()
+    yield server
+    server.close()
+
+
+def test_component_mask():
+    assert component_mask() == COMPONENT_SENSOR_VALUES
+    assert component_mask(()) == 0
+    assert component_mask(clock=True) == ALL_COMPONENTS
+    with pytest.raises(KeyError):
+        component_mask(["Voltage (V)", "Temperature"])
+
+
+@pytest.mark.parametrize("backend", backends())
+def test_decode_canned_response(backend):
+    _, decode = status_decoder(backend)
+    assert decode(SENSOR_VALUES) == (VALUES, None)
+    _, decode = status_decoder(backend, clock=True)
+    values, systemtime = decode(json.dumps(document(CLOCK_BIT)).encode())
+    assert values == VALUES
+    assert dict(systemtime) == CLOCK
+    with pytest.raises((KeyError, ValueError)):
+        decode(SENSOR_VALUES)
+    with pytest.raises(ValueError):
+        decode(b'{"sensor_values": [')
+
+
+@pytest.mark.parametrize("backend", backends())
+def test_fetch_values_over_kept_alive_connection(server, backend):
+    client = GudeClient(*server.address, json_backend=backend)
+    assert client.path == f"/statusjsn.js?components={COMPONENT_SENSOR_VALUES}"
+    for _ in range(3):
+        assert client.fetch_values() == (VALUES, None)
+    assert client.connections == 1
+    assert client.sent_ns <= client.answered_ns
+    client.close()
+
+
+def test_find_clock_mask():
+    masks = []
+
+    def fetch(components):
+        masks.append(components)
+        return document(components)
+
+    assert find_clock_mask(fetch) == COMPONENT_SENSOR_VALUES | CLOCK_BIT
+    assert len(masks) == 6
+    assert find_clock_mask(lambda components: document(0)) is None
+
+
+def test_clock_query_is_trimmed_on_the_device():
+    server = MaskServer()
+    server.start()
+    try:
+        client = GudeClient(*server.address, clock=True, json_backend="json")
+        values, systemtime = client.fetch_values()
+        assert (values, systemtime) == (VALUES, CLOCK)
+        assert client.path == f"/statusjsn.js?components={COMPONENT_SENSOR_VALUES | CLOCK_BIT}"
+        client.fetch_values()
+        assert server.masks[-2:] == [COMPONENT_SENSOR_VALUES | CLOCK_BIT] * 2
+        assert len(server.masks) == 8
+        client.close()
+
+        # An explicit --components is used as given
+        client = GudeClient(*server.address, components=ALL_COMPONENTS, clock=True, json_backend="json")
+        client.fetch_values()
+        assert server.masks[-1] == ALL_COMPONENTS
+        client.close()
+    finally:
+        server.close()
+
+
+def test_unreachable_device_fails_once():
+    client = GudeClient("127.0.0.1", 9, clock=True, timeout=0.5, json_backend="json")  # nothing listens
+    with pytest.raises(GudeError):
+        client.fetch_values()
+    assert client.path == f"/statusjsn.js?components={ALL_COMPONENTS}"
+    assert client._find_clock
+
+
+class OneShotServer:
+    """Raw HTTP server: answers each connection's first request, then `behaviour` for the next one."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.connections = 0
+        self._socket = socket.socket()
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen()
+        self.address = self._socket.getsockname()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            conn.recv(4096)
+            conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(SENSOR_VALUES), SENSOR_VALUES))
+            conn.recv(4096)
+            if self.behaviour == "stall":
+                time.sleep(2)
+
+    def close(self):
+        self._socket.close()
+
+
+def test_closed_connection_is_retried():
+    server = OneShotServer("close")
+    try:
+        client = GudeClient(*server.address, json_backend="json")
+        assert client.fetch_values()[0] == VALUES
+        assert client.fetch_values()[0] == VALUES
+        assert client.connections == server.connections == 2
+        client.close()
+    finally:
+        server.close()
+
+
+def test_timeout_is_not_retried():
+    server = OneShotServer("stall")
+    try:
+        client = GudeClient(*server.address, timeout=0.3, json_backend="json")
+        client.fetch_values()
+        start = time.monotonic()
+        with pytest.raises(GudeError, match="timed out"):
+            client.fetch_values()
+        assert time.monotonic() - start < 0.55
+        assert server.connections == 1
+    finally:
+        server.close()
@@ -0,0 +1,67 @@
+import io
+import json
+
+import pytest
+
+from energylogger.har import _StreamReader, entry_row, har_to_csv
+
+ENTRIES = [
+    {"startedDateTime": "2025-03-10T12:00:00.000+01:00",
+     "request": {"url": "https://example.com/a?b=[c]", "httpVersion": "h2", "headers": [{"name": "x", "value": "}"}]},
+     "response": {"status": 200, "_transferSize": 1234,
+                  "content": {"size": 5000, "mimeType": "text/html", "text": "<p>\"{[\\\\]}\"</p>"}}},
+    {"startedDateTime": "2025-03-10T12:00:01.500+01:00",
+     "request": {"url": "https://example.com/é", "httpVersion": "http/1.1"},
+     "response": {"status": 304, "_transferSize": 0, "content": {"size": 0, "mimeType": "x-unknown"}}},
+]
+
+DOCUMENT = {"log": {
+    "version": "1.2",
+    "creator": {"name": "WebInspector", "version": "537.36"},
+    "pages": [{"id": "page_1", "title": "a \"quoted\" [title] {with} \\ brackets", "pageTimings": {"onLoad": 1.5e3}}],
+    "comment": "\\\\\\\"",
+    "count": -12.5e-3,
+    "flags": [True, False, None, [], {}],
+    "entries": ENTRIES,
+}}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_stream_reader_matches_json(chunk_size):
+    text = json.dumps(DOCUMENT, indent=1)
+    reader = _StreamReader(io.StringIO(text), chunk_size=chunk_size)
+    assert list(reader.items(("log", "entries"))) == ENTRIES
+
+
+def test_skipped_members_are_not_decoded(monkeypatch):
+    text = json.dumps(DOCUMENT)
+    reader = _StreamReader(io.StringIO(text), chunk_size=5)
+    decoded = []
+    decode = reader._decode
+
+    def tracking_decode():
+        value = decode()
+        decoded.append(value)
+        return value
+
+    monkeypatch.setattr(reader, "_decode", tracking_decode)
+    assert list(reader.items(("log", "entries"))) == ENTRIES
+    # Only keys, the number "count" and the entries themselves
+    assert decoded == ["log", "version", "creator", "pages", "comment", "count", -12.5e-3, "flags",
+                       "entries"] + ENTRIES
+
+
+def test_missing_array_and_truncated_file():
+    assert list(_StreamReader(io.StringIO('{"log": {"pages": []}}')).items(("log", "entries"))) == []
+    with pytest.raises(ValueError):
+        list(_StreamReader(io.StringIO('{"log": {"pages": [{"title": "x'), chunk_size=4).items(("log", "entries")))
+
+
+def test_har_to_csv(tmp_path):
+    har = tmp_path / "capture.har"
+    har.write_text(json.dumps(DOCUMENT), encoding="utf-8")
+    output = tmp_path / "requests.csv"
+    assert har_to_csv(str(har), str(output)) == 2
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[1].startswith("https://example.com/a?b=[c],2025-03-10T12:00:00.000+01:00,h2,200,5000,")
+    assert entry_row(ENTRIES[1])[-1] == 0
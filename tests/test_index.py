@@ -0,0 +1,77 @@
+import csv
+import os
+
+import pytest
+
+from energylogger.csv_writer import BufferedCSVWriter
+from energylogger.index import SparseIndex, build_index, index_filename, query
+from energylogger.schemas import SCHEMAS
+
+HEADER = SCHEMAS["energy"].header
+START = 1_740_000_000_000
+
+
+def rows(first, count, step=100):
+    for i in range(first, first + count):
+        yield [START + i * step, "", 230, 0.4, 50.0 + i % 7] + [0] * (len(HEADER) - 5)
+
+
+def write_capture(filename, count, **options):
+    with BufferedCSVWriter(filename, HEADER, flush_rows=37, **options) as writer:
+        writer.writerows(rows(0, count))
+
+
+def brute_force(filename, start, end):
+    with open(filename, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row for row in reader if start <= int(row[0]) < end]
+
+
+@pytest.mark.parametrize("start, end", [
+    (0, START),  # before the capture
+    (START, START + 1),  # first row only
+    (START + 12_345, START + 98_765),
+    (START + 4_950, START + 5_050),  # around an index entry
+    (START + 199_900, START + 10**9),  # through the end
+])
+def test_query_matches_a_full_scan(tmp_path, start, end):
+    filename = str(tmp_path / "capture.csv")
+    write_capture(filename, 2000)
+    assert list(query(filename, start, end)) == brute_force(filename, start, end)
+
+
+def test_index_written_while_logging_equals_a_rebuilt_one(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    write_capture(filename, 1234, index_every=50)
+    with BufferedCSVWriter(filename, HEADER, index_every=50, flush_rows=37) as writer:
+        writer.writerows(rows(1234, 500))  # appending resumes the index
+    logged = SparseIndex.load(index_filename(filename))
+    os.remove(index_filename(filename))
+    built = build_index(filename, 50)
+    assert (logged.timestamps, logged.offsets, logged.numbers) == (built.timestamps, built.offsets, built.numbers)
+
+
+def test_no_index_unless_asked(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    write_capture(filename, 100)
+    assert not os.path.exists(index_filename(filename))
+    assert len(list(query(filename, START, START + 500))) == 5
+    assert os.path.exists(index_filename(filename))
+
+
+def test_stale_index_is_extended_or_rebuilt(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    write_capture(filename, 3000)
+    build_index(filename, 100)
+    with BufferedCSVWriter(filename, HEADER) as writer:
+        writer.writerows(rows(3000, 1000))
+    end = START + 400_000
+    assert list(query(filename, START + 250_000, end)) == brute_force(filename, START + 250_000, end)
+
+    # A different capture under the same name
+    os.remove(filename)
+    with BufferedCSVWriter(filename, HEADER) as writer:
+        writer.writerows(rows(10_000, 500))
+    window = (START + 1_000_000, START + 1_020_000)
+    assert list(query(filename, *window)) == brute_force(filename, *window)
@@ -0,0 +1,163 @@
+"""The CSV rows of --schema v1, v2 and energy against the original loggers.
+
+reference_* are the row-building parts of logger.py, logger_v2.py and
+EnergyLogging/log.py as they were before they became wrappers of
+energylogger.httplogger (requests replaced by the parsed document).
+"""
+import csv
+import io
+import json
+import re
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from bench.simulators import StatusServer
+from energylogger.csv_writer import BufferedCSVWriter
+from energylogger.gude import GudeClient
+from energylogger.httplogger import LAYOUTS, fetch_row
+
+V1_HEADER = ["Timestamp", "Voltage (V)", "Current (A)", "Frequency (Hz)", "Phase (deg)",
+             "Active Power (W)", "Reactive Power (VAR)", "Apparent Power (VA)",
+             "Power Factor (PF)", "Total Energy (kWh)", "Resettable Energy (kWh)"]
+ENERGY_HEADER = ["Unix Timestamp (ms)", "UTC Human-Readable", "Voltage (V)", "Current (A)", "Active Power (W)",
+                 "Computed Active Power (W) - Precise", "Frequency (Hz)", "Apparent Power (VA)",
+                 "Computed Apparent Power (VA)", "Power Factor (PF)", "Total Energy (Wh)",
+                 "Resettable Energy (Wh)", "Elapsed Time (µs)"]
+
+DOCUMENT = {
+    "clock": {"systemtime": {"year": 2025, "month": 3, "day": 7, "hour": 9, "minute": 5, "second": 3}},
+    "sensor_values": [{"type": 1, "num": 1, "values": [[
+        {"v": 230}, {"v": 0.431}, {"v": 50.01}, {"v": 51.68}, {"v": 61.4}, {"v": 78.0},
+        {"v": 99.13}, {"v": 0.615}, {"v": 32.965}, {"v": 14},
+    ]]}],
+}
+
+
+def reference_v1(data):
+    utc_timestamp = data.get("clock", {}).get("systemtime", {})
+    formatted_utc_time = (
+        f"{utc_timestamp.get('day'):02d}-{utc_timestamp.get('month'):02d}-{utc_timestamp.get('year')} "
+        f"{utc_timestamp.get('hour'):02d}:{utc_timestamp.get('minute'):02d}:{utc_timestamp.get('second'):02d}"
+    )
+    sensor_values = data.get("sensor_values", [])[0].get("values", [])[0]
+    return [formatted_utc_time] + [sensor_values[i]["v"] for i in range(10)]
+
+
+def reference_v2(data):
+    utc_timestamp = data.get("clock", {}).get("systemtime", {})
+    formatted_utc_time = (
+        f"{utc_timestamp.get('year')}-{utc_timestamp.get('month'):02d}-{utc_timestamp.get('day'):02d} "
+        f"{utc_timestamp.get('hour'):02d}:{utc_timestamp.get('minute'):02d}:{utc_timestamp.get('second'):02d}"
+    )
+    milliseconds = datetime.now(timezone.utc).microsecond // 1000
+    formatted_utc_time = f"{formatted_utc_time}.{milliseconds:03d}"
+    sensor_values = data.get("sensor_values", [])[0].get("values", [])[0]
+    return [formatted_utc_time] + [sensor_values[i]["v"] for i in range(10)]
+
+
+def reference_energy(data):
+    start_time = time.time()
+    utc_now = datetime.now(timezone.utc)
+    human_readable_utc = utc_now.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    unix_timestamp_ms = int(utc_now.timestamp() * 1000)
+    sensor_values = data.get("sensor_values", [])[0].get("values", [])[0]
+    metrics = {
+        "Voltage (V)": sensor_values[0]["v"],
+        "Current (A)": sensor_values[1]["v"],
+        "Frequency (Hz)": sensor_values[2]["v"],
+        "Active Power (W)": sensor_values[4]["v"],
+        "Apparent Power (VA)": sensor_values[6]["v"],
+        "Power Factor (PF)": round(sensor_values[7]["v"], 2),
+        "Total Energy (Wh)": sensor_values[8]["v"] * 1000,
+        "Resettable Energy (Wh)": sensor_values[9]["v"] * 1000,
+    }
+    computed_apparent_power = round(metrics["Voltage (V)"] * metrics["Current (A)"], 3)
+    computed_active_power = round(metrics["Voltage (V)"] * metrics["Current (A)"] * metrics["Power Factor (PF)"], 3)
+    elapsed_time = int((time.time() - start_time) * 1e6)
+    return [
+        unix_timestamp_ms, human_readable_utc,
+        metrics["Voltage (V)"], metrics["Current (A)"], metrics["Active Power (W)"], computed_active_power,
+        metrics["Frequency (Hz)"], metrics["Apparent Power (VA)"], computed_apparent_power,
+        metrics["Power Factor (PF)"], metrics["Total Energy (Wh)"], metrics["Resettable Energy (Wh)"], elapsed_time,
+    ]
+
+
+REFERENCES = {"v1": (V1_HEADER, reference_v1), "v2": (V1_HEADER, reference_v2),
+              "energy": (ENERGY_HEADER, reference_energy)}
+# Columns that depend on when the sample was taken, compared by format only
+TIME_FORMATS = {
+    "v1": {0: r"07-03-2025 09:05:03"},
+    "v2": {0: r"2025-03-07 09:05:03\.\d{3}"},
+    "energy": {0: r"\d{13}", 1: r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3}", 12: r"\d+"},
+}
+
+
+def csv_lines(header, rows):
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return text.getvalue().splitlines()
+
+
+def backends():
+    names = ["json"]
+    for name in ("orjson", "msgspec"):
+        try:
+            __import__(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = StatusServer(payloads=[json.dumps(DOCUMENT).encode()])
+    server.start()
+    yield server
+    server.close()
+
+
+@pytest.mark.parametrize("backend", backends())
+@pytest.mark.parametrize("schema", sorted(LAYOUTS))
+def test_rows_match_the_original_logger(tmp_path, server, schema, backend):
+    layout = LAYOUTS[schema]()
+    host, port = server.address
+    client = GudeClient(host, port, clock=layout.clock, json_backend=backend)
+    header, reference = REFERENCES[schema]
+    assert layout.header == header
+
+    filename = str(tmp_path / "capture.csv")
+    with BufferedCSVWriter(filename, layout.header) as writer:
+        writer.writerow(fetch_row(client, layout))
+    with open(filename, newline="") as f:
+        written = f.read().splitlines()
+    expected = csv_lines(header, [reference(DOCUMENT)])
+
+    assert written[0] == expected[0]
+    written_row = next(csv.reader([written[1]]))
+    expected_row = next(csv.reader([expected[1]]))
+    assert len(written_row) == len(expected_row)
+    for i, (value, original) in enumerate(zip(written_row, expected_row)):
+        if i in TIME_FORMATS[schema]:
+            assert re.fullmatch(TIME_FORMATS[schema][i], value), (header[i], value)
+        else:
+            assert value == original, header[i]
+
+
+@pytest.mark.parametrize("schema", sorted(LAYOUTS))
+def test_failed_rows_match_the_original_logger(schema, capsys):
+    layout = LAYOUTS[schema]()
+    client = GudeClient("127.0.0.1", 9, clock=layout.clock, timeout=0.5, json_backend="json")  # nothing listens
+    row = fetch_row(client, layout)
+    assert "Error fetching data" in capsys.readouterr().out
+    if schema == "energy":
+        assert row[2:] == ["TIMEOUT"] * 10 + [-1]
+        assert re.fullmatch(r"\d{13}", str(row[0]))
+    else:
+        assert row[1:] == ["TIMEOUT"] * 10
+        pattern = r"\d\d-\d\d-\d{4} \d\d:\d\d:\d\d" if schema == "v1" else r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3}"
+        assert re.fullmatch(pattern, row[0])
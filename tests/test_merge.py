@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from energylogger.merge import VIDEO, load_trace, to_ms
+
+pytest.importorskip("pandas")
+
+MEASUREMENTS = os.path.join(os.path.dirname(__file__), os.pardir, "measurements", "5G", "YoutubeLive")
+
+
+def test_video_statistics_with_commas_in_latency_mode():
+    # Some rows end in "Manifestless, Optimized for Normal Latency, seq 3284" (11 fields for 9 columns)
+    filename = os.path.join(MEASUREMENTS, "5G_Hat_only", "720p", "video_data.csv")
+    with open(filename, encoding="utf-8") as f:
+        rows = f.read().splitlines()[1:]
+    assert any(row.count(",") > 8 for row in rows)
+
+    kind, timestamps, frame = load_trace(filename)
+    assert kind == VIDEO
+    assert len(timestamps) == len(frame) == len(rows)
+    assert (timestamps[1:] >= timestamps[:-1]).all()
+    assert {"FPS", "Bandwidth_kbps", "Buffer_Health_s"} <= set(frame.columns)
+    assert frame["FPS"].notna().all()
+
+
+def test_video_statistics_without_overflow(tmp_path):
+    filename = tmp_path / "video_data.csv"
+    filename.write_text("UTC_Timestamp,Resolution,FPS,Codecs,Bandwidth_kbps,Network_Activity_KB,"
+                        "Buffer_Health_s,Live_Latency_s,Latency_Mode\n"
+                        "1741609242730,1920x1080,25,av01,9760,0,13.43,null,null\n"
+                        "1741609243130,1920x1080,25,av01,9760,12,13.00,2.5,Manifestless, seq 1\n")
+    kind, timestamps, frame = load_trace(str(filename))
+    assert list(timestamps) == [1741609242730, 1741609243130]
+    assert list(frame["Network_Activity_KB"]) == [0, 12]
+    assert list(frame["Live_Latency_s"].fillna(-1)) == [-1, 2.5]
+
+
+def test_unparsable_timestamps_are_dropped(tmp_path):
+    # An empty timestamp and a header line repeated mid-file (a restarted logger)
+    filename = tmp_path / "temperatures.csv"
+    filename.write_text("Timestamp,cpu,modem\n"
+                        "1741605634889,40,50\n"
+                        ",41,51\n"
+                        "Timestamp,cpu,modem\n"
+                        "1741605634994,42,52\n")
+    kind, timestamps, frame = load_trace(str(filename))
+    assert list(timestamps) == [1741605634889, 1741605634994]
+    assert list(frame["cpu"]) == [40, 42]
+
+
+def test_unparsable_numeric_timestamps_are_dropped():
+    pd = pytest.importorskip("pandas")
+    timestamps, valid = to_ms(pd.Series(["1741609242730", "", "UTC_Timestamp", "1.74160924274E+12"]))
+    assert list(timestamps) == [1741609242730, 1741609242740]
+    assert list(valid) == [True, False, False, True]
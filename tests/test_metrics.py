@@ -0,0 +1,144 @@
+import asyncio
+import json
+import math
+import urllib.error
+import urllib.request
+
+import pytest
+
+from energylogger import metrics as live
+from energylogger.metrics import WINDOW, Metrics, serve_async, serve_in_thread
+from energylogger.pipeline import Pipeline, Sink
+
+HEADER = ["Unix Timestamp (ms)", "Voltage (V)", "Active Power (W)"]
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(900.0)
+    monkeypatch.setattr(live.time, "perf_counter", clock)
+    return clock
+
+
+def make_metrics(**options):
+    return Metrics(lambda row: zip(HEADER, row), power=lambda row: row[2],
+                   failed=lambda row: row[2] is None, **options)
+
+
+def test_rolling_window_mean_and_sample_rate(clock):
+    metrics = make_metrics()
+    for i in range(240):
+        now = 1000.0 + i * 0.5
+        metrics.put([i, 230, 100.0 if now < 1060 else 200.0], now)
+    clock.now = 1119.9
+    snapshot = metrics.snapshot()
+    assert snapshot["samples"] == 240
+    # Only the last WINDOW seconds count
+    assert snapshot["sample_rate"] == 2 * 60 / WINDOW
+    assert snapshot["power_mean_w"] == 200.0
+    assert snapshot["values"] == {"Unix Timestamp (ms)": 239, "Voltage (V)": 230, "Active Power (W)": 200.0}
+
+
+def test_energy_is_not_bridged_over_long_gaps(clock):
+    metrics = make_metrics(max_gap=60.0)
+    for now, power in [(0.0, 100.0), (1.0, 100.0), (2.0, float("nan")), (3.0, 100.0),
+                       (103.0, 300.0), (104.0, 300.0)]:
+        metrics.put([int(now), 230, power], now)
+    # 3 s at 100 W bridging the failed sample, the 100 s gap is left out, 1 s at 300 W
+    assert math.isclose(metrics.energy_wh, (3 * 100 + 300) / 3600)
+    assert metrics.failures == 0
+
+
+def test_prometheus_text(clock):
+    metrics = make_metrics(labels={"logger": "v2", "csv": 'lab "A"\\run\n2'})
+    metrics.put([1, float("nan"), float("inf")], 1000.0)
+    metrics.put([2, -math.inf, None], 1000.5)
+    clock.now = 1001.0
+    text = metrics.prometheus()
+    labels = 'logger="v2",csv="lab \\"A\\"\\\\run\\n2"'
+    lines = text.splitlines()
+    assert f"energylogger_samples_total{{{labels}}} 2" in lines
+    assert f"energylogger_failures_total{{{labels}}} 1" in lines
+    assert f'energylogger_value{{{labels},column="Voltage (V)"}} -Inf' in lines
+    assert f'energylogger_latency_seconds_count{{{labels}}} 0' in lines
+    assert "# TYPE energylogger_energy_watt_hours_total counter" in lines
+    metrics.put([3, float("nan"), float("inf")], 1000.7)
+    lines = metrics.prometheus().splitlines()
+    assert f'energylogger_value{{{labels},column="Voltage (V)"}} NaN' in lines
+    assert f'energylogger_value{{{labels},column="Active Power (W)"}} +Inf' in lines
+    assert text.endswith("\n")
+
+
+def test_queue_statistics_of_the_other_outputs():
+    metrics = make_metrics()
+    pipeline = Pipeline([Sink("file", lambda record: None)])
+    pipeline.add(metrics)
+    metrics.pipeline = pipeline
+    pipeline.put([1, 230, 50.0])
+    pipeline.close()
+    assert metrics.snapshot()["outputs"] == [{"name": "file", "handled": 1, "dropped": 0, "depth": 0}]
+    assert 'energylogger_output_dropped_total{output="file"} 0' in metrics.prometheus()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.headers["Content-Type"], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], e.read()
+
+
+def test_serve_in_thread():
+    metrics = make_metrics()
+    metrics.put([1, 230, float("nan")])
+    host, port = serve_in_thread(metrics, port=0)
+    try:
+        status, content_type, body = get(f"http://{host}:{port}/metrics")
+        assert status == 200 and content_type.startswith("text/plain; version=0.0.4")
+        assert b"energylogger_samples_total 1\n" in body
+        status, content_type, body = get(f"http://{host}:{port}/metrics.json")
+        assert status == 200 and content_type == "application/json"
+        # Strict JSON: the failed power reading is null, not NaN
+        document = json.loads(body, parse_constant=pytest.fail)
+        assert document["samples"] == 1 and document["values"]["Active Power (W)"] is None
+        assert get(f"http://{host}:{port}/other")[0] == 404
+    finally:
+        metrics.close()
+    assert metrics.scrapes == 3
+
+
+def test_serve_async():
+    metrics = make_metrics()
+    metrics.put([1, 230, 50.0])
+
+    async def request(port, line):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(line + b"\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return head.split(b"\r\n")[0], body
+
+    async def run():
+        server = await serve_async(metrics, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await request(port, line) for line in
+                    (b"GET /metrics HTTP/1.1", b"GET /metrics.json HTTP/1.1", b"POST /metrics HTTP/1.1")]
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    (status, text), (json_status, document), (post_status, _) = asyncio.run(run())
+    assert status == b"HTTP/1.1 200 OK"
+    assert b"energylogger_power_mean_watts 50.0\n" in text
+    assert json_status == b"HTTP/1.1 200 OK" and json.loads(document)["samples"] == 1
+    assert post_status == b"HTTP/1.1 405 Method Not Allowed"
@@ -0,0 +1,18 @@
+from energylogger import modbus
+from energylogger.modbus import plan_reads
+
+
+def test_plan_merges_adjacent_values():
+    assert plan_reads([0x400, 0x402, 0x404]) == [(0x400, 6)]
+    assert plan_reads([(0x10, 1), 0x11]) == [(0x10, 3)]
+
+
+def test_plan_reads_through_holes_unless_max_gap():
+    assert plan_reads([0x400, 0x40E]) == [(0x400, 0x10)]
+    assert plan_reads([0x400, 0x40E], max_gap=4) == [(0x400, 2), (0x40E, 2)]
+
+
+def test_plan_respects_max_count():
+    plan = plan_reads(range(0, 200, 2))
+    assert plan == [(0, 124), (124, 76)]
+    assert all(count <= modbus.MAX_READ_REGISTERS for _, count in plan)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from energylogger.pipeline import BLOCK, DROP_NEW, DROP_OLDEST, Pipeline, Sink
+
+
+class Gate:
+    """Sink handler that records what it gets and waits until released."""
+
+    def __init__(self):
+        self.handled = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, record):
+        self.started.set()
+        self.release.wait(5)
+        self.handled.append(record)
+
+
+def stalled_sink(overflow, capacity=3):
+    """A sink whose worker is stuck handling record 0, with a full queue behind it."""
+    gate = Gate()
+    sink = Sink("file", gate, capacity=capacity, overflow=overflow)
+    sink.put(0)
+    assert gate.started.wait(5)
+    for record in range(1, capacity + 1):
+        sink.put(record)
+    assert sink.depth == capacity
+    return sink, gate
+
+
+def test_data_sinks_block_by_default():
+    assert Sink("file", print).overflow == BLOCK
+
+
+def test_drop_oldest(capsys):
+    sink, gate = stalled_sink(DROP_OLDEST)
+    sink.put(4)
+    sink.put(5)
+    assert sink.dropped == 2
+    assert sink.depth == 3
+    assert "falling behind" in capsys.readouterr().out
+    gate.release.set()
+    sink.close()
+    assert gate.handled == [0, 3, 4, 5]
+    assert sink.handled == 4
+    assert sink.depth == 0
+
+
+def test_drop_new():
+    sink, gate = stalled_sink(DROP_NEW)
+    sink.put(4)
+    sink.put(5)
+    assert sink.dropped == 2
+    gate.release.set()
+    sink.close()
+    assert gate.handled == [0, 1, 2, 3]
+    assert "2 dropped" in sink.summary()
+
+
+def test_block_waits_for_room():
+    sink, gate = stalled_sink(BLOCK)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (sink.put(4), done.set()))
+    thread.start()
+    assert not done.wait(0.2)
+    gate.release.set()
+    assert done.wait(5)
+    thread.join()
+    sink.close()
+    assert gate.handled == [0, 1, 2, 3, 4]
+    assert sink.dropped == 0
+
+
+def test_close_without_drain_discards_queue():
+    gate = Gate()
+    sink = Sink("console", gate, capacity=10, overflow=DROP_OLDEST, drain=False)
+    sink.put(0)
+    assert gate.started.wait(5)
+    sink.put(1)
+    sink.put(2)
+    gate.release.set()
+    sink.close()
+    assert gate.handled[0] == 0
+    assert sink.depth == 0
+
+
+def test_handler_errors_are_counted(capsys):
+    def handle(record):
+        if record % 2:
+            raise ValueError("bad record")
+
+    with Pipeline([Sink("file", handle)]) as pipeline:
+        for record in range(6):
+            pipeline.put(record)
+    sink = pipeline.sinks[0]
+    assert (sink.handled, sink.errors) == (6, 3)
+    assert "bad record" in capsys.readouterr().out
+
+
+def test_lag_is_measured():
+    sink = Sink("file", lambda record: time.sleep(0.01))
+    sink.put(0)
+    sink.put(1)
+    sink.close()
+    assert sink.max_lag >= 0.01
+    assert sink.last_lag <= sink.max_lag
+    assert sink.mean_lag > 0
@@ -0,0 +1,85 @@
+import asyncio
+import math
+
+from energylogger import modbus
+from energylogger.registers import GUDE_LINE_IN, Register, RegisterDecoder, select
+
+
+def words(value, word_order="big"):
+    """The two 16-bit registers of a 32-bit value."""
+    value &= 0xFFFFFFFF
+    high, low = value >> 16, value & 0xFFFF
+    return [high, low] if word_order == "big" else [low, high]
+
+
+def test_gude_line_in_fits_one_request():
+    decoder = RegisterDecoder(GUDE_LINE_IN)
+    assert decoder.plan == [(0x400, 0x2A)]
+
+
+def test_word_order_and_signed_values():
+    decoder = RegisterDecoder([
+        Register(0x00, "big"),
+        Register(0x02, "little", word_order="little"),
+        Register(0x04, "signed", signed=True),
+        Register(0x06, "short", width=1, signed=True),
+    ])
+    block = words(0x12345678) + words(0x12345678, "little") + words(-5) + [0xFFFE]
+    assert decoder.decode([block]) == [0x12345678, 0x12345678, -5, -2]
+
+
+def test_unscaled_values_stay_integers():
+    decoder = RegisterDecoder(select(GUDE_LINE_IN, ["voltage", "current", "frequency"]))
+    record = decoder.decode([words(230) + words(1234) + words(5001)])
+    voltage, current, frequency = (record[decoder.index[name]] for name in ("voltage", "current", "frequency"))
+    assert voltage == 230 and type(voltage) is int
+    assert math.isclose(current, 1.234) and math.isclose(frequency, 50.01)
+
+
+def test_gaps_are_skipped():
+    decoder = RegisterDecoder([Register(0x400, "a"), Register(0x40E, "b")])
+    block = words(7) + [0xDEAD] * 12 + words(9)
+    assert decoder.decode([block]) == [7, 9]
+
+
+def test_failed_and_short_blocks_are_nan():
+    decoder = RegisterDecoder([Register(0x400, "a"), Register(0x500, "b")])
+    assert len(decoder.plan) == 2
+    record = decoder.decode([None, words(3)])
+    assert math.isnan(record[0]) and record[1] == 3
+    record = decoder.decode([words(1)[:1], words(3) + [0]])
+    assert all(math.isnan(value) for value in record)
+
+
+class Response:
+    def __init__(self, registers, error=False):
+        self.registers = registers
+        self.error = error
+
+    def isError(self):
+        return self.error
+
+
+class Client:
+    """Returns canned responses in request order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def read_input_registers(self, address, count):
+        self.requests.append((address, count))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_read_ranges_drops_short_and_failed_responses(capsys):
+    plan = [(0x400, 4), (0x500, 2), (0x600, 2), (0x700, 2)]
+    client = Client(Response([1, 2, 3, 4]), Response([1]), Response([], error=True), TimeoutError("timed out"))
+    blocks = asyncio.run(modbus.read_ranges(client, plan))
+    assert blocks == [[1, 2, 3, 4], None, None, None]
+    assert client.requests == plan
+    assert "1 of 2 registers" in capsys.readouterr().out
+
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from energylogger.scheduler import CATCH_UP, COALESCE, SKIP, FixedRateScheduler
+
+
+def run(scheduler, clock, work):
+    """Tick once per duration in `work`; returns the clock at the start of each tick."""
+    starts = []
+    for duration in work:
+        scheduler.wait()
+        starts.append(round(clock.now, 6))
+        clock.now += duration
+    return starts
+
+
+def test_no_drift_when_on_time(clock):
+    scheduler = FixedRateScheduler(1.0, clock=clock)
+    assert run(scheduler, clock, [0.3, 0.9, 0.0, 0.5]) == [100.0, 101.0, 102.0, 103.0]
+    assert scheduler.missed == 0 and scheduler.max_lateness == 0.0
+
+
+def test_skip_stays_on_the_grid(clock):
+    scheduler = FixedRateScheduler(1.0, SKIP, clock=clock)
+    # The second sample overruns: the late tick runs at once, the one of 103 is dropped
+    assert run(scheduler, clock, [0.1, 2.5, 0.1, 0.1]) == [100.0, 101.0, 103.5, 104.0]
+    assert scheduler.missed == 1
+
+
+def test_catch_up_runs_missed_ticks_back_to_back(clock):
+    scheduler = FixedRateScheduler(1.0, CATCH_UP, clock=clock)
+    assert run(scheduler, clock, [0.1, 2.5, 0.1, 0.1, 0.1, 0.1]) == [100.0, 101.0, 103.5, 103.6, 104.0, 105.0]
+    assert scheduler.missed == 0
+    assert scheduler.last_lateness == 0.0
+    assert scheduler.max_lateness == pytest.approx(1.5)
+
+
+def test_coalesce_restarts_the_grid(clock):
+    scheduler = FixedRateScheduler(1.0, COALESCE, clock=clock)
+    assert run(scheduler, clock, [0.1, 2.5, 0.1, 0.1]) == [100.0, 101.0, 103.5, 104.5]
+    assert scheduler.missed == 1
+
+
+def test_late_but_within_one_period_is_not_missed(clock):
+    for policy in (SKIP, CATCH_UP, COALESCE):
+        scheduler = FixedRateScheduler(1.0, policy, clock=clock)
+        starts = run(scheduler, clock, [1.4, 0.1])
+        assert starts[1] - starts[0] == pytest.approx(1.4)
+        assert scheduler.missed == 0
+        assert scheduler.last_lateness == pytest.approx(0.4)
+
+
+def test_wait_async(clock, monkeypatch):
+    async def sleep(seconds):
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    scheduler = FixedRateScheduler(0.5, clock=clock)
+
+    async def loop():
+        for _ in range(3):
+            await scheduler.wait_async()
+            clock.now += 0.2
+
+    asyncio.run(loop())
+    assert clock.now == pytest.approx(101.2)
+    assert clock.sleeps == pytest.approx([0.3, 0.3])
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        FixedRateScheduler(0)
+    with pytest.raises(ValueError):
+        FixedRateScheduler(1.0, "later")
+
@@ -0,0 +1,103 @@
+import os
+
+from energylogger.binlog import BinaryLog, BinaryWriter
+from energylogger.csv_writer import BufferedCSVWriter
+from energylogger.segments import PART, EventWriter, SegmentedWriter, last_timestamp, list_segments, segment_name
+
+HEADER = ["Unix Timestamp (ms)", "Voltage (V)", "Active Power (W)"]
+
+
+def csv_factory(name):
+    return BufferedCSVWriter(name, HEADER, flush_rows=50)
+
+
+def lines(filename):
+    with open(filename) as f:
+        return f.read().splitlines()
+
+
+def test_rotation_by_size(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+
+    def factory(name):
+        return BufferedCSVWriter(name, HEADER, flush_rows=300, flush_interval=None)
+
+    with SegmentedWriter(factory, filename, max_bytes=20000) as writer:
+        for i in range(5000):
+            writer.writerow([1000 + i, 230, 50.5])
+    segments = list_segments(filename)
+    assert [number for number, _ in segments] == list(range(1, len(segments) + 1))
+    assert not any(path.endswith(PART) for _, path in segments)
+    rows = [line for _, path in segments for line in lines(path)[1:]]
+    assert rows == [f"{1000 + i},230,50.5" for i in range(5000)]
+    # Buffered rows are counted: a segment overshoots by less than one row, not one flush batch
+    row_size = len("1000,230,50.5\r\n")
+    for _, path in segments[:-1]:
+        assert 20000 <= os.path.getsize(path) < 20000 + row_size
+
+
+def write_part(tmp_path, name, content):
+    """A .part segment as a crashed run leaves it behind."""
+    part = str(tmp_path / name)
+    with open(part, "wb") as f:
+        f.write(content)
+    return part
+
+
+def test_truncated_part_is_recovered(tmp_path, capsys):
+    filename = str(tmp_path / "capture.csv")
+    rows = "".join(f"{1000 + i},230,50.5\r\n" for i in range(10))
+    part = write_part(tmp_path, "capture_000001.csv.part", (",".join(HEADER) + "\r\n" + rows + "1010,23").encode())
+
+    writer = SegmentedWriter(csv_factory, filename)
+    first = segment_name(filename, 1)
+    assert not os.path.exists(part)
+    assert writer.resume_from == first
+    assert lines(first)[-1] == "1009,230,50.5"
+    assert last_timestamp(first) == 1009
+    assert "Recovered" in capsys.readouterr().out
+
+    writer.writerow([2000, 230, 50.5])
+    writer.close()
+    assert [number for number, _ in list_segments(filename)] == [1, 2]
+    assert lines(segment_name(filename, 2)) == [",".join(HEADER), "2000,230,50.5"]
+
+
+def test_empty_part_is_removed(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    write_part(tmp_path, "capture_000001.csv", b"1000,230,50.5\r\n")
+    part = write_part(tmp_path, "capture_000002.csv.part", b"")
+    writer = SegmentedWriter(csv_factory, filename)
+    assert not os.path.exists(part)
+    assert writer.resume_from == segment_name(filename, 1)
+    assert writer.number == 2
+
+
+def test_truncated_binary_part_is_recovered(tmp_path):
+    filename = str(tmp_path / "capture.bin")
+    complete = str(tmp_path / "complete.bin")
+    with BinaryWriter(complete, HEADER) as writer:
+        writer.writerows([[1000 + i, 230, 50.5] for i in range(5)])
+    with open(complete, "rb") as f:
+        write_part(tmp_path, "capture_000001.bin.part", f.read() + b"\x01\x02\x03")
+
+    resumed = SegmentedWriter(lambda name: BinaryWriter(name, HEADER), filename)
+    log = BinaryLog(resumed.resume_from)
+    assert [row[0] for row in log.iter_rows()] == [1000, 1001, 1002, 1003, 1004]
+    assert os.path.getsize(resumed.resume_from) == os.path.getsize(complete)
+
+
+def test_events_for_timeouts_and_gaps(tmp_path):
+    filename = str(tmp_path / "capture.csv")
+    raw = BufferedCSVWriter(filename, HEADER)
+    with EventWriter(raw, filename, HEADER, gap=5.0) as writer:
+        writer.writerow([1000, 230, 50.0])
+        writer.writerow([2000, "", "TIMEOUT"])
+        writer.writerow([3000, "", "TIMEOUT"])
+        writer.writerow([4000, 230, 51.0])
+        writer.writerow([20000, 230, 52.0])
+    assert lines(filename)[1:] == ["1000,230,50.0", "4000,230,51.0", "20000,230,52.0"]
+    events = [line.split(",") for line in lines(str(tmp_path / "capture_events.csv"))[1:]]
+    assert [event[1] for event in events] == ["start", "timeout", "gap", "stop"]
+    assert events[1][0] == "2000" and events[1][2:4] == ["1000", "2"]
+    assert events[2][0] == "4000" and events[2][2] == "16000" and events[2][4] == "no samples"
@@ -0,0 +1,36 @@
+import json
+import math
+import urllib.request
+
+from bench.simulators import StatusServer, encode_registers, line_in_values
+from energylogger.gude import ALL_COMPONENTS, COMPONENT_SENSOR_VALUES, extract_values
+from energylogger.registers import GUDE_LINE_IN, Register, RegisterDecoder
+
+
+def test_simulator_registers_decode_to_its_readings():
+    registers = GUDE_LINE_IN + (Register(0x500, "signed", signed=True, word_order="little"),
+                                Register(0x502, "short", width=1, signed=True, scale=0.1))
+    values = dict(line_in_values(now=1234.5), signed=-42, short=-1.5)
+    encoded = encode_registers(registers, values)
+    decoder = RegisterDecoder(registers)
+    blocks = [[encoded.get(address, 0) for address in range(start, start + count)] for start, count in decoder.plan]
+    record = decoder.as_dict(decoder.decode(blocks))
+    for r in registers:
+        assert math.isclose(record[r.name], round(values.get(r.name, 0.0) / r.scale) * r.scale, abs_tol=1e-9)
+
+
+def test_status_server_answers_by_components_mask():
+    server = StatusServer()
+    host, port = server.start()
+    try:
+        documents = {}
+        for components in (COMPONENT_SENSOR_VALUES, ALL_COMPONENTS):
+            with urllib.request.urlopen(f"http://{host}:{port}/statusjsn.js?components={components}") as response:
+                documents[components] = json.loads(response.read())
+    finally:
+        server.close()
+    assert set(documents[COMPONENT_SENSOR_VALUES]) == {"clock", "sensor_values"}
+    assert {"misc", "outputs", "sensor_descr"} <= set(documents[ALL_COMPONENTS])
+    for document in documents.values():
+        assert len(extract_values(document)) == 10
+    assert server.requests == 2
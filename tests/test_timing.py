@@ -0,0 +1,77 @@
+import math
+import random
+
+from energylogger.timing import _BUCKETS, _HIGHEST, Histogram, _bucket, _bucket_range
+
+HOURS_19 = 19 * 3600 * 1_000_000  # µs
+
+
+def log_uniform(rng, count, low=1, high=HOURS_19):
+    """Integer microseconds spread evenly over the orders of magnitude from `low` to `high`."""
+    return [int(math.exp(rng.uniform(math.log(low), math.log(high)))) for _ in range(count)]
+
+
+def exact_percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def test_buckets_tile_the_range():
+    assert HOURS_19 < _HIGHEST
+    end = 0
+    for index in range(_BUCKETS):
+        low, width = _bucket_range(index)
+        assert low == end
+        assert _bucket(low) == _bucket(low + width - 1) == index
+        # Under 1 % relative error: a bucket is at most 1/128 of its lowest value wide
+        assert width == 1 or width / low <= 1 / 128
+        end = low + width
+    assert end == _HIGHEST
+
+
+def test_percentiles_within_one_percent():
+    rng = random.Random(17)
+    for trial in range(5):
+        values = log_uniform(rng, 20_000)
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value / 1e6)
+        assert histogram.count == len(values)
+        assert (histogram.min, histogram.max) == (min(values), max(values))
+        assert math.isclose(histogram.mean, sum(values) / len(values))
+        for percent in (0.1, 1, 10, 25, 50, 75, 90, 99, 99.9, 100):
+            exact = exact_percentile(values, percent)
+            assert abs(histogram.percentile(percent) - exact) <= 0.01 * exact, (trial, percent)
+
+
+def test_small_values_are_exact():
+    histogram = Histogram()
+    for value in range(1, 256):
+        histogram.record(value / 1e6)
+    assert [histogram.percentile(p) for p in (1, 50, 100)] == [3, 128, 255]
+
+
+def test_merge_equals_recording_into_one_histogram():
+    rng = random.Random(3)
+    parts = [log_uniform(rng, 5000) for _ in range(4)]
+    merged, single = Histogram(), Histogram()
+    for values in parts:
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value / 1e6)
+            single.record(value / 1e6)
+        merged.merge(histogram)
+    merged.merge(Histogram())
+    assert merged.counts == single.counts
+    assert (merged.count, merged.total, merged.min, merged.max) == (single.count, single.total, single.min, single.max)
+    assert [merged.percentile(p) for p in (50, 99)] == [single.percentile(p) for p in (50, 99)]
+
+
+def test_out_of_range_values():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0.0
+    histogram.record(-0.5)
+    histogram.record(30 * 3600.0)
+    assert (histogram.min, histogram.counts[0], histogram.counts[-1]) == (0, 1, 1)
+    assert histogram.percentile(100) == histogram.max == 30 * 3600 * 1_000_000